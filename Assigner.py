@@ -1,20 +1,31 @@
 #!/usr/bin/env python3
 import json
+import logging
+import os
 import itertools
 
-REGISTRY_FILE = "data/active_fus.json"
-SCHEDULE_FILE = "data/schedule.json"
+from log_utils import setup_logging
+from schedule_store import open_store
+
 ASSIGN_FILE = "data/assignments.json"
 
-def assign_passes():
-    with open(SCHEDULE_FILE) as f:
-        schedule = json.load(f)
-    with open(REGISTRY_FILE) as f:
-        fus = json.load(f)
+log = logging.getLogger("assigner")
+
+def assign_passes(schedule=None, fus=None):
+    """Round-robin passes over active FUs and persist the result.
+
+    Inputs default to the schedule store so the script still works standalone.
+    """
+    store = open_store()
+    if schedule is None:
+        schedule = store.passes_between()
+    if fus is None:
+        fus = store.fus()
 
     if not fus:
-        print("[WARN] No active FUs found.")
-        return
+        # Still replace the stored assignments, so expired FUs stop being served passes
+        log.warning("No active FUs found.")
+        schedule = []
 
     fu_ids = list(fus.keys())
     assignments = {fid: [] for fid in fu_ids}
@@ -24,10 +35,16 @@ def assign_passes():
         assigned_fu = next(cycle)
         assignments[assigned_fu].append(entry)
 
-    with open(ASSIGN_FILE, "w") as f:
+    store.replace_assignments(assignments)
+    # JSON copy for operators; write-then-rename so readers never see a partial file
+    tmp = ASSIGN_FILE + ".tmp"
+    with open(tmp, "w") as f:
         json.dump(assignments, f, indent=4)
+    os.replace(tmp, ASSIGN_FILE)
 
-    print(f"[ASSIGNER] Assigned {len(schedule)} passes to {len(fu_ids)} FUs")
+    log.info("Assigned %d passes to %d FUs", len(schedule), len(fu_ids))
+    return assignments
 
 if __name__ == "__main__":
+    setup_logging()
     assign_passes()
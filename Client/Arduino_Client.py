@@ -1,20 +1,33 @@
 import time
-import requests
-import geocoder
 import serial
 import socketio
 import uuid
 import threading
 import json
+import logging
 import os
-from skyfield.api import load, wgs84, EarthSatellite
+import sys
+from boot_cache import BackgroundInit, cached_location, lookup_location
+from fu_session import FUSession
+from tle_sync import TleSubset
+
+# Shared modules (log_utils, clock) live in the repo root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import clock
+import profiling
+from log_utils import setup_logging
+from pass_executor import PassExecutor, pointing_profile
 
 # === Configuration ===
 SERVER_URL = "http://192.168.159.92:8080"
+SCHEDULE_URL = SERVER_URL
 SERIAL_PORT = "/dev/ttyACM0"
 BAUD_RATE = 9600
 ALTITUDE = 216  # meters
 
+log = logging.getLogger("fu")
+
 # === Unique FU ID ===
 
 
@@ -26,72 +39,108 @@ def get_mac_address():
 FU_ID = get_mac_address()
 
 # === Geo IP Location ===
-g = geocoder.ip('me')
-LATITUDE = g.latlng[0] if g.latlng else 28.6139
-LONGITUDE = g.latlng[1] if g.latlng else 77.2090
+# Last known fix from boot_cache.json; refreshed by a background geo-IP lookup
+LATITUDE, LONGITUDE = cached_location()
+
+
+def set_location(lat, lon):
+    global LATITUDE, LONGITUDE
+    LATITUDE, LONGITUDE = lat, lon
 
 # === Socket.IO Client ===
-sio = socketio.Client()
+sio = socketio.Client(reconnection_delay=1, reconnection_delay_max=60,
+                      randomization_factor=0.5)
+session = FUSession(sio, FU_ID)
+
+# === TLE Subset (only the satellites this FU tracks) ===
+TLE_SYNC_S = 3600
+tles = TleSubset(SERVER_URL)
+
+
+def load_tle_subset():
+    tles.load()
+    tles.start(TLE_SYNC_S)
+    return tles
 
-# === Load TLE Cache from local JSON file ===
-TLE_CACHE = {}
-TLE_FILE = "all_tle_data.json"
-if os.path.exists(TLE_FILE):
-    with open(TLE_FILE, "r") as f:
-        TLE_CACHE = json.load(f)
-        print(f"📄 Loaded {len(TLE_CACHE)} TLEs from {TLE_FILE}")
-else:
-    print(f"❌ TLE file '{TLE_FILE}' not found. AZ/EL computation will fail.")
 
-ts = load.timescale()
+def load_timescale():
+    from skyfield.api import load
+    return load.timescale()
 
 # === Global Mode and Timeout State ===
 MODE = "A"
+CURRENT_SATELLITE = None
 last_sent_az = None
 last_sent_el = None
 unchanged_duration = 0
 SEND_TIMEOUT = 15  # in seconds
 
 # === Serial Setup ===
-try:
-    ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
-    time.sleep(2)
-    print(f"✅ Connected to Arduino on {SERIAL_PORT}")
-except Exception as e:
-    print(f"❌ Failed to open serial port {SERIAL_PORT}: {e}")
-    ser = None
+ser = None
+
+
+def open_serial():
+    global ser
+    try:
+        port = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
+        time.sleep(2)  # Arduino resets when the port opens
+        ser = port
+        log.info("Connected to Arduino on %s", SERIAL_PORT)
+    except Exception as e:
+        log.error("Failed to open serial port %s: %s", SERIAL_PORT, e)
+        return None
+    wait_for_activate_input(timeout=3)
+    return ser
+
+
+# === Background Boot ===
+TIMESCALE = BackgroundInit("timescale", load_timescale)
+CATALOGUE = BackgroundInit("catalogue", load_tle_subset)
+SERIAL = BackgroundInit("serial", open_serial)
 
-# === TLE Fetching from local cache ===
+# === TLE Lookup (fetched from the server on first use) ===
 
 
 def get_tle_by_name(sat_name):
-    tle = TLE_CACHE.get(sat_name)
-    if tle:
-        return tle["line1"], tle["line2"]
-    else:
-        print(f"❌ Satellite '{sat_name}' not found in local TLE cache.")
-        return None, None
+    CATALOGUE.get(timeout=30)
+    return tles.get(sat_name)
 
 # === AZ/EL Computation ===
 
 
 def compute_az_el_by_name(sat_name, lat, lon, alt=0):
+    from skyfield.api import wgs84, EarthSatellite
     try:
         tle1, tle2 = get_tle_by_name(sat_name)
         if not tle1 or not tle2:
             raise Exception("No valid TLE lines received.")
+        ts = TIMESCALE.get(timeout=30)
+        if ts is None:
+            raise Exception("Timescale not available.")
         satellite = EarthSatellite(tle1, tle2, sat_name, ts)
         observer = wgs84.latlon(latitude_degrees=lat,
                                 longitude_degrees=lon, elevation_m=alt)
-        t = ts.now()
+        t = ts.from_datetime(clock.now())
         difference = satellite - observer
         topocentric = difference.at(t)
         alt, az, _ = topocentric.altaz()
         return round(az.degrees, 2), round(alt.degrees, 2)
     except Exception as e:
-        print(f"⚠️ Error computing AZ/EL: {e}")
+        log.warning("Error computing AZ/EL: %s", e)
         return None, None
 
+
+def compute_pass_profile(sat_name, start, duration, step):
+    from skyfield.api import wgs84, EarthSatellite
+    tle1, tle2 = get_tle_by_name(sat_name)
+    ts = TIMESCALE.get(timeout=30)
+    if not tle1 or not tle2 or ts is None:
+        return []
+    satellite = EarthSatellite(tle1, tle2, sat_name, ts)
+    observer = wgs84.latlon(latitude_degrees=LATITUDE,
+                            longitude_degrees=LONGITUDE, elevation_m=ALTITUDE)
+    return pointing_profile(ts, satellite, observer, start, duration, step)
+
 # === Senders ===
 
 
@@ -100,8 +149,8 @@ def send_initial_data():
         "fu_id": FU_ID,
         "sensor_data": {}  # Removed sensor reading
     }
-    print("📤 Sending initial sensor data", data)
-    sio.emit("field_unit_data", data)
+    log.info("Sending initial sensor data %s", data)
+    session.emit("field_unit_data", data)
 
 
 def send_sensor_data():
@@ -111,15 +160,15 @@ def send_sensor_data():
                 "fu_id": FU_ID,
                 "sensor_data": {}  # Clean logs by avoiding serial reads
             }
-            sio.emit("field_unit_data", data)
-        time.sleep(5)
+            session.emit("field_unit_data", data)
+        clock.sleep(5)
 
 
 def poll_az_el_loop():
     while True:
         if MODE == "A":
-            sio.emit("poll_az_el", {"fu_id": FU_ID})
-        time.sleep(5)
+            session.emit("poll_az_el", {"fu_id": FU_ID})
+        clock.sleep(5)
 
 
 def send_az_el_to_arduino(az_angle, el_angle, port='/dev/ttyACM0'):
@@ -128,37 +177,58 @@ def send_az_el_to_arduino(az_angle, el_angle, port='/dev/ttyACM0'):
         time.sleep(2)
         message = f"AZ: {az_angle:.2f}, EL: {el_angle:.2f}\n"
         arduino.write(message.encode('utf-8'))
-        print("✅ AZ/EL sent to Arduino successfully:", message.strip())
+        log.debug("AZ/EL sent to Arduino: %s", message.strip())
         arduino.close()
     except serial.SerialException as e:
-        print("❌ Serial error:", e)
+        log.error("Serial error: %s", e)
     except Exception as e:
-        print("❌ General error:", e)
+        log.error("Error sending AZ/EL to Arduino: %s", e)
+
+
+def point_antenna(az, el):
+    # Reuse the open port during passes; reopening costs a 2 s Arduino reset
+    if ser and ser.is_open:
+        try:
+            ser.write(f"AZ: {az:.2f}, EL: {el:.2f}\n".encode('utf-8'))
+            return
+        except serial.SerialException as e:
+            log.error("Serial error: %s", e)
+    send_az_el_to_arduino(az, el)
+
+
+# === Local Pass Execution ===
+executor = PassExecutor(
+    FU_ID, SCHEDULE_URL,
+    profile_fn=compute_pass_profile,
+    point_fn=point_antenna,
+    upload_fn=lambda result: session.call("pass_result", result) is True,
+    enabled=lambda: MODE == "A",
+    prefetch_fn=lambda names: tles.pin(names + [CURRENT_SATELLITE]))
 
 # === ACTIVATE Listener ===
 
 
 def wait_for_activate_input(timeout=3):
     if not ser or not ser.is_open:
-        print("⚠️ Serial not available for ACTIVATE input.")
+        log.warning("Serial not available for ACTIVATE input")
         return
 
-    print(f"⏳ Waiting for 'ACTIVATE' input from Arduino ({timeout}s)...")
+    log.info("Waiting for 'ACTIVATE' input from Arduino (%ss)", timeout)
     start_time = time.time()
     while time.time() - start_time < timeout:
         try:
             line = ser.readline().decode('utf-8', errors='ignore').strip()
             if line == "ACTIVATE":
-                print("🚀 'ACTIVATE' command received!")
+                log.info("'ACTIVATE' command received")
                 handle_activate()
                 return
         except Exception as e:
-            print(f"⚠️ Serial read error during activate wait: {e}")
-    print("⌛ Timeout reached. Continuing startup...")
+            log.warning("Serial read error during activate wait: %s", e)
+    log.info("No ACTIVATE within timeout, continuing startup")
 
 
 def handle_activate():
-    print("🟢 Activation logic triggered by 'ACTIVATE' input from Arduino!")
+    log.info("Activation logic triggered by 'ACTIVATE' input from Arduino")
 
 # === Manual Input Mode ===
 
@@ -197,19 +267,22 @@ def mode_controller():
 
 @sio.on("az_el_update")
 def on_az_el_update(data):
-    global MODE, last_sent_az, last_sent_el, unchanged_duration
+    global MODE, CURRENT_SATELLITE, last_sent_az, last_sent_el, unchanged_duration
 
     if data.get("fu_id") != FU_ID or MODE != "A":
         return
+    if executor.busy.is_set():
+        return  # a scheduled pass owns the antenna
 
     sat_name = data.get("satellite_name")
     if not sat_name or sat_name == "undefined":
-        print("⚠️ Invalid satellite name")
+        log.warning("Invalid satellite name")
         return
+    CURRENT_SATELLITE = sat_name
 
     az, el = compute_az_el_by_name(sat_name, LATITUDE, LONGITUDE, ALTITUDE)
     if az is None or el is None:
-        print(f"⚠️ AZ/EL computation failed for {sat_name}")
+        log.warning("AZ/EL computation failed for %s", sat_name)
         return
 
     # Change detection logic
@@ -226,13 +299,12 @@ def on_az_el_update(data):
         last_sent_el = el
     else:
         unchanged_duration += 5  # assuming this is called every 5 sec
-        print(
-            f"⏱️ No significant change in AZ/EL. Unchanged for {unchanged_duration}s")
+        log.debug("No significant change in AZ/EL. Unchanged for %ss", unchanged_duration)
         if unchanged_duration >= SEND_TIMEOUT:
-            print("❌ AZ/EL unchanged for 15s. Pausing Arduino updates.")
+            log.info("AZ/EL unchanged for %ss. Pausing Arduino updates", SEND_TIMEOUT)
 
     # Always emit result to dashboard
-    sio.emit("az_el_result", {
+    session.emit("az_el_result", {
         "fu_id": FU_ID,
         "az": az,
         "el": el,
@@ -244,27 +316,45 @@ def on_az_el_update(data):
         }
     })
 
-    print(f"📡 Computed AZ: {az:.2f}°, EL: {el:.2f}°")
+    log.debug("Computed AZ: %.2f°, EL: %.2f°", az, el)
 
 # === Socket.IO Connect Event ===
 
 
 @sio.event
 def connect():
-    print("✅ Connected to server")
+    log.info("Connected to server")
+    session.request_resume(CURRENT_SATELLITE)
     send_initial_data()
-    sio.start_background_task(send_sensor_data)
-    sio.start_background_task(poll_az_el_loop)
+    session.start_loop(send_sensor_data)
+    session.start_loop(poll_az_el_loop)
+
+
+@sio.on("session_resumed")
+def on_session_resumed(data):
+    if data.get("fu_id") != FU_ID:
+        return
+    schedule = data.get("schedule")
+    session.resumed.set()
+    log.info("Session resumed: sat=%s, %d scheduled passes",
+             data.get("satellite_name"), len(schedule or []))
+    if isinstance(schedule, list):
+        executor.update_schedule(schedule)
+    executor.upload_pending()
+    if data.get("satellite_name"):
+        on_az_el_update(data)
 
 
 # === Main Runner ===
 if __name__ == "__main__":
-    wait_for_activate_input(timeout=3)
+    setup_logging(os.environ.get("LOG_FILE", "logs/fu.log"))
+    clock.install_from_env()
+    # `kill -USR1 <pid>` writes logs/profile-*.folded covering every thread
+    profiling.install_signal_handler("logs", float(os.environ.get("PROFILE_SECONDS", 10)))
+    # Serial bring-up (2 s reset + ACTIVATE wait) no longer delays the connect
+    for init in (SERIAL, TIMESCALE, CATALOGUE):
+        init.start()
+    BackgroundInit("location", lambda: lookup_location(set_location)).start()
     threading.Thread(target=mode_controller, daemon=True).start()
-    while True:
-        try:
-            sio.connect(SERVER_URL)
-            sio.wait()
-        except Exception as e:
-            print(f"❌ Connection failed: {e}. Retrying in 3s...")
-            time.sleep(3)
+    executor.start()
+    session.run_forever(SERVER_URL)
@@ -3,88 +3,158 @@ import uuid
 import math
 import socketio
 import threading
-import geocoder
 import Adafruit_DHT
 import smbus2
-import board
-import busio
 import RPi.GPIO as GPIO
 import json
+import logging
 import os
-from adafruit_as5600 import AS5600
-from skyfield.api import load, wgs84, EarthSatellite
+import sys
+from tle_sync import TleSubset
+from boot_cache import BackgroundInit, cached_location, lookup_location
+from fu_session import FUSession
+
+# Shared modules (log_utils, clock) live in the repo root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import clock
+import profiling
+from antenna_control import Axis, TwoAxisController
+from sensor_sampler import AngleMedianFilter, MedianFilter, SensorSampler
+from log_utils import setup_logging
+from pass_executor import PassExecutor, pointing_profile
 
 # === CONFIGURATION ===
 SERVER_URL = "http://192.168.159.92:8080"
+SCHEDULE_URL = SERVER_URL
 FU_ID = ':'.join(
     f"{(uuid.getnode() >> ele) & 0xff:02x}" for ele in range(40, -1, -8))
 
 # === LOCATION ===
-g = geocoder.ip('me')
-LATITUDE = g.latlng[0] if g.latlng else 28.6139
-LONGITUDE = g.latlng[1] if g.latlng else 77.2090
+# Last known fix from boot_cache.json; refreshed by a background geo-IP lookup
+LATITUDE, LONGITUDE = cached_location()
 ALTITUDE = 216
 
+log = logging.getLogger("fu")
+
+
+def set_location(lat, lon):
+    global LATITUDE, LONGITUDE
+    LATITUDE, LONGITUDE = lat, lon
+
 # === HARDWARE CONFIG ===
 DHT_SENSOR = Adafruit_DHT.DHT11
 DHT_PIN = 4
 DHT_INTERVAL = 2
 
 MUX_ADDR = 0x70
-ENC_CH1 = 0
+ENC_CH1 = 0  # azimuth encoder
+ENC_CH2 = 1  # elevation encoder
 
 RPWM1 = 9
 LPWM1 = 10
 M1_EN = 7
 
+RPWM2 = 13
+LPWM2 = 19
+M2_EN = 26
+
+# Motor shaft turns per antenna turn (was the `az * 2.5` scaling)
+AZ_GEAR_RATIO = 2.5
+EL_GEAR_RATIO = 2.5
+# Velocity feed-forward, % duty per motor deg/s (see antenna_control.Axis);
+# 100 / no-load motor speed in deg/s at full duty
+AZ_KV = 1.0
+EL_KV = 1.0
+CONTROL_RATE_HZ = 100
+ENCODER_PERIOD = 0.005   # 200 Hz, twice the control rate
+
 # === GLOBAL STATE ===
-sio = socketio.Client()
+sio = socketio.Client(reconnection_delay=1, reconnection_delay_max=60,
+                      randomization_factor=0.5)
+session = FUSession(sio, FU_ID)
 MODE = "A"
-TLE_CACHE_FILE = "all_tle_data.json"
-TLE_CACHE = {}
-ts = load.timescale()
+CURRENT_SATELLITE = None
+TLE_SYNC_S = 3600
+tles = TleSubset(SERVER_URL)
 last_dht_read = 0
 speed_value = 200
 azimuthang = 0.0
 
-# === I2C + Encoder Setup ===
-i2c = busio.I2C(board.SCL, board.SDA)
-bus = smbus2.SMBus(1)
+encoder = None
+i2c_bus = None
+i2c_lock = threading.Lock()
+mux_channel = None
+pwm = {}
+controller = None
 
 
 def select_i2c_channel(bus, addr, channel):
     bus.write_byte(addr, 1 << channel)
 
 
-select_i2c_channel(bus, MUX_ADDR, ENC_CH1)
-encoder = AS5600(i2c)
+def init_hardware():
+    global encoder, i2c_bus, controller
+    # Blinka imports are slow on a Pi; only pay for them off the boot path
+    import board
+    import busio
+    from adafruit_as5600 import AS5600
 
-# === GPIO + PWM Setup ===
-GPIO.setmode(GPIO.BCM)
-GPIO.setup([RPWM1, LPWM1, M1_EN], GPIO.OUT)
-GPIO.output(M1_EN, GPIO.HIGH)
-pwm_r = GPIO.PWM(RPWM1, 1000)
-pwm_l = GPIO.PWM(LPWM1, 1000)
-pwm_r.start(0)
-pwm_l.start(0)
+    # === I2C + Encoder Setup ===
+    # Both AS5600s share one address behind the mux; get_angle() switches channel
+    i2c = busio.I2C(board.SCL, board.SDA)
+    i2c_bus = smbus2.SMBus(1)
+    select_i2c_channel(i2c_bus, MUX_ADDR, ENC_CH1)
+    encoder = AS5600(i2c)
 
-# === TLE PERSISTENCE ===
+    # === GPIO + PWM Setup ===
+    GPIO.setmode(GPIO.BCM)
+    for r_pin, l_pin, en_pin in ((RPWM1, LPWM1, M1_EN), (RPWM2, LPWM2, M2_EN)):
+        GPIO.setup([r_pin, l_pin, en_pin], GPIO.OUT)
+        GPIO.output(en_pin, GPIO.HIGH)
+        for pin in (r_pin, l_pin):
+            pwm[pin] = GPIO.PWM(pin, 1000)
+            pwm[pin].start(0)
 
+    # === Encoder Sampling ===
+    sampler.add("enc_az", lambda: get_angle(ENC_CH1), ENCODER_PERIOD,
+                AngleMedianFilter(3), max_age=0.05)
+    sampler.add("enc_el", lambda: get_angle(ENC_CH2), ENCODER_PERIOD,
+                AngleMedianFilter(3), max_age=0.05)
+
+    # === Control Loop ===
+    # Reads the sampler's latest values; the loop never waits on the I2C bus
+    controller = TwoAxisController([
+        Axis("az", lambda: sampler.value("enc_az"), lambda u: drive_motor(RPWM1, LPWM1, u),
+             gear_ratio=AZ_GEAR_RATIO, kp=2.0, kv=AZ_KV),
+        Axis("el", lambda: sampler.value("enc_el"), lambda u: drive_motor(RPWM2, LPWM2, u),
+             gear_ratio=EL_GEAR_RATIO, kp=2.0, kv=EL_KV, continuous=False,
+             limits=(0.0, 90.0)),
+    ], rate_hz=CONTROL_RATE_HZ)
+    controller.start()
+    return True
 
-def load_tle_cache():
-    global TLE_CACHE
-    if os.path.exists(TLE_CACHE_FILE):
-        try:
-            with open(TLE_CACHE_FILE, 'r') as f:
-                raw = json.load(f)
-                TLE_CACHE = {k: (v["line1"], v["line2"])
-                             for k, v in raw.items()}
-                print(
-                    f"[TLE] Loaded {len(TLE_CACHE)} TLEs from {TLE_CACHE_FILE}")
-        except Exception as e:
-            print(f"[TLE] Failed to load local cache: {e}")
-    else:
-        print(f"[TLE] File {TLE_CACHE_FILE} not found")
+
+def load_timescale():
+    from skyfield.api import load
+    return load.timescale()
+
+
+# === BACKGROUND BOOT ===
+sampler = SensorSampler()
+HARDWARE = BackgroundInit("hardware", init_hardware)
+TIMESCALE = BackgroundInit("timescale", load_timescale)
+
+# === TLE SUBSET ===
+
+
+def load_tle_subset():
+    tles.load()
+    tles.start(TLE_SYNC_S)
+    return tles
+
+
+CATALOGUE = BackgroundInit("catalogue", load_tle_subset)
 
 # === UTILS ===
 
@@ -110,119 +180,188 @@ def should_rotate(target, current, threshold=1.0):
     return abs(get_error(target, current)) >= threshold
 
 
-def get_angle():
-    return (encoder.raw_angle * 360.0) / 4096.0
-
-
-def rotate_motor(d_angle, speed=speed_value):
-    kp, ki, kd = 2.0, 0.0, 0.0
-    I, prev_e = 0, 0
-    start_ang = get_angle()
-    target_ang = wrap360(start_ang + d_angle)
-    t_end = time.time() + 5
-    print(f"[ROTATE] {start_ang:.2f} -> {target_ang:.2f}")
-
-    while time.time() < t_end:
-        cur_ang = get_angle()
-        e = get_error(target_ang, cur_ang)
-        if abs(e) < 1:
-            break
-        dt = 0.01
-        I += e * dt
-        D = (e - prev_e) / dt
-        prev_e = e
-        u = kp * e + ki * I + kd * D
-        pwm = min(abs(u), speed)
-        if u >= 0:
-            pwm_r.ChangeDutyCycle(pwm)
-            pwm_l.ChangeDutyCycle(0)
-        else:
-            pwm_r.ChangeDutyCycle(0)
-            pwm_l.ChangeDutyCycle(pwm)
-        time.sleep(dt)
+def get_angle(channel=ENC_CH1):
+    global mux_channel
+    with i2c_lock:
+        if channel != mux_channel:
+            select_i2c_channel(i2c_bus, MUX_ADDR, channel)
+            mux_channel = channel
+        return (encoder.raw_angle * 360.0) / 4096.0
+
+
+def drive_motor(r_pin, l_pin, u):
+    # speed_value (0-255, set in manual mode) caps the duty cycle
+    duty = min(abs(u), speed_value * 100.0 / 255.0)
+    pwm[r_pin].ChangeDutyCycle(duty if u > 0 else 0)
+    pwm[l_pin].ChangeDutyCycle(duty if u < 0 else 0)
+
+
+_last_point = None
+
+
+def point_antenna(az, el, az_rate=None, el_rate=None):
+    """Hand a new az/el target to the control loop.
+
+    Without explicit rates (pass profiles) the feed-forward rate is taken
+    from the previous target.
+    """
+    global _last_point
+    if not HARDWARE.get(timeout=10) or controller is None:
+        log.warning("Motor hardware not ready")
+        return
+    now = time.monotonic()
+    if az_rate is None or el_rate is None:
+        az_rate = el_rate = 0.0
+        if _last_point and 0 < now - _last_point[0] <= 5:
+            dt = now - _last_point[0]
+            az_rate = get_error(az, _last_point[1]) / dt
+            el_rate = (el - _last_point[2]) / dt
+    _last_point = (now, az, el)
+    controller.set_target(az, el, az_rate, el_rate)
 
-    pwm_r.ChangeDutyCycle(0)
-    pwm_l.ChangeDutyCycle(0)
 
 # === SENSOR + AZ/EL ===
 
 
-def read_dht():
+def sample_dht():
     h, t = Adafruit_DHT.read(DHT_SENSOR, DHT_PIN)
-    if h is not None and t is not None:
-        return {"temperature": t, "humidity": h, "Latitude": LATITUDE, "Longitude": LONGITUDE}
-    return {}
+    if h is None or t is None:
+        return None
+    return t, h
+
+
+sampler.add("dht", sample_dht, DHT_INTERVAL, MedianFilter(3), max_age=5 * DHT_INTERVAL)
+
+
+def read_dht():
+    """Latest filtered DHT reading; never touches the sensor itself."""
+    reading = sampler.value("dht")
+    if reading is None:
+        return {}
+    t, h = reading
+    return {"temperature": round(t, 1), "humidity": round(h, 1),
+            "Latitude": LATITUDE, "Longitude": LONGITUDE}
 
 
 def get_tle_by_name(sat_name):
-    if sat_name in TLE_CACHE:
-        return TLE_CACHE[sat_name]
-    print(f"[TLE] Satellite '{sat_name}' not found in local cache")
-    return None, None
+    CATALOGUE.get(timeout=30)
+    return tles.get(sat_name)
 
 
-def compute_az_el(sat_name):
+def compute_track(sat_name):
+    """Current az/el (deg) and their rates (deg/s) for feed-forward."""
+    from skyfield.api import wgs84, EarthSatellite
     try:
         tle1, tle2 = get_tle_by_name(sat_name)
         if not tle1 or not tle2:
             raise Exception("Missing TLE")
+        ts = TIMESCALE.get(timeout=30)
+        if ts is None:
+            raise Exception("Timescale not available")
         sat = EarthSatellite(tle1, tle2, sat_name, ts)
         observer = wgs84.latlon(LATITUDE, LONGITUDE, ALTITUDE)
-        topocentric = (sat - observer).at(ts.now())
-        alt, az, _ = topocentric.altaz()
-        return round(az.degrees, 2), round(alt.degrees, 2)
+        now = ts.from_datetime(clock.now())
+        t = ts.tt_jd([now.tt, now.tt + 1.0 / 86400])
+        alt, az, _ = (sat - observer).at(t).altaz()
+        az_rate = get_error(az.degrees[1], az.degrees[0])
+        el_rate = alt.degrees[1] - alt.degrees[0]
+        return (round(az.degrees[0], 2), round(alt.degrees[0], 2),
+                round(az_rate, 4), round(el_rate, 4))
     except Exception as e:
-        print(f"[AZ/EL] Error: {e}")
-        return None, None
+        log.warning("AZ/EL error: %s", e)
+        return None, None, None, None
+
+
+def compute_pass_profile(sat_name, start, duration, step):
+    from skyfield.api import wgs84, EarthSatellite
+    tle1, tle2 = get_tle_by_name(sat_name)
+    ts = TIMESCALE.get(timeout=30)
+    if not tle1 or not tle2 or ts is None:
+        return []
+    sat = EarthSatellite(tle1, tle2, sat_name, ts)
+    observer = wgs84.latlon(LATITUDE, LONGITUDE, ALTITUDE)
+    return pointing_profile(ts, sat, observer, start, duration, step)
+
+
+# === LOCAL PASS EXECUTION ===
+executor = PassExecutor(
+    FU_ID, SCHEDULE_URL,
+    profile_fn=compute_pass_profile,
+    point_fn=point_antenna,
+    upload_fn=lambda result: session.call("pass_result", result) is True,
+    enabled=lambda: MODE == "A",
+    prefetch_fn=lambda names: tles.pin(names + [CURRENT_SATELLITE]))
 
 # === SOCKET.IO ===
 
 
 @sio.event
 def connect():
-    print("[SOCKET] Connected")
+    log.info("Connected to server")
+    session.request_resume(CURRENT_SATELLITE)
     send_initial_data()
-    sio.start_background_task(send_sensor_loop)
-    sio.start_background_task(poll_az_el_loop)
+    session.start_loop(send_sensor_loop)
+    session.start_loop(poll_az_el_loop)
+
+
+@sio.on("session_resumed")
+def on_session_resumed(data):
+    if data.get("fu_id") != FU_ID:
+        return
+    schedule = data.get("schedule")
+    session.resumed.set()
+    log.info("Session resumed: sat=%s, %d scheduled passes",
+             data.get("satellite_name"), len(schedule or []))
+    if isinstance(schedule, list):
+        executor.update_schedule(schedule)
+    executor.upload_pending()
+    if data.get("satellite_name"):
+        on_az_el_update(data)
 
 
 @sio.on("az_el_update")
 def on_az_el_update(data):
+    global CURRENT_SATELLITE
     if data.get("fu_id") != FU_ID or MODE != "A":
         return
+    if executor.busy.is_set():
+        return  # a scheduled pass owns the antenna
     sat = data.get("satellite_name")
-    print(f"[AUTO] Received satellite: {sat}")
-    az, el = compute_az_el(sat)
+    log.debug("Received satellite: %s", sat)
+    CURRENT_SATELLITE = sat
+    az, el, az_rate, el_rate = compute_track(sat)
     if az is not None:
-        rotate_motor(az * 2.5)
-        sio.emit("az_el_result", {
+        point_antenna(az, el, az_rate, el_rate)
+        session.emit("az_el_result", {
             "fu_id": FU_ID,
             "az": az,
             "el": el,
             "satellite_name": sat,
-            "gps": {"lat": LATITUDE, "lon": LONGITUDE, "alt": ALTITUDE}
+            "gps": {"lat": LATITUDE, "lon": LONGITUDE, "alt": ALTITUDE},
+            "control": controller.stats() if controller else None,
+            "sensors": sampler.stats()
         })
 
 # === TASKS ===
 
 
 def send_initial_data():
-    sio.emit("field_unit_data", {"fu_id": FU_ID, "sensor_data": read_dht()})
+    session.emit("field_unit_data", {"fu_id": FU_ID, "sensor_data": read_dht()})
 
 
 def send_sensor_loop():
     while True:
         if MODE == "A":
-            sio.emit("field_unit_data", {
-                     "fu_id": FU_ID, "sensor_data": read_dht()})
-        time.sleep(5)
+            session.emit("field_unit_data", {
+                "fu_id": FU_ID, "sensor_data": read_dht()})
+        clock.sleep(5)
 
 
 def poll_az_el_loop():
     while True:
         if MODE == "A":
-            sio.emit("poll_az_el", {"fu_id": FU_ID})
-        time.sleep(5)
+            session.emit("poll_az_el", {"fu_id": FU_ID})
+        clock.sleep(5)
 
 
 def manual_mode_loop():
@@ -232,7 +371,8 @@ def manual_mode_loop():
             speed_value = int(input("Speed (0–255): "))
             angles = input("Enter azimuth,elevation: ").split(',')
             azimuthang = float(angles[0])
-            rotate_motor(azimuthang)
+            elevation = float(angles[1]) if len(angles) > 1 else 0.0
+            point_antenna(azimuthang, elevation, 0.0, 0.0)
         except:
             print("[MANUAL] Invalid input.")
 
@@ -254,17 +394,23 @@ def mode_controller():
 
 # === MAIN ===
 if __name__ == "__main__":
-    load_tle_cache()
+    setup_logging(os.environ.get("LOG_FILE", "logs/fu.log"))
+    clock.install_from_env()
+    # `kill -USR1 <pid>` writes logs/profile-*.folded covering every thread
+    profiling.install_signal_handler("logs", float(os.environ.get("PROFILE_SECONDS", 10)))
+    # Slow initialisation runs in the background; connect and report right away
+    sampler.start()
+    for init in (HARDWARE, TIMESCALE, CATALOGUE):
+        init.start()
+    BackgroundInit("location", lambda: lookup_location(set_location)).start()
     try:
         threading.Thread(target=mode_controller, daemon=True).start()
-        while True:
-            try:
-                sio.connect(SERVER_URL)
-                sio.wait()
-            except Exception as e:
-                print(f"[SOCKET] Retry in 3s: {e}")
-                time.sleep(3)
+        executor.start()
+        session.run_forever(SERVER_URL)
     finally:
-        pwm_r.stop()
-        pwm_l.stop()
+        if controller:
+            controller.stop()
+        sampler.stop()
+        for channel in pwm.values():
+            channel.stop()
         GPIO.cleanup()
@@ -0,0 +1,247 @@
+"""Fixed-rate two-axis antenna control loop.
+
+One thread runs every axis at `rate_hz` on `clock.monotonic()`. Each
+iteration measures the real dt instead of assuming it. Each axis closes a PID
+loop on its encoder and adds a velocity feed-forward term from the target's
+angular rate, so the loop keeps up near zenith where azimuth rates peak.
+Between target updates the setpoint is extrapolated along that rate.
+
+Timing (dt, jitter, overruns) and tracking error statistics are kept per loop
+and per axis; `stats()` returns a snapshot for telemetry.
+"""
+import logging
+import math
+import threading
+
+import clock
+
+log = logging.getLogger("control")
+
+
+def wrap360(angle):
+    return angle % 360.0
+
+
+def shortest_error(target, current):
+    return (target - current + 180.0) % 360.0 - 180.0
+
+
+class RunningStats:
+    __slots__ = ("n", "total", "sq", "peak")
+
+    def __init__(self):
+        self.n, self.total, self.sq, self.peak = 0, 0.0, 0.0, 0.0
+
+    def add(self, value):
+        self.n += 1
+        self.total += value
+        self.sq += value * value
+        self.peak = max(self.peak, abs(value))
+
+    def summary(self, scale=1.0, digits=3):
+        if not self.n:
+            return {"mean": None, "rms": None, "max": None}
+        return {
+            "mean": round(self.total / self.n * scale, digits),
+            "rms": round(math.sqrt(self.sq / self.n) * scale, digits),
+            "max": round(self.peak * scale, digits),
+        }
+
+
+class Axis:
+    """One motor/encoder pair.
+
+    `read_angle()` returns the single-turn encoder angle (deg) on the motor
+    shaft, or None if no fresh sample is available, and `drive(u)` applies a signed duty cycle in [-100, 100]. Antenna
+    angles are motor angles divided by `gear_ratio`. Continuous (azimuth)
+    axes take the shortest way round; bounded axes clamp to `limits`.
+
+    `kp`, `ki` and `kd` are duty-cycle percent per antenna degree (per
+    degree-second, per degree/s). The feed-forward gain `kv` is percent duty
+    per motor degree/s of target rate: calibrate it as the duty that holds a
+    steady 1 deg/s on the motor shaft, roughly `max_output` divided by the
+    no-load motor speed in deg/s. The default of 1.0 assumes the motor turns
+    100 deg/s at full duty; kv=0 disables feed-forward.
+    """
+
+    def __init__(self, name, read_angle, drive, gear_ratio=1.0, kp=2.0, ki=0.0,
+                 kd=0.0, kv=1.0, max_output=100.0, deadband=0.5, continuous=True,
+                 limits=(0.0, 90.0), stall_timeout=2.0, max_extrapolation=10.0):
+        self.name = name
+        self.read_angle = read_angle
+        self.drive = drive
+        self.gear_ratio = gear_ratio
+        self.kp, self.ki, self.kd, self.kv = kp, ki, kd, kv
+        self.max_output = max_output
+        self.deadband = deadband
+        self.continuous = continuous
+        self.limits = limits
+        self.stall_timeout = stall_timeout
+        self.max_extrapolation = max_extrapolation
+
+        self.target = None          # (angle, rate, t0)
+        self.motor_angle = None     # unwrapped encoder angle
+        self._last_raw = None
+        self._integral = 0.0
+        self._prev_error = None
+        self._stall_since = None
+        self._stall_pos = None
+        self.fault = None
+        self.missed_samples = 0
+        self.error_stats = RunningStats()
+
+    @property
+    def position(self):
+        return None if self.motor_angle is None else self.motor_angle / self.gear_ratio
+
+    def set_target(self, angle, rate=0.0, t0=None):
+        if not self.continuous:
+            angle = min(max(angle, self.limits[0]), self.limits[1])
+        self.target = (angle, rate, clock.monotonic() if t0 is None else t0)
+        self.fault = None
+        self._stall_since = None    # a new target restarts the stall timer
+
+    def clear(self):
+        self.target = None
+        self._integral = 0.0
+        self._prev_error = None
+        self.drive(0.0)
+
+    def _sample(self):
+        raw = self.read_angle()
+        if raw is None:
+            self.missed_samples += 1
+            return False
+        if self._last_raw is None:
+            self.motor_angle = raw
+        else:
+            self.motor_angle += shortest_error(raw, self._last_raw)
+        self._last_raw = raw
+        return True
+
+    def setpoint(self, now):
+        angle, rate, t0 = self.target
+        ahead = min(max(now - t0, 0.0), self.max_extrapolation)
+        sp = angle + rate * ahead
+        if self.continuous:
+            return wrap360(sp), rate
+        return min(max(sp, self.limits[0]), self.limits[1]), rate
+
+    def update(self, now, dt):
+        if not self._sample():
+            if self.target is not None:
+                self.drive(0.0)     # never drive blind on a stale encoder
+            return
+        if self.target is None or self.motor_angle is None or self.fault:
+            return
+        sp, rate = self.setpoint(now)
+        pos = self.position
+        error = shortest_error(sp, wrap360(pos)) if self.continuous else sp - pos
+        self.error_stats.add(error)
+
+        if abs(error) < self.deadband and abs(rate) < 1e-3:
+            self._integral = 0.0
+            self._prev_error = error
+            self.drive(0.0)
+            return
+
+        self._integral += error * dt
+        derivative = 0.0 if self._prev_error is None or dt <= 0 else (error - self._prev_error) / dt
+        self._prev_error = error
+        # Loop gains act on antenna degrees; feed-forward is scaled to the motor
+        u = (self.kp * error + self.ki * self._integral + self.kd * derivative
+             + self.kv * rate * self.gear_ratio)
+        if abs(u) > self.max_output:
+            self._integral -= error * dt    # anti-windup: don't integrate while saturated
+            u = math.copysign(self.max_output, u)
+        self.drive(u)
+        self._check_stall(now, error)
+
+    def _check_stall(self, now, error):
+        if abs(error) < 5 * self.deadband:
+            self._stall_since = None
+            return
+        if self._stall_since is None or abs(self.motor_angle - self._stall_pos) > 1.0:
+            self._stall_since, self._stall_pos = now, self.motor_angle
+        elif now - self._stall_since > self.stall_timeout:
+            self.fault = f"stalled {error:.1f} deg from setpoint"
+            log.error("%s axis %s; output disabled", self.name, self.fault)
+            self.drive(0.0)
+
+
+class TwoAxisController:
+    def __init__(self, axes, rate_hz=100.0):
+        self.axes = {axis.name: axis for axis in axes}
+        self.period = 1.0 / rate_hz
+        self.dt_stats = RunningStats()
+        self.jitter_stats = RunningStats()
+        self.work_stats = RunningStats()
+        self.overruns = 0
+        self.iterations = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def set_target(self, az, el, az_rate=0.0, el_rate=0.0):
+        t0 = clock.monotonic()
+        if "az" in self.axes:
+            self.axes["az"].set_target(az, az_rate, t0)
+        if "el" in self.axes:
+            self.axes["el"].set_target(el, el_rate, t0)
+
+    def position(self):
+        return {name: axis.position for name, axis in self.axes.items()}
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="antenna-control", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        for axis in self.axes.values():
+            axis.clear()
+
+    def _run(self):
+        period = self.period
+        next_tick = clock.monotonic()
+        last = next_tick
+        while not self._stop.is_set():
+            now = clock.monotonic()
+            dt = now - last
+            last = now
+            if self.iterations:
+                self.dt_stats.add(dt)
+                self.jitter_stats.add(now - next_tick)
+
+            for axis in self.axes.values():
+                try:
+                    axis.update(now, dt)
+                except Exception as e:
+                    log.warning("%s update failed: %s", axis.name, e)
+            self.iterations += 1
+
+            work = clock.monotonic() - now
+            self.work_stats.add(work)
+            next_tick += period
+            delay = next_tick - clock.monotonic()
+            if delay > 0:
+                clock.wait(self._stop, delay)
+            else:
+                self.overruns += 1
+                if -delay > period:
+                    next_tick = clock.monotonic()   # too far behind: resync, don't burst
+
+    def stats(self):
+        return {
+            "rate_hz": round(1.0 / self.period, 1),
+            "iterations": self.iterations,
+            "overruns": self.overruns,
+            "dt_ms": self.dt_stats.summary(1000.0),
+            "jitter_ms": self.jitter_stats.summary(1000.0),
+            "work_ms": self.work_stats.summary(1000.0),
+            "tracking_error_deg": {n: a.error_stats.summary() for n, a in self.axes.items()},
+            "missed_samples": {n: a.missed_samples for n, a in self.axes.items()},
+            "faults": {n: a.fault for n, a in self.axes.items() if a.fault},
+        }
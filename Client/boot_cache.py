@@ -0,0 +1,91 @@
+"""Boot helpers for the field unit clients.
+
+Nothing slow runs on the import path any more: the geo-IP lookup, Skyfield
+timescale, TLE catalogue and hardware bring-up each run in a `BackgroundInit`
+thread while the client connects and reports straight away. The last known
+location is kept in `boot_cache.json` so the FU reports a sensible position
+before (or without) the network lookup.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+BOOT_CACHE_FILE = "boot_cache.json"
+DEFAULT_LOCATION = (28.6139, 77.2090)
+
+log = logging.getLogger("boot")
+
+
+class BackgroundInit:
+    """Run `fn` once in a daemon thread; `get()` waits for its result."""
+
+    def __init__(self, name, fn):
+        self.name = name
+        self.fn = fn
+        self.value = None
+        self.error = None
+        self._done = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, name=f"init-{self.name}", daemon=True).start()
+        return self
+
+    def _run(self):
+        t0 = time.monotonic()
+        try:
+            self.value = self.fn()
+            log.info("%s ready in %.2fs", self.name, time.monotonic() - t0)
+        except Exception as e:
+            self.error = e
+            log.warning("%s failed after %.2fs: %s", self.name, time.monotonic() - t0, e)
+        finally:
+            self._done.set()
+
+    def ready(self):
+        return self._done.is_set() and self.error is None
+
+    def get(self, timeout=None):
+        """Return the value, or None if it failed or is not ready in time."""
+        self._done.wait(timeout)
+        return self.value
+
+
+def _load_boot_cache():
+    if os.path.exists(BOOT_CACHE_FILE):
+        try:
+            with open(BOOT_CACHE_FILE, "r") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            pass
+    return {}
+
+
+def _save_boot_cache(data):
+    tmp = BOOT_CACHE_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, BOOT_CACHE_FILE)
+
+
+def cached_location(default=DEFAULT_LOCATION):
+    loc = _load_boot_cache().get("location")
+    if loc and len(loc) == 2:
+        return loc[0], loc[1]
+    return default
+
+
+def lookup_location(on_update):
+    """Geo-IP lookup; persists and reports the result if it differs."""
+    import geocoder  # pulls in requests; keep it off the import path
+    g = geocoder.ip('me')
+    if not g.latlng:
+        raise RuntimeError("geo-IP lookup returned no location")
+    lat, lon = g.latlng[0], g.latlng[1]
+    cache = _load_boot_cache()
+    if cache.get("location") != [lat, lon]:
+        cache["location"] = [lat, lon]
+        _save_boot_cache(cache)
+    on_update(lat, lon)
+    return lat, lon
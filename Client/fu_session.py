@@ -0,0 +1,91 @@
+"""Connection helpers shared by the field unit clients.
+
+* `FUSession.run_forever` retries the initial connect with exponential backoff
+  and full jitter, so a fleet of FUs does not hit a restarted server in the
+  same instant.
+* `FUSession.start_loop` starts a background task once per process; reconnects
+  no longer pile up duplicate emit loops.
+* `FUSession.emit` works from inside the `connect` handler. python-socketio
+  only sets `Client.connected` after that handler returns, so emits are gated
+  on the default namespace being connected instead.
+"""
+import logging
+import random
+import threading
+import time
+
+log = logging.getLogger("session")
+
+
+def backoff_delays(base=1.0, cap=60.0):
+    """Yield retry delays: uniform in [0, min(cap, base * 2**attempt)]."""
+    attempt = 0
+    while True:
+        yield random.uniform(0, min(cap, base * (2 ** attempt)))
+        attempt = min(attempt + 1, 16)
+
+
+class FUSession:
+    def __init__(self, sio, fu_id, base_delay=1.0, max_delay=60.0):
+        self.sio = sio
+        self.fu_id = fu_id
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.resumed = threading.Event()
+        self._loops = set()
+        self._lock = threading.Lock()
+
+    def start_loop(self, target):
+        """Start `target` as a background task unless it is already running."""
+        with self._lock:
+            if target.__name__ in self._loops:
+                return False
+            self._loops.add(target.__name__)
+        self.sio.start_background_task(target)
+        return True
+
+    @property
+    def connected(self):
+        return "/" in self.sio.namespaces
+
+    def emit(self, event, data):
+        """Emit only while connected; loops keep running across reconnects."""
+        if not self.connected:
+            return False
+        try:
+            self.sio.emit(event, data)
+            return True
+        except Exception as e:
+            log.warning("Emit '%s' failed: %s", event, e)
+            return False
+
+    def call(self, event, data, timeout=10):
+        """Emit and wait for the server's acknowledgement; None if unavailable."""
+        if not self.connected:
+            return None
+        try:
+            return self.sio.call(event, data, timeout=timeout)
+        except Exception as e:
+            log.warning("Call '%s' failed: %s", event, e)
+            return None
+
+    def request_resume(self, satellite_name=None):
+        self.resumed.clear()
+        self.emit("resume_session", {
+            "fu_id": self.fu_id,
+            "satellite_name": satellite_name,
+        })
+
+    def run_forever(self, url):
+        delays = backoff_delays(self.base_delay, self.max_delay)
+        while True:
+            try:
+                self.sio.connect(url)
+                delays = backoff_delays(self.base_delay, self.max_delay)
+                self.sio.wait()
+                delay = next(delays)
+                log.info("Connection closed. Reconnecting in %.1fs", delay)
+            except Exception as e:
+                delay = next(delays)
+                log.warning("Connect failed: %s. Retrying in %.1fs", e, delay)
+            time.sleep(delay)
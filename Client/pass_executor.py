@@ -0,0 +1,287 @@
+"""Local pass scheduler for field units.
+
+The FU fetches its assigned passes from the server it is connected to
+(`/api/fu_schedule/{fu_id}`, also pushed with `session_resumed`), precomputes an az/el pointing profile for each
+one and then runs them from its own thread. Timing is driven by
+`clock.monotonic()`, so a wall-clock step or a dropped server link does not
+disturb a pass in progress, and a simulated clock runs passes faster than
+real time. Every schedule received is written to `schedule_cache.json`. A
+failed fetch keeps the passes already loaded; the cache is only read when
+nothing is loaded yet, e.g. after a reboot without a link. Results are
+uploaded once the pass is over; if the link is down they are kept in
+`pending_results.json` and retried later.
+"""
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+
+import requests
+
+import clock
+
+SCHEDULE_CACHE_FILE = "schedule_cache.json"
+PENDING_RESULTS_FILE = "pending_results.json"
+DEFAULT_DURATION = 600
+
+log = logging.getLogger("pass")
+
+
+def parse_start(entry):
+    """Return the pass start as a UTC epoch, or None if it cannot be parsed."""
+    try:
+        return clock.parse_time(entry.get("start_time") or entry.get("timestamp"))
+    except ValueError:
+        return None
+
+
+def pointing_profile(ts, satellite, observer, start, duration, step):
+    """Az/el at every `step` seconds of a pass, computed in one vectorized call."""
+    dt = datetime.fromtimestamp(start, tz=timezone.utc)
+    seconds = [dt.second + dt.microsecond / 1e6 + i * step
+               for i in range(int(duration // step) + 1)]
+    t = ts.utc(dt.year, dt.month, dt.day, dt.hour, dt.minute, seconds)
+    alt, az, _ = (satellite - observer).at(t).altaz()
+    return [(round(float(a), 2), round(float(e), 2))
+            for a, e in zip(az.degrees, alt.degrees)]
+
+
+def _already_run(done, sat, start):
+    """True for a pass already run, or a rescheduled copy starting inside one.
+
+    The scheduler samples from its own start time, so a later schedule can
+    list a pass in progress with a slightly different start.
+    """
+    return (sat, start) in done or any(
+        s == sat and t0 <= start < t1 for (s, t0), t1 in done.items())
+
+
+def _load_json(path, default):
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            log.warning("Ignoring unreadable %s: %s", path, e)
+    return default
+
+
+def _save_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+class PassExecutor:
+    """Fetch, precompute and run assigned passes independently of the server.
+
+    `profile_fn(sat_name, start, duration, step)` returns the pointing profile,
+    `point_fn(az, el)` drives the antenna and `upload_fn(result)` returns True
+    once the server has the pass result. `prefetch_fn(names)`, if given, is
+    called with the scheduled satellites before their profiles are computed.
+    `state_dir` holds the schedule cache and unsent results (default: cwd).
+
+    Schedules pushed from other threads (`update_schedule`) are handed to the
+    executor thread, which does the prefetching and precomputation, so a
+    Socket.IO handler never waits on them. Call `close()` to stop the thread.
+    """
+
+    def __init__(self, fu_id, base_url, profile_fn, point_fn, upload_fn,
+                 step=1.0, refresh_s=900, enabled=lambda: True, prefetch_fn=None,
+                 state_dir=""):
+        self.fu_id = fu_id
+        self.base_url = base_url
+        self.profile_fn = profile_fn
+        self.point_fn = point_fn
+        self.upload_fn = upload_fn
+        self.step = step
+        self.refresh_s = refresh_s
+        self.enabled = enabled
+        self.prefetch_fn = prefetch_fn
+        self.cache_path = os.path.join(state_dir, SCHEDULE_CACHE_FILE)
+        self.pending_path = os.path.join(state_dir, PENDING_RESULTS_FILE)
+        self.passes = []      # [{"entry", "start", "duration", "profile"}]
+        self.pending = _load_json(self.pending_path, [])
+        self.busy = threading.Event()
+        self.stop = threading.Event()
+        self.wake = threading.Event()
+        self._lock = threading.Lock()
+        self._done = {}       # (satellite, start) -> end of every pass taken off the list
+        self._incoming = None
+        self._etag = None
+
+    # --- Schedule ---
+
+    def fetch_schedule(self):
+        headers = {"If-None-Match": self._etag} if self._etag else {}
+        try:
+            r = requests.get(f"{self.base_url}/api/fu_schedule/{self.fu_id}",
+                             headers=headers, timeout=5)
+            if r.status_code == 304:
+                return
+            r.raise_for_status()
+            entries = r.json()
+            if not isinstance(entries, list):
+                raise ValueError(f"unexpected schedule payload: {entries}")
+            self._etag = r.headers.get("ETag")
+            log.info("Fetched %d assigned passes", len(entries))
+            self._save_cache(entries)
+        except Exception as e:
+            with self._lock:
+                loaded = len(self.passes)
+            if loaded:
+                log.warning("Schedule fetch failed (%s); keeping %d loaded passes", e, loaded)
+                return
+            entries = _load_json(self.cache_path, [])
+            log.warning("Schedule fetch failed (%s); using %d cached passes", e, len(entries))
+        self.prepare(entries)
+
+    def _save_cache(self, entries):
+        try:
+            _save_json(self.cache_path, entries)
+        except (OSError, TypeError, ValueError) as e:
+            log.warning("Could not cache the schedule: %s", e)
+
+    def update_schedule(self, entries):
+        """Adopt a schedule received from the server and cache it for the next boot.
+
+        Returns at once; the executor thread precomputes the passes.
+        """
+        self._save_cache(entries)
+        with self._lock:
+            self._incoming = list(entries)
+        self.wake.set()
+
+    def _take_incoming(self):
+        with self._lock:
+            entries, self._incoming = self._incoming, None
+        return entries
+
+    def prepare(self, entries):
+        now = clock.time()
+        entries = [e for e in entries if isinstance(e, dict)]
+        if self.prefetch_fn is not None:
+            try:
+                self.prefetch_fn([e.get("satellite") for e in entries])
+            except Exception as e:
+                log.warning("Prefetch failed: %s", e)
+        with self._lock:
+            known = {(p["entry"].get("satellite"), p["start"]): p for p in self.passes}
+            done = dict(self._done)
+        passes = []
+        for entry in entries:
+            try:
+                start = parse_start(entry)
+                sat = entry.get("satellite")
+                duration = float(entry.get("duration", DEFAULT_DURATION))
+                if start is None or not sat or start + duration < now:
+                    continue
+                if _already_run(done, sat, start):
+                    continue
+                p = known.get((sat, start))
+                if p is None:
+                    profile = self.profile_fn(sat, start, duration, self.step)
+                    if not profile:
+                        log.info("No profile for %s @ %s, skipping", sat, entry.get("start_time"))
+                        continue
+                    p = {"entry": entry, "start": start, "duration": duration, "profile": profile}
+            except Exception as e:
+                log.warning("Skipping pass %s: %s", entry, e)
+                continue
+            passes.append(p)
+        passes.sort(key=lambda p: p["start"])
+        with self._lock:
+            self.passes = passes
+        log.info("%d upcoming passes precomputed", len(passes))
+
+    # --- Execution ---
+
+    def run_pass(self, p):
+        # Anchor the pass to the monotonic clock once; wall-clock jumps are ignored
+        mono_start = clock.monotonic() + (p["start"] - clock.time())
+        track, skipped, max_late = [], 0, 0.0
+        self.busy.set()
+        log.info("Starting %s (%d points)", p["entry"].get("satellite"), len(p["profile"]))
+        try:
+            for i, (az, el) in enumerate(p["profile"]):
+                if self.stop.is_set() or not self.enabled():
+                    break
+                delay = mono_start + i * self.step - clock.monotonic()
+                if delay > 0:
+                    clock.wait(self.stop, delay)
+                elif -delay > self.step:
+                    skipped += 1
+                    continue
+                max_late = max(max_late, -delay)
+                self.point_fn(az, el)
+                track.append([round(p["start"] + i * self.step, 3), az, el])
+        finally:
+            self.busy.clear()
+
+        result = {
+            "fu_id": self.fu_id,
+            "satellite": p["entry"].get("satellite"),
+            "start_time": p["entry"].get("start_time"),
+            "duration": p["duration"],
+            "points": len(track),
+            "skipped": skipped,
+            "max_late_ms": round(max_late * 1000, 1),
+            "track": track,
+        }
+        with self._lock:
+            self.pending.append(result)
+            _save_json(self.pending_path, self.pending)
+        log.info("Finished %s: %d points, %s skipped", result["satellite"], len(track), skipped)
+        self.upload_pending()
+
+    def upload_pending(self):
+        with self._lock:
+            pending = list(self.pending)
+        if not pending:
+            return
+        sent = [r for r in pending if self.upload_fn(r)]
+        with self._lock:
+            self.pending = [r for r in self.pending if r not in sent]
+            _save_json(self.pending_path, self.pending)
+        if sent:
+            log.info("Uploaded %d pass results", len(sent))
+
+    def run(self):
+        last_fetch = None
+        while not self.stop.is_set():
+            self.wake.clear()
+            if last_fetch is None or clock.monotonic() - last_fetch >= self.refresh_s:
+                self.fetch_schedule()
+                self.upload_pending()
+                last_fetch = clock.monotonic()
+            entries = self._take_incoming()
+            if entries is not None:
+                self.prepare(entries)
+
+            with self._lock:
+                upcoming = self.passes[0] if self.passes else None
+            if upcoming is None:
+                clock.wait(self.wake, min(self.refresh_s, 60))
+                continue
+
+            wait = upcoming["start"] - clock.time()
+            if wait > 1:
+                clock.wait(self.wake, min(wait - 1, 60))
+                continue
+
+            with self._lock:
+                if self.passes and self.passes[0] is upcoming:
+                    self.passes.pop(0)
+                self._done[(upcoming["entry"].get("satellite"), upcoming["start"])] = (
+                    upcoming["start"] + upcoming["duration"])
+            if self.enabled():
+                self.run_pass(upcoming)
+
+    def start(self):
+        threading.Thread(target=self.run, name="pass-executor", daemon=True).start()
+
+    def close(self):
+        self.stop.set()
+        self.wake.set()
@@ -0,0 +1,131 @@
+"""Background sensor sampling for the field unit.
+
+Each `Channel` polls one device at its own period in its own daemon thread,
+so a DHT11 read that takes seconds never delays the encoders. Readings pass
+through an optional filter and the newest one is published as an immutable
+`Reading`. Publishing is a single attribute assignment, so consumers (the
+control loop, telemetry) read `channel.latest` without a lock and never wait
+on hardware. Periods and ages are in `clock.monotonic()` seconds, the
+clock the control loop runs on.
+"""
+import statistics
+import threading
+from collections import deque, namedtuple
+
+import clock
+
+Reading = namedtuple("Reading", "value t")   # t: clock.monotonic() of the sample
+
+
+class MedianFilter:
+    """Running median over the last `window` samples (scalars or tuples)."""
+
+    def __init__(self, window=5):
+        self.samples = deque(maxlen=window)
+
+    def __call__(self, value):
+        self.samples.append(value)
+        if isinstance(value, tuple):
+            return tuple(statistics.median(col) for col in zip(*self.samples))
+        return statistics.median(self.samples)
+
+
+class AngleMedianFilter(MedianFilter):
+    """Median of angles in degrees that stays correct across the 359 -> 0 wrap."""
+
+    def __call__(self, value):
+        self.samples.append(value)
+        offsets = [(a - value + 180.0) % 360.0 - 180.0 for a in self.samples]
+        return (value + statistics.median(offsets)) % 360.0
+
+
+class Channel:
+    def __init__(self, name, read, period, filter=None, max_age=None):
+        self.name = name
+        self.read = read
+        self.period = period
+        self.filter = filter
+        self.max_age = 3 * period if max_age is None else max_age
+        self.latest = None
+        self.samples = 0
+        self.failures = 0
+        self.last_error = None
+        self.read_ms = 0.0          # moving average of the device read time
+
+    def value(self, max_age=None, default=None):
+        """Latest filtered value, or `default` if none is fresh enough."""
+        reading = self.latest
+        limit = self.max_age if max_age is None else max_age
+        if reading is None or clock.monotonic() - reading.t > limit:
+            return default
+        return reading.value
+
+    def run(self, stop):
+        next_tick = clock.monotonic()
+        while not stop.is_set():
+            t0 = clock.monotonic()
+            try:
+                value = self.read()
+            except Exception as e:
+                value, self.last_error = None, str(e)
+            t1 = clock.monotonic()
+            self.read_ms += 0.1 * ((t1 - t0) * 1000.0 - self.read_ms)
+            if value is None:
+                self.failures += 1
+            else:
+                if self.filter is not None:
+                    value = self.filter(value)
+                self.latest = Reading(value, t1)
+                self.samples += 1
+
+            next_tick += self.period
+            delay = next_tick - clock.monotonic()
+            if delay > 0:
+                clock.wait(stop, delay)
+            else:
+                next_tick = clock.monotonic()   # slow device: don't try to catch up
+
+    def stats(self):
+        reading = self.latest
+        return {
+            "period_s": self.period,
+            "samples": self.samples,
+            "failures": self.failures,
+            "read_ms": round(self.read_ms, 2),
+            "age_s": None if reading is None else round(clock.monotonic() - reading.t, 3),
+            "last_error": self.last_error,
+        }
+
+
+class SensorSampler:
+    def __init__(self):
+        self.channels = {}
+        self._stop = threading.Event()
+        self._running = False
+
+    def add(self, name, read, period, filter=None, max_age=None):
+        channel = Channel(name, read, period, filter, max_age)
+        self.channels[name] = channel
+        if self._running:
+            self._spawn(channel)
+        return channel
+
+    def _spawn(self, channel):
+        threading.Thread(target=channel.run, args=(self._stop,),
+                         name=f"sample-{channel.name}", daemon=True).start()
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            for channel in list(self.channels.values()):
+                self._spawn(channel)
+
+    def stop(self):
+        self._stop.set()
+
+    def value(self, name, max_age=None, default=None):
+        channel = self.channels.get(name)
+        return default if channel is None else channel.value(max_age, default)
+
+    def stats(self):
+        return {name: channel.stats() for name, channel in self.channels.items()}
@@ -0,0 +1,161 @@
+"""Per-FU TLE subset, synced lazily from the server.
+
+Instead of the full catalogue, a field unit keeps only the satellites it has
+been assigned or has selected, in `tle_subset.json`. Unknown names are
+fetched on first use (`/api/tle/sync` with `since=0`). A background refresh
+sends the held names with the last catalogue revision and gets back only
+the elements that changed. The subset is bounded: once it holds `capacity`
+entries, the least recently used satellite that is not pinned by the
+schedule is dropped. Names the server reports missing are not asked for
+again until the catalogue revision moves on or `miss_retry_s` has passed.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+TLE_SUBSET_FILE = "tle_subset.json"
+MISS_RETRY_S = 900
+
+log = logging.getLogger("tle")
+
+
+class TleSubset:
+    def __init__(self, base_url, path=TLE_SUBSET_FILE, capacity=64, timeout=5,
+                 miss_retry_s=MISS_RETRY_S):
+        self.base_url = base_url
+        self.path = path
+        self.capacity = capacity
+        self.timeout = timeout
+        self.miss_retry_s = miss_retry_s
+        self.tles = OrderedDict()      # name -> (line1, line2), oldest use first
+        self.revision = 0
+        self.pinned = set()
+        self.misses = {}               # name -> (revision, monotonic time) of the miss
+        self._lock = threading.Lock()
+
+    # --- Persistence ---
+
+    def load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+                self.tles = OrderedDict((k, tuple(v)) for k, v in data.get("tles", {}).items())
+                self.revision = int(data.get("revision", 0))
+            except (OSError, ValueError, TypeError) as e:
+                log.warning("Ignoring unreadable %s: %s", self.path, e)
+        log.info("%d satellites in local subset (revision %s)", len(self.tles), self.revision)
+        return self
+
+    def save(self):
+        with self._lock:
+            data = {"revision": self.revision, "tles": dict(self.tles)}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    # --- Server ---
+
+    def _sync(self, names, since):
+        r = requests.post(f"{self.base_url}/api/tle/sync",
+                          json={"names": list(names), "since": since}, timeout=self.timeout)
+        r.raise_for_status()
+        return r.json()
+
+    def _apply(self, reply, fresh):
+        """Merge a sync reply; `fresh` marks a full fetch, not a delta."""
+        with self._lock:
+            before = (self.revision, len(self.tles))
+            # A fetch at since=0 only vouches for the names it returned
+            covers_all = set(self.tles) <= set(reply.get("tles", {}))
+            for name, tle in reply.get("tles", {}).items():
+                self.tles[name] = (tle["line1"], tle["line2"])
+                self.tles.move_to_end(name)
+                self.misses.pop(name, None)
+            if not fresh or covers_all:
+                self.revision = reply.get("revision", self.revision)
+            missed = (reply.get("revision", self.revision), time.monotonic())
+            for name in reply.get("missing", []):
+                self.tles.pop(name, None)
+                self.misses[name] = missed
+            self._evict()
+            changed = reply.get("tles") or (self.revision, len(self.tles)) != before
+        if changed:
+            self.save()    # spare the SD card when nothing moved
+
+    def _evict(self):
+        excess = len(self.tles) - self.capacity
+        for name in [n for n in self.tles if n not in self.pinned][:max(excess, 0)]:
+            del self.tles[name]
+
+    # --- Lookups ---
+
+    def get(self, name):
+        """(line1, line2) for `name`, fetching it if needed; (None, None) if unknown."""
+        with self._lock:
+            tle = self.tles.get(name)
+            if tle is not None:
+                self.tles.move_to_end(name)
+                return tle
+        asked = self.ensure([name])
+        with self._lock:
+            tle = self.tles.get(name)
+        if tle is None:
+            if asked:
+                log.warning("Satellite '%s' not available", name)
+            return None, None
+        return tle
+
+    def _recently_missed(self, name, now):
+        miss = self.misses.get(name)
+        return (miss is not None and miss[0] >= self.revision
+                and now - miss[1] < self.miss_retry_s)
+
+    def ensure(self, names):
+        """Fetch any of `names` not held locally, in one request; returns those asked for."""
+        now = time.monotonic()
+        with self._lock:
+            wanted = [n for n in dict.fromkeys(names)
+                      if n and n not in self.tles and not self._recently_missed(n, now)]
+        if not wanted:
+            return []
+        try:
+            self._apply(self._sync(wanted, 0), fresh=True)
+            log.info("Fetched %d satellites on demand", len(wanted))
+        except Exception as e:
+            log.warning("On-demand fetch failed: %s", e)
+        return wanted
+
+    def pin(self, names):
+        """Keep the scheduled satellites resident and make sure they are present."""
+        names = [n for n in names if n]
+        with self._lock:
+            self.pinned = set(names)
+        self.ensure(names)
+
+    def refresh(self):
+        """Pull elements that changed since the last revision seen."""
+        with self._lock:
+            names, since = list(self.tles), self.revision
+        if not names:
+            return
+        try:
+            reply = self._sync(names, since)
+            self._apply(reply, fresh=False)
+            log.info("Refreshed to revision %s: %d updated, %d dropped", reply.get("revision"),
+                     len(reply.get("tles", {})), len(reply.get("missing", [])))
+        except Exception as e:
+            log.warning("Refresh failed, keeping local elements: %s", e)
+
+    def start(self, interval=3600):
+        def loop():
+            while True:
+                self.refresh()
+                time.sleep(interval)
+        threading.Thread(target=loop, name="tle-sync", daemon=True).start()
@@ -1,21 +1,30 @@
+import logging
+import os
+
 import requests
 import json
 
-def fetch_all_tles():
-	url = "https://celestrak.org/NORAD/elements/gp.php?GROUP=active&FORMAT=tle"
+from log_utils import setup_logging
+
+CELESTRAK_URL = "https://celestrak.org/NORAD/elements/gp.php?GROUP=active&FORMAT=tle"
 
-	print("[INFO] Fetchong TLE data from Celestrak...")
-	response = requests.get(url)
+log = logging.getLogger("fetch")
+
+def download_tles(url=CELESTRAK_URL):
+	log.info("Fetching TLE data from Celestrak...")
+	response = requests.get(url, timeout=30)
 	if response.status_code != 200:
 		raise Exception(f"Failed to fecth TLE data: {response.status_code}")
+	return parse_tles(response.text)
 
-	tle_text = response.text.strip().splitlines()
+def parse_tles(text):
+	tle_text = text.strip().splitlines()
 	tle_data = {}
 
-	print("[INFO] Parsing TLE entries..")
+	log.info("Parsing TLE entries..")
 	for i in range(0, len(tle_text), 3):
 		if i+2 >= len(tle_text):
-			print("[INFO] Incomplete TLE set at lines {i}-{i+2}, skipping.")
+			log.warning("Incomplete TLE set at lines %d-%d, skipping.", i, i + 2)
 			continue
 		name = tle_text[i].strip()
 		line1 = tle_text[i+1].strip()
@@ -25,12 +34,23 @@ def fetch_all_tles():
 			"line2": line2
 		}
 
-	print(f"[INFO] Parsed {len(tle_data)} satellites. Saving to JSON...")
-	with open("satellites.json", "w") as f:
+	log.info("Parsed %d satellites.", len(tle_data))
+	return tle_data
+
+def fetch_all_tles(out_path="data/satellites.json"):
+	"""Refresh the catalogue the scheduler and the FU TLE sync API read."""
+	tle_data = download_tles()
+	log.info("Saving to JSON...")
+	# write-then-rename so the server never reloads a partial file
+	tmp = out_path + ".tmp"
+	with open(tmp, "w") as f:
 		json.dump(tle_data, f, indent=2)
+	os.replace(tmp, out_path)
 
-	print("[SUCCESS] TLE data saved to satellites.json")
+	log.info("TLE data saved to %s", out_path)
+	return tle_data
 
 if __name__ == "__main__":
+	setup_logging()
 	fetch_all_tles()
 
@@ -1,20 +1,30 @@
 #!/usr/bin/env python3
 import socket
 import json
-import time
-from datetime import datetime, timedelta, timezone
+import logging
+from datetime import datetime, timedelta
 import threading
 import os
 
+import clock
+from log_utils import setup_logging
+from schedule_store import open_store
+
 REGISTRY_FILE = "data/active_fus.json"
 UDP_IP = "0.0.0.0"
 UDP_PORT = 8080
 
+log = logging.getLogger("registry")
+
 fus = {}
 
 
 def load_registry():
     global fus
+    stored = open_store().fus()
+    if stored:
+        fus = stored
+        return
     if os.path.exists(REGISTRY_FILE):
         try:
             with open(REGISTRY_FILE, "r") as f:
@@ -24,51 +34,98 @@ def load_registry():
                 else:
                     fus = {}  # Empty file -> initialize empty dict
         except json.JSONDecodeError:
-            print(f"[WARNING] {REGISTRY_FILE} is malformed. Resetting.")
+            log.warning("%s is malformed. Resetting.", REGISTRY_FILE)
             fus = {}
     else:
         fus = {}
+    for fid, data in fus.items():
+        open_store().upsert_fu(fid, data)
 
 def save_registry():
-    with open(REGISTRY_FILE, "w") as f:
-        json.dump(fus, f, indent=4)
+    # JSON snapshot for operators; the store has the live last_seen times
+    tmp = REGISTRY_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(dict(fus), f, indent=4)
+    os.replace(tmp, REGISTRY_FILE)
+
+def expire_inactive(persist=True):
+    """Drop FUs not seen for 5 minutes; with persist=False the caller
+    passes the returned ids to remove() itself (e.g. from a worker thread)."""
+    now = clock.now()
+    to_remove = []
+    for fid, data in fus.items():
+        last_seen = datetime.fromisoformat(data["last_seen"])
+        if (now - last_seen) > timedelta(minutes=5):
+            log.warning("Removing inactive FU %s", fid)
+            to_remove.append(fid)
+    for fid in to_remove:
+        del fus[fid]
+    if to_remove and persist:
+        remove(to_remove)
+    return to_remove
+
+def remove(fids):
+    """Delete expired FUs from the store and the JSON snapshot."""
+    open_store().remove_fus(fids)
+    save_registry()
 
 def remove_inactive():
     while True:
-        now = datetime.now(timezone.utc)
-        to_remove = []
-        for fid, data in fus.items():
-            last_seen = datetime.fromisoformat(data["last_seen"])
-            if (now - last_seen) > timedelta(minutes=5):
-                print(f"[TIMEOUT] Removing inactive FU {fid}")
-                to_remove.append(fid)
-        for fid in to_remove:
-            del fus[fid]
+        expire_inactive()
+        clock.sleep(60)
+
+def parse_datagram(data, addr):
+    """(fu_id, registry entry) announced in one UDP datagram, or (None, None)."""
+    try:
+        msg = json.loads(data.decode())
+        fid = msg.get("fu_id")
+        if fid:
+            return fid, {
+                "ip": addr[0],
+                "last_seen": clock.now().isoformat(),
+                "occupied_slots": msg.get("occupied_slots", [])
+            }
+    except Exception as e:
+        log.error("Bad datagram from %s: %s", addr[0], e)
+    return None, None
+
+def register(fid, info):
+    """Update the in-memory registry; returns True for a newly seen FU."""
+    is_new = fid not in fus
+    fus[fid] = info
+    log.debug("FU %s active @ %s", fid, info["ip"])
+    return is_new
+
+def persist(entries, snapshot=False):
+    """Write {fu_id: entry} to the store, and the JSON snapshot if asked."""
+    open_store().upsert_fus(entries)
+    if snapshot:
         save_registry()
-        time.sleep(60)
+
+def handle_datagram(data, addr):
+    """Register the FU announced in one UDP datagram.
+
+    Returns (fu_id, is_new) or (None, False) for invalid messages.
+    """
+    fid, info = parse_datagram(data, addr)
+    if fid is None:
+        return None, False
+    is_new = register(fid, info)
+    persist({fid: info}, snapshot=is_new)
+    return fid, is_new
 
 def start_registry():
     load_registry()
     threading.Thread(target=remove_inactive, daemon=True).start()
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.bind((UDP_IP, UDP_PORT))
-    print(f"[LISTENING] FU Registry running on UDP {UDP_PORT}")
+    log.info("FU Registry running on UDP %s", UDP_PORT)
 
     while True:
         data, addr = sock.recvfrom(4096)
-        try:
-            msg = json.loads(data.decode())
-            fid = msg.get("fu_id")
-            if fid:
-                fus[fid] = {
-                    "ip": addr[0],
-                    "last_seen": datetime.now(timezone.utc).isoformat(),
-                    "occupied_slots": msg.get("occupied_slots", [])
-                }
-                save_registry()
-                print(f"[UPDATE] FU {fid} active @ {addr[0]}")
-        except Exception as e:
-            print(f"[ERROR] {e}")
+        handle_datagram(data, addr)
 
 if __name__ == "__main__":
+    setup_logging()
+    clock.install_from_env()
     start_registry()
@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 import json
-from datetime import datetime, timedelta, timezone
+import logging
+import os
+from datetime import timedelta
 from skyfield.api import EarthSatellite, load
 from skyfield.api import wgs84
+import clock
+from log_utils import setup_logging
+from schedule_store import open_store
+from visibility_index import VisibilityIndex, in_windows
 
 # ==============================
 # CONFIGURATION
@@ -10,6 +16,8 @@ from skyfield.api import wgs84
 SATELLITES_FILE = "data/satellites.json"
 SCHEDULE_FILE = "data/schedule.json"
 
+log = logging.getLogger("scheduler")
+
 # Future: dynamically selected via UI or file input
 SELECTED_SATELLITES = [
     "NOAA 15",
@@ -18,37 +26,57 @@ SELECTED_SATELLITES = [
 
 # Ground station (CU location)
 LAT, LON, ALT = 28.6139, 77.2090, 0.216  # Example: Delhi
+MIN_ELEVATION = 10  # degrees
+
 
+def generate_schedule(selected_satellites, satellites_data=None, ts=None, save=True,
+                      index=None):
+    """Generate a 24-hour visibility schedule for selected satellites.
 
-def generate_schedule(selected_satellites):
-    """Generate a 24-hour visibility schedule for selected satellites."""
-    ts = load.timescale()
-    eph = load('de421.bsp')
+    The central-unit pipeline passes its shared catalogue, timescale and
+    visibility index in; standalone runs build them here. SGP4 is only run at
+    sample times the index cannot rule out.
+    """
+    ts = ts or load.timescale()
     location = wgs84.latlon(LAT, LON, ALT)
 
     # Load full TLE dataset
-    with open(SATELLITES_FILE, "r") as f:
-        satellites_data = json.load(f)
+    if satellites_data is None:
+        with open(SATELLITES_FILE, "r") as f:
+            satellites_data = json.load(f)
 
-    now = datetime.now(timezone.utc)
+    now = clock.now()
     schedule = []
 
+    index = index or VisibilityIndex(
+        {name: satellites_data[name] for name in selected_satellites if name in satellites_data})
+    windows = index.windows(selected_satellites, LAT, LON, now.timestamp(),
+                            now.timestamp() + 24 * 3600, MIN_ELEVATION)
+
     for satname in selected_satellites:
         if satname not in satellites_data:
-            print(f"[WARNING] {satname} not found in {SATELLITES_FILE}, skipping...")
+            log.warning("%s not found in %s, skipping...", satname, SATELLITES_FILE)
+            continue
+
+        spans = windows.get(satname)
+        if not spans:
+            log.debug("%s can never rise above %s° here, skipping...", satname, MIN_ELEVATION)
             continue
 
         tle = satellites_data[satname]
         satellite = EarthSatellite(tle["line1"], tle["line2"], satname, ts)
 
-        print(f"[INFO] Generating schedule for {satname}...")
+        log.debug("Generating schedule for %s...", satname)
 
         for minutes_ahead in range(0, 24 * 60, 15):  # every 15 minutes for next 24 hours
-            t = ts.utc(now + timedelta(minutes=minutes_ahead))
+            sample = now + timedelta(minutes=minutes_ahead)
+            if not in_windows(sample.timestamp(), spans):
+                continue
+            t = ts.utc(sample)
             difference = satellite - location
             alt, az, _ = difference.at(t).altaz()
 
-            if alt.degrees > 10:  # above horizon threshold
+            if alt.degrees > MIN_ELEVATION:  # above horizon threshold
                 entry = {
                     "satellite": satname,
                     "start_time": (now + timedelta(minutes=minutes_ahead)).isoformat(),
@@ -56,15 +84,27 @@ def generate_schedule(selected_satellites):
                 }
                 schedule.append(entry)
 
-        print(f"[SCHEDULE] {satname}: {len([s for s in schedule if s['satellite'] == satname])} entries")
+        log.debug("%s: %d entries", satname,
+                  len([s for s in schedule if s["satellite"] == satname]))
 
-    # Save to file
-    with open(SCHEDULE_FILE, "w") as f:
-        json.dump(schedule, f, indent=4)
+    log.info("Generated %d total schedule entries for %d satellites.", len(schedule),
+             len(selected_satellites))
+    if save:
+        save_schedule(schedule)
+    return schedule
 
-    print(f"\n✅ Generated {len(schedule)} total schedule entries for {len(selected_satellites)} satellites.")
-    print(f"📁 Output saved to: {SCHEDULE_FILE}")
+
+def save_schedule(schedule):
+    open_store().replace_schedule(schedule)
+    # JSON copy for operators and tools that still read the file
+    tmp = SCHEDULE_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(schedule, f, indent=4)
+    os.replace(tmp, SCHEDULE_FILE)
+    log.info("Output saved to: %s", SCHEDULE_FILE)
 
 
 if __name__ == "__main__":
+    setup_logging()
+    clock.install_from_env()
     generate_schedule(SELECTED_SATELLITES)
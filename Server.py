@@ -1,13 +1,19 @@
 #!/usr/bin/env python3
-import json
+import logging
 import asyncio
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response, Query
+from fastapi.responses import JSONResponse
 from fastapi_socketio import SocketManager
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime
 import uvicorn
+import clock
+from doppler import DopplerIndex
+from log_utils import setup_logging
+from schedule_store import open_store
 
-ASSIGN_FILE = "data/assignments.json"
+log = logging.getLogger("api")
+doppler_index = DopplerIndex()
 
 app = FastAPI()
 sio = SocketManager(app=app)
@@ -21,31 +27,101 @@ app.add_middleware(
 )
 
 @app.get("/api/fu_schedule/{fu_id}")
-def get_schedule(fu_id: str):
+def get_schedule(fu_id: str, request: Request,
+                 since: str = Query(None),
+                 until: str = Query(None),
+                 next_n: int = Query(None, ge=0, alias="next")):
     try:
-        with open(ASSIGN_FILE) as f:
-            assignments = json.load(f)
-        return assignments.get(fu_id, [])
-    except Exception as e:
-        return {"error": str(e)}
+        start = clock.parse_time(since)
+        end = clock.parse_time(until)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_n is not None and start is None:
+        start = clock.time()
+    entries, etag = open_store().fu_passes(fu_id, start, end, next_n)
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(entries, headers=headers)
+
+@app.get("/api/passes")
+def get_passes(start: str = Query(None),
+               end: str = Query(None),
+               satellite: str = Query(None)):
+    """Scheduled passes overlapping [start, end], optionally for one satellite."""
+    try:
+        start, end = clock.parse_time(start), clock.parse_time(end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return open_store().passes_between(start, end, satellite)
+
+@app.get("/api/passes/next")
+def get_next_pass(satellite: str = Query(None),
+                  fu_id: str = Query(None),
+                  after: str = Query(None)):
+    """First pass starting at or after `after` (default now) for a satellite and/or FU."""
+    try:
+        after = clock.parse_time(after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    entry = open_store().next_pass(clock.time() if after is None else after, satellite, fu_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="No upcoming pass")
+    return entry
+
+@app.get("/api/fus/free")
+def get_free_fus(t: str = Query(None)):
+    """Registered FUs with no assigned pass in progress at `t` (default now)."""
+    try:
+        t = clock.parse_time(t)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    t = clock.time() if t is None else t
+    return {"t": t, "fus": open_store().free_fus(t)}
+
+@app.get("/api/doppler")
+def get_doppler(satellite: str = Query(...),
+                start_time: str = Query(...),
+                t: float = Query(None)):
+    """Precomputed profile for one pass; with `t`, just the sample at that time.
+
+    `start_time` is the pass start as UNIX seconds or ISO 8601.
+    """
+    try:
+        start = clock.parse_time(start_time)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if t is None:
+        profile = doppler_index.get(satellite, start)
+        if profile is None:
+            raise HTTPException(status_code=404, detail="No Doppler profile for this pass")
+        return profile
+    sample = doppler_index.at(satellite, start, t)
+    if sample is None:
+        raise HTTPException(status_code=404, detail="No Doppler sample at this time")
+    range_km, range_rate, doppler_hz = sample
+    return {"t": t, "range_km": range_km, "range_rate_km_s": range_rate, "doppler_hz": doppler_hz}
 
 @sio.on("connect")
 async def connect(sid, environ):
-    print(f"[SOCKET] FU connected: {sid}")
+    log.info("FU connected: %s", sid)
 
 @sio.on("fu_log")
 async def handle_fu_log(sid, data):
-    print(f"[LOG] {data}")
+    log.debug("FU log: %s", data)
     await sio.emit("log_update", data)
 
 @sio.on("az_el")
 async def handle_az_el(sid, data):
-    print(f"[DATA] {data}")
+    log.debug("AZ/EL: %s", data)
     await sio.emit("az_el_update", data)
 
 @sio.on("disconnect")
 async def disconnect(sid):
-    print(f"[SOCKET] FU disconnected: {sid}")
+    log.info("FU disconnected: %s", sid)
 
 if __name__ == "__main__":
+    setup_logging()
+    clock.install_from_env()
     uvicorn.run(app, host="0.0.0.0", port=8080)
@@ -1,13 +1,37 @@
+import asyncio
 import json
+import logging
 import os
-import time
-from datetime import datetime
+import sys
+import threading
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
 import socketio
 from fastapi import Query
 
+# Shared central-unit modules (visibility_index, ...) live in the repo root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import clock
+from log_utils import DashboardFeed, setup_logging
+from profiling import StallMonitor, folded, sample_stacks
+from schedule_store import open_store
+from overhead import OverheadService
+from telemetry_store import TelemetryStore, FIELDS as TELEMETRY_FIELDS, track_points
+from ingest import IngestStage, ACCEPTED, REJECTED
+from tle_catalogue import TleCatalogue
+from tracks import TrackService, MAX_SATELLITES as MAX_TRACK_SATELLITES
+
+# --- Logging ---
+setup_logging(os.environ.get("LOG_FILE", "logs/server.log"))
+log = logging.getLogger("server")
+# Lines for the dashboard `log` stream go through a rate-limited feed
+dashboard_feed = DashboardFeed(rate=5.0, burst=20)
+dashboard = logging.getLogger("server.dashboard")
+dashboard.addHandler(dashboard_feed)
+clock.install_from_env()
+
 # --- Setup Async Socket.IO Server with Redis ---
 sio = socketio.AsyncServer(
     async_mode='asgi',
@@ -34,7 +58,21 @@ SID_TO_FU = {}
 FU_REGISTRY = {}
 field_units = {}
 DATA_PATH = "fu_data.json"
-TLE_FILE = "all_tle_data.json"
+# The catalogue the central unit's TLE stage (and Fetch.py) keeps fresh
+TLE_FILE = os.environ.get("TLE_FILE", "../data/satellites.json")
+STORE_FILE = os.environ.get("STORE_FILE", "../data/orbitalink.db")
+TELEMETRY_DIR = "telemetry"
+telemetry = TelemetryStore(TELEMETRY_DIR)
+ingest = IngestStage(rate=1.0, burst=3, flush_interval=1.0)
+OVERHEAD_TTL_S = 5.0
+# Admin endpoints exist only when a token is configured; stall detection
+# only when a threshold is
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+LOOP_STALL_MS = float(os.environ.get("LOOP_STALL_MS", 0))
+stall_monitor = StallMonitor(LOOP_STALL_MS / 1000) if LOOP_STALL_MS > 0 else None
+overhead_service = None
+overhead_revision = None
+overhead_lock = threading.Lock()
 
 # --- Load Persisted Field Unit State ---
 if os.path.exists(DATA_PATH):
@@ -44,18 +82,14 @@ if os.path.exists(DATA_PATH):
         FU_REGISTRY[fu_id] = {
             "fu_id": fu_id,
             "sensor_data": data.get("sensor_data", {}),
-            "timestamp": time.time(),
+            "timestamp": clock.time(),
         }
-    print(f"[BOOT] Restored field unit data for {len(field_units)} units.")
+    log.info("Restored field unit data for %d units", len(field_units))
 
-# --- Load TLE Data ---
-TLE_CACHE = {}
-if os.path.exists(TLE_FILE):
-    with open(TLE_FILE, "r") as f:
-        TLE_CACHE = json.load(f)
-        print(f"[BOOT] Loaded {len(TLE_CACHE)} satellites from {TLE_FILE}")
-else:
-    print(f"[ERROR] {TLE_FILE} not found. TLE-related APIs will fail.")
+# --- Load TLE Data (reloaded whenever the file changes) ---
+tle_catalogue = TleCatalogue(TLE_FILE)
+tle_catalogue.refresh()
+track_service = TrackService(tle_catalogue)
 
 # --- Persistence Function ---
 
@@ -63,16 +97,53 @@ else:
 def save_field_units():
     with open(DATA_PATH, "w") as f:
         json.dump(field_units, f, indent=2)
-    print("[SAVE] Field unit states saved.")
+    log.debug("Field unit states saved")
+
+
+def load_fu_schedule(fu_id):
+    entries, _ = open_store(STORE_FILE).fu_passes(fu_id)
+    return entries
 
 # --- Socket.IO Events ---
 
 
 @sio.event
 async def connect(sid, environ):
-    print(f"[CONNECT] Socket connected: {sid}")
-    await sio.emit("log", f"[{datetime.now().strftime('%H:%M:%S')}] New socket connection established")
-    await sio.emit("client_data_update", {"clients": list(FU_REGISTRY.values())})
+    log.info("Socket connected: %s", sid)
+    dashboard.info("New socket connection established")
+    # Only the new socket needs the full list; everyone else already has it
+    await sio.emit("client_data_update", {"clients": list(FU_REGISTRY.values())}, to=sid)
+
+
+@sio.on("resume_session")
+async def handle_resume_session(sid, data):
+    fu_id = data.get("fu_id")
+    if not fu_id:
+        log.warning("Invalid resume request: %s", data)
+        return
+
+    SID_TO_FU[sid] = fu_id
+    state = field_units.setdefault(fu_id, {})
+    if not state.get("satellite") and data.get("satellite_name"):
+        state["satellite"] = data["satellite_name"]
+
+    FU_REGISTRY[fu_id] = {
+        "fu_id": fu_id,
+        "sensor_data": state.get("sensor_data", {}),
+        "timestamp": clock.time(),
+        "satellite": state.get("satellite"),
+        "az": state.get("az"),
+        "el": state.get("el"),
+        "gps": state.get("gps")
+    }
+    ingest.touch(fu_id)
+
+    await sio.emit("session_resumed", {
+        "fu_id": fu_id,
+        "satellite_name": state.get("satellite"),
+        "schedule": load_fu_schedule(fu_id)
+    }, to=sid)
+    log.info("%s resumed (sat: %s)", fu_id, state.get("satellite"))
 
 
 @sio.on("field_unit_data")
@@ -81,13 +152,23 @@ async def handle_field_unit_data(sid, data):
     sensor_data = data.get("sensor_data", {})
 
     if not isinstance(sensor_data, dict) or not fu_id:
-        print(f"[WARN] Invalid field unit data: {data}")
+        log.warning("Invalid field unit data: %s", data)
         return
 
+    # REJECTED payloads (over the hard per-FU limit, or a new ID while the
+    # unit table is full) are not stored. For the rest the verdict only
+    # decides when they are broadcast; history and last-seen are updated
+    verdict = ingest.submit(fu_id, sensor_data, clock.monotonic())
+    if verdict == REJECTED:
+        log.debug("Rejected FU data from %s", fu_id)
+        return verdict
+    if sid:
+        SID_TO_FU[sid] = fu_id
+
     FU_REGISTRY[fu_id] = {
         "fu_id": fu_id,
         "sensor_data": sensor_data,
-        "timestamp": time.time(),
+        "timestamp": clock.time(),
         "satellite": field_units.get(fu_id, {}).get("satellite"),
         "az": field_units.get(fu_id, {}).get("az"),
         "el": field_units.get(fu_id, {}).get("el"),
@@ -95,10 +176,50 @@ async def handle_field_unit_data(sid, data):
     }
 
     field_units.setdefault(fu_id, {})["sensor_data"] = sensor_data
-    SID_TO_FU[sid] = fu_id
-
-    await sio.emit("client_data_update", {"clients": list(FU_REGISTRY.values())})
-    print(f"[FU DATA] Received from {fu_id}: {sensor_data}")
+    await asyncio.to_thread(telemetry.append, fu_id, FU_REGISTRY[fu_id]["timestamp"],
+                            temperature=sensor_data.get("temperature"),
+                            humidity=sensor_data.get("humidity"))
+    log.debug("FU data from %s: %s", fu_id, sensor_data)
+    return verdict
+
+
+def expire_idle_units():
+    # FUs that stopped reporting and hold no socket leave the dashboard list;
+    # state that only ever held sensor data goes with them
+    connected = set(SID_TO_FU.values())
+    removed = False
+    for fu_id in ingest.expire(clock.monotonic()):
+        if fu_id in connected:
+            continue
+        removed = FU_REGISTRY.pop(fu_id, None) is not None or removed
+        if set(field_units.get(fu_id, {})) <= {"sensor_data"}:
+            field_units.pop(fu_id, None)
+    return removed
+
+
+async def ingest_flush_loop():
+    # One coalesced broadcast per interval, however many FU updates arrived
+    while True:
+        await sio.sleep(ingest.flush_interval)
+        removed = expire_idle_units()
+        if ingest.flush() or removed:
+            await sio.emit("client_data_update", {"clients": list(FU_REGISTRY.values())})
+        for line in dashboard_feed.drain():
+            await sio.emit("log", line)
+
+
+@app.on_event("startup")
+async def start_ingest():
+    sio.start_background_task(ingest_flush_loop)
+    if stall_monitor is not None:
+        sio.start_background_task(stall_monitor.run)
+
+
+@app.on_event("shutdown")
+async def flush_telemetry():
+    # Open chunks hold up to chunk_size samples per FU that are not on disk yet
+    await asyncio.to_thread(telemetry.flush)
+    save_field_units()
 
 
 @sio.on("select_satellite")
@@ -106,10 +227,10 @@ async def handle_satellite_selection(sid, data):
     fu_id = data.get("fu_id")
     sat_name = data.get("satellite_name")
 
-    print(f"[SATELLITE SELECT] FU: {fu_id} -> Sat: {sat_name}")
+    log.info("Satellite select: FU %s -> %s", fu_id, sat_name)
 
     if not fu_id or not sat_name:
-        print(f"[ERROR] Invalid satellite selection: {data}")
+        log.error("Invalid satellite selection: %s", data)
         return
 
     field_units.setdefault(fu_id, {})["satellite"] = sat_name
@@ -120,7 +241,7 @@ async def handle_satellite_selection(sid, data):
         "satellite_name": sat_name
     })
 
-    await sio.emit("log", f"[{datetime.now().strftime('%H:%M:%S')}] {fu_id} selected {sat_name}")
+    dashboard.info("%s selected %s", fu_id, sat_name)
 
 
 @sio.on("az_el_result")
@@ -132,7 +253,7 @@ async def handle_az_el_result(sid, data):
     sat_name = data.get("satellite_name")
 
     if not all([fu_id, az is not None, el is not None]):
-        print(f"[ERROR] Invalid AZ/EL result: {data}")
+        log.error("Invalid AZ/EL result: %s", data)
         return
 
     field_units.setdefault(fu_id, {}).update({
@@ -141,8 +262,9 @@ async def handle_az_el_result(sid, data):
         "gps": gps,
         "satellite": sat_name
     })
+    await asyncio.to_thread(telemetry.append, fu_id, clock.time(), az=az, el=el)
 
-    print(f"[AZ/EL RESULT] {fu_id} -> AZ: {az}°, EL: {el}°")
+    log.debug("AZ/EL result %s -> AZ: %s°, EL: %s°", fu_id, az, el)
 
     await sio.emit("az_el_command", {
         "fu_id": fu_id,
@@ -151,11 +273,33 @@ async def handle_az_el_result(sid, data):
     })
 
 
+@sio.on("pass_result")
+async def handle_pass_result(sid, data):
+    fu_id = data.get("fu_id")
+    if not fu_id:
+        log.error("Invalid pass result: %s", data)
+        return False
+
+    # The track is client-supplied: keep only [t, az, el] triples of finite numbers
+    points, bad = track_points(data.get("track") or [])
+    if bad:
+        log.warning("Pass result %s: skipped %d malformed track points (first: %r)",
+                    fu_id, len(bad), bad[0])
+    await asyncio.to_thread(telemetry.extend, fu_id, points)
+    summary = {k: v for k, v in data.items() if k != "track"}
+    field_units.setdefault(fu_id, {})["last_pass"] = summary
+
+    log.info("Pass result %s -> %s (%s points, %s skipped)", fu_id,
+             summary.get("satellite"), summary.get("points"), summary.get("skipped"))
+    dashboard.info("%s completed pass of %s", fu_id, summary.get("satellite"))
+    return True
+
+
 @sio.on("poll_az_el")
 async def handle_poll_az_el(sid, data):
     fu_id = data.get("fu_id")
     if not fu_id:
-        print(f"[POLL ERROR] No FU ID provided")
+        log.warning("Poll without FU ID")
         return
 
     sat_name = field_units.get(fu_id, {}).get("satellite")
@@ -164,9 +308,9 @@ async def handle_poll_az_el(sid, data):
             "fu_id": fu_id,
             "satellite_name": sat_name
         })
-        print(f"[POLL] Re-sent satellite {sat_name} to {fu_id}")
+        log.debug("Re-sent satellite %s to %s", sat_name, fu_id)
     else:
-        print(f"[POLL ERROR] No satellite selected for {fu_id}")
+        log.debug("No satellite selected for %s", fu_id)
 
 
 @sio.on("request_clients")
@@ -186,10 +330,12 @@ async def handle_request_clients(sid):
 async def disconnect(sid):
     fu_id = SID_TO_FU.pop(sid, None)
     if fu_id:
-        print(f"[DISCONNECT] FU {fu_id} disconnected (SID: {sid})")
+        log.info("FU %s disconnected (SID: %s)", fu_id, sid)
         FU_REGISTRY.pop(fu_id, None)
         save_field_units()
-        await sio.emit("log", f"[{datetime.now().strftime('%H:%M:%S')}] FU {fu_id} disconnected")
+        await asyncio.to_thread(telemetry.flush, fu_id)
+        ingest.forget(fu_id)
+        dashboard.info("FU %s disconnected", fu_id)
         await sio.emit("client_data_update", {"clients": list(FU_REGISTRY.values())})
 
 # --- REST Endpoint for External FU Sensor Data ---
@@ -200,8 +346,17 @@ async def receive_fu_http(request: Request):
     data = await request.json()
     if not data:
         return {"error": "Invalid data"}
-    await handle_field_unit_data(None, data)
-    return {"status": "ok"}
+    verdict = await handle_field_unit_data(None, data)
+    if verdict is None:
+        return {"error": "Invalid data"}
+    if verdict == REJECTED:
+        raise HTTPException(status_code=429, detail="Too many reports")
+    return {"status": "ok" if verdict == ACCEPTED else verdict}
+
+
+@app.get("/api/metrics")
+async def get_metrics():
+    return {"ingest": ingest.snapshot(), "tracks": track_service.stats()}
 
 # --- Updated: Local JSON-Based Satellite List Endpoint ---
 
@@ -209,8 +364,9 @@ async def receive_fu_http(request: Request):
 @app.get("/api/satellites")
 async def get_satellite_list():
     try:
-        names = list(TLE_CACHE.keys())
-        print(f"[LOCAL TLE] Loaded {len(names)} satellite names from cache")
+        tle_catalogue.refresh()
+        names = list(tle_catalogue.tles.keys())
+        log.debug("Listed %d satellite names", len(names))
         return names
     except Exception as e:
         raise HTTPException(
@@ -222,7 +378,8 @@ async def get_satellite_list():
 @app.get("/api/tle_by_name")
 async def get_tle_by_name(name: str = Query(...)):
     try:
-        tle = TLE_CACHE.get(name)
+        tle_catalogue.refresh()
+        tle = tle_catalogue.tles.get(name)
         if not tle:
             raise HTTPException(
                 status_code=404, detail=f"TLE not found for satellite: {name}")
@@ -231,5 +388,209 @@ async def get_tle_by_name(name: str = Query(...)):
             "tle_line1": tle["line1"],
             "tle_line2": tle["line2"]
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+# --- Per-FU TLE Subset Sync ---
+
+
+@app.post("/api/tle/sync")
+async def sync_tles(request: Request):
+    data = await request.json()
+    names = data.get("names") if isinstance(data, dict) else None
+    if not isinstance(names, list):
+        raise HTTPException(status_code=400, detail="Expected {\"names\": [...], \"since\": rev}")
+    try:
+        since = int(data.get("since") or 0)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="since must be an integer revision")
+    return tle_catalogue.sync([str(n) for n in names], since)
+
+# --- Assigned Passes for Field Units ---
+
+
+@app.get("/api/fu_schedule/{fu_id}")
+def get_fu_schedule(fu_id: str, request: Request,
+                    since: str = Query(None),
+                    until: str = Query(None),
+                    next_n: int = Query(None, ge=0, alias="next")):
+    """The passes assigned to fu_id, as on the central unit's API; honours If-None-Match."""
+    try:
+        start = clock.parse_time(since)
+        end = clock.parse_time(until)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_n is not None and start is None:
+        start = clock.time()
+    entries, etag = open_store(STORE_FILE).fu_passes(fu_id, start, end, next_n)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(entries, headers=headers)
+
+# --- Telemetry History ---
+
+
+@app.get("/api/telemetry/{fu_id}")
+async def get_telemetry(fu_id: str,
+                        start: float = Query(None),
+                        end: float = Query(None),
+                        buckets: int = Query(500, ge=0, le=5000),
+                        fields: str = Query(None)):
+    end = clock.time() if end is None else end
+    start = end - 86400 if start is None else start
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    selected = fields.split(",") if fields else TELEMETRY_FIELDS
+    return {
+        "fu_id": fu_id,
+        "start": start,
+        "end": end,
+        "buckets": buckets,
+        "data": await asyncio.to_thread(telemetry.query, fu_id, start, end,
+                                        buckets or None, selected)
+    }
+
+# --- Satellites Currently Overhead ---
+
+
+def fu_location(fu_id):
+    state = field_units.get(fu_id, {})
+    gps = state.get("gps") or {}
+    if gps.get("lat") is not None and gps.get("lon") is not None:
+        return gps["lat"], gps["lon"], gps.get("alt") or 0.0
+    sensor = state.get("sensor_data") or {}
+    if sensor.get("Latitude") is not None and sensor.get("Longitude") is not None:
+        return sensor["Latitude"], sensor["Longitude"], 0.0
+    return None
+
+
+def query_overhead(location, min_el, sort, limit, now):
+    # Runs in a worker thread; the service is built once per catalogue revision
+    global overhead_service, overhead_revision
+    tles, revision = tle_catalogue.tles, tle_catalogue.revision
+    with overhead_lock:
+        if overhead_service is None or overhead_revision != revision:
+            overhead_service = OverheadService(tles, ttl=OVERHEAD_TTL_S)
+            overhead_revision = revision
+        service = overhead_service
+    return service.query(*location, min_el=min_el, sort=sort, limit=limit, now=now)
+
+
+@app.get("/api/overhead")
+async def get_overhead(fu_id: str = Query(None),
+                       lat: float = Query(None, ge=-90, le=90),
+                       lon: float = Query(None, ge=-180, le=180),
+                       alt: float = Query(0.0),
+                       min_el: float = Query(10.0, ge=-5, le=90),
+                       sort: str = Query("elevation", pattern="^(elevation|los)$"),
+                       limit: int = Query(None, ge=1)):
+    if lat is not None and lon is not None:
+        location = (lat, lon, alt)
+    elif fu_id:
+        location = fu_location(fu_id)
+        if location is None:
+            raise HTTPException(status_code=404, detail=f"No known location for FU {fu_id}")
+    else:
+        raise HTTPException(status_code=400, detail="Provide fu_id or lat and lon")
+
+    tle_catalogue.refresh()
+    computed_at, satellites = await asyncio.to_thread(
+        query_overhead, location, min_el, sort, limit, clock.time())
+    return {
+        "lat": location[0],
+        "lon": location[1],
+        "min_el": min_el,
+        "computed_at": computed_at,
+        "satellites": satellites
+    }
+
+# --- Ground Tracks and Sky Plots ---
+
+
+def track_names(satellites):
+    names = [n.strip() for n in satellites.split(",") if n.strip()]
+    if not names:
+        raise HTTPException(status_code=400, detail="Provide at least one satellite")
+    if len(names) > MAX_TRACK_SATELLITES:
+        raise HTTPException(status_code=400,
+                            detail=f"At most {MAX_TRACK_SATELLITES} satellites per request")
+    tle_catalogue.refresh()
+    return names
+
+
+@app.get("/api/tracks/ground")
+async def get_ground_tracks(satellites: str = Query(...),
+                            start: float = Query(None),
+                            duration: float = Query(5400.0, gt=0, le=86400),
+                            step: float = Query(30.0, ge=1, le=600),
+                            resolution: float = Query(0.1, ge=0, le=10)):
+    """Lat/lon polylines per satellite, split at the antimeridian."""
+    names = track_names(satellites)
+    start = clock.time() if start is None else start
+    tracks = await asyncio.to_thread(track_service.ground_tracks, names, start,
+                                     duration, step, resolution)
+    return {"start": start, "duration": duration, "tracks": tracks,
+            "missing": [n for n in names if n not in tracks]}
+
+
+@app.get("/api/tracks/sky")
+async def get_sky_plots(satellites: str = Query(...),
+                        fu_id: str = Query(None),
+                        lat: float = Query(None, ge=-90, le=90),
+                        lon: float = Query(None, ge=-180, le=180),
+                        alt: float = Query(0.0),
+                        start: float = Query(None),
+                        duration: float = Query(86400.0, gt=0, le=3 * 86400),
+                        min_el: float = Query(0.0, ge=-5, le=90),
+                        step: float = Query(10.0, ge=1, le=120),
+                        resolution: float = Query(0.5, ge=0, le=10)):
+    """Az/el arcs of every pass above min_el, seen from an FU or a given location."""
+    names = track_names(satellites)
+    if lat is not None and lon is not None:
+        location = (lat, lon, alt)
+    elif fu_id:
+        location = fu_location(fu_id)
+        if location is None:
+            raise HTTPException(status_code=404, detail=f"No known location for FU {fu_id}")
+    else:
+        raise HTTPException(status_code=400, detail="Provide fu_id or lat and lon")
+    start = clock.time() if start is None else start
+    passes = await asyncio.to_thread(track_service.sky_plots, names, *location, start,
+                                     duration, min_el, step, resolution)
+    return {"lat": location[0], "lon": location[1], "start": start, "duration": duration,
+            "passes": passes, "missing": [n for n in names if n not in passes]}
+
+# --- Admin: On-Demand Profiling ---
+
+
+def require_admin(request):
+    if not ADMIN_TOKEN or request.headers.get("x-admin-token") != ADMIN_TOKEN:
+        raise HTTPException(status_code=404)
+
+
+@app.get("/admin/profile")
+async def admin_profile(request: Request,
+                        seconds: float = Query(10.0, gt=0, le=120),
+                        interval_ms: float = Query(10.0, ge=1, le=1000),
+                        threads: str = Query(None),
+                        format: str = Query("folded", pattern="^(folded|json)$")):
+    """Sample every thread's stack for `seconds`; folded output feeds flamegraph.pl/speedscope."""
+    require_admin(request)
+    log.warning("Profiling for %.1f s at %.0f ms", seconds, interval_ms)
+    counts = await asyncio.to_thread(sample_stacks, seconds, interval_ms / 1000,
+                                     threads.split(",") if threads else None)
+    if format == "json":
+        return {"seconds": seconds, "interval_ms": interval_ms,
+                "samples": sum(counts.values()), "stacks": dict(counts.most_common())}
+    return PlainTextResponse(folded(counts))
+
+
+@app.get("/admin/stalls")
+async def admin_stalls(request: Request):
+    require_admin(request)
+    if stall_monitor is None:
+        raise HTTPException(status_code=409, detail="Set LOOP_STALL_MS to enable stall detection")
+    return stall_monitor.snapshot()
@@ -0,0 +1,169 @@
+"""Per-FU ingestion stage for field unit sensor data.
+
+Sensor payloads arrive from Socket.IO (`field_unit_data`) and from the HTTP
+`/api/fu` endpoint. Before anything is stored, each FU is held to
+`write_rate` payloads per second (`write_burst` deep); a payload over that
+hard limit is REJECTED and must not reach the registry or the telemetry
+store. The table of known FUs is bounded too: units idle for `idle_s` are
+expired, and a new FU ID is REJECTED while `max_units` are active, so
+arbitrary IDs cannot grow memory or the telemetry directory without bound.
+
+Every admitted payload is stored (registry, last-seen time and telemetry
+history); this stage then only decides what is broadcast to dashboards:
+
+* a payload identical to the last broadcast one from the same FU is a
+  DUPLICATE and not broadcast again,
+* every FU gets `rate` broadcasts per second (token bucket, `burst` deep).
+  A payload over the limit is RATE_LIMITED: it is kept as the FU's pending
+  value, replacing any older pending one, and goes out with the next flush,
+* FUs with something new are marked dirty so the server broadcasts one
+  coalesced `client_data_update` per flush interval instead of one per
+  message.
+
+Verdicts are counted in `metrics`.
+"""
+import time
+
+ACCEPTED = "accepted"
+DUPLICATE = "duplicate"
+RATE_LIMITED = "rate_limited"
+REJECTED = "rejected"
+
+
+class UnitState:
+    __slots__ = ("last_payload", "deferred", "tokens", "stamp", "write_tokens", "seen",
+                 "counts")
+
+    def __init__(self, burst, write_burst, now):
+        self.last_payload = None
+        self.deferred = None
+        self.tokens = float(burst)
+        self.stamp = now
+        self.write_tokens = float(write_burst)
+        self.seen = now
+        self.counts = {ACCEPTED: 0, DUPLICATE: 0, RATE_LIMITED: 0, REJECTED: 0}
+
+
+class IngestStage:
+    def __init__(self, rate=1.0, burst=3, flush_interval=1.0, write_rate=2.0, write_burst=10,
+                 max_units=1000, idle_s=300.0):
+        self.rate = rate
+        self.burst = burst
+        self.flush_interval = flush_interval
+        self.write_rate = write_rate
+        self.write_burst = write_burst
+        self.max_units = max_units
+        self.idle_s = idle_s
+        self.units = {}
+        self.dirty = set()
+        self.pending = 0
+        self.metrics = {
+            "received": 0,
+            ACCEPTED: 0,
+            DUPLICATE: 0,
+            RATE_LIMITED: 0,
+            REJECTED: 0,
+            "expired": 0,
+            "coalesced": 0,
+            "deferred": 0,
+            "flushes": 0,
+        }
+
+    def submit(self, fu_id, payload, now=None):
+        """Classify one payload.
+
+        REJECTED must not be stored. Otherwise the payload is stored and the
+        verdict only decides its broadcast: ACCEPTED marks the FU dirty now,
+        RATE_LIMITED keeps the payload pending until the next flush and
+        DUPLICATE needs no broadcast.
+        """
+        now = time.monotonic() if now is None else now
+        self.metrics["received"] += 1
+        unit = self.units.get(fu_id)
+        if unit is None:
+            if len(self.units) >= self.max_units:
+                self.expire(now)
+            if len(self.units) >= self.max_units:
+                self.metrics[REJECTED] += 1
+                return REJECTED
+            unit = self.units[fu_id] = UnitState(self.burst, self.write_burst, now)
+
+        unit.write_tokens = min(self.write_burst,
+                                unit.write_tokens + (now - unit.seen) * self.write_rate)
+        unit.seen = now
+        if unit.write_tokens < 1.0:
+            verdict = REJECTED
+        elif payload == unit.last_payload:
+            verdict = DUPLICATE
+            unit.deferred = None   # the latest value is the one already out
+        else:
+            unit.tokens = min(self.burst, unit.tokens + (now - unit.stamp) * self.rate)
+            unit.stamp = now
+            if unit.tokens < 1.0:
+                verdict = RATE_LIMITED
+                unit.deferred = payload
+            else:
+                unit.tokens -= 1.0
+                unit.last_payload = payload
+                unit.deferred = None
+                verdict = ACCEPTED
+                self.dirty.add(fu_id)
+                self.pending += 1
+        if verdict != REJECTED:
+            unit.write_tokens -= 1.0
+
+        unit.counts[verdict] += 1
+        self.metrics[verdict] += 1
+        return verdict
+
+    def touch(self, fu_id):
+        """Schedule a broadcast for fu_id without a new payload (e.g. resume)."""
+        self.dirty.add(fu_id)
+        self.pending += 1
+
+    def expire(self, now=None):
+        """Drop FUs idle for idle_s; returns their IDs."""
+        now = time.monotonic() if now is None else now
+        idle = [fu_id for fu_id, u in self.units.items() if now - u.seen >= self.idle_s]
+        for fu_id in idle:
+            del self.units[fu_id]
+            self.dirty.discard(fu_id)
+        self.metrics["expired"] += len(idle)
+        return idle
+
+    def forget(self, fu_id):
+        """Drop dedup state so the next payload after a reconnect is accepted."""
+        unit = self.units.get(fu_id)
+        if unit is not None:
+            unit.last_payload = None
+            unit.deferred = None
+
+    def flush(self):
+        """Return the FUs changed since the last flush and reset the dirty set.
+
+        Pending rate-limited payloads are released here, one per FU.
+        """
+        for fu_id, unit in self.units.items():
+            if unit.deferred is not None:
+                unit.last_payload, unit.deferred = unit.deferred, None
+                self.metrics["deferred"] += 1
+                self.dirty.add(fu_id)
+                self.pending += 1
+        if not self.dirty:
+            return set()
+        changed, self.dirty = self.dirty, set()
+        self.metrics["coalesced"] += self.pending - 1
+        self.metrics["flushes"] += 1
+        self.pending = 0
+        return changed
+
+    def snapshot(self):
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "flush_interval": self.flush_interval,
+            "write_rate": self.write_rate,
+            "max_units": self.max_units,
+            "totals": dict(self.metrics),
+            "units": {fu_id: dict(u.counts) for fu_id, u in self.units.items()},
+        }
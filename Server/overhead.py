@@ -0,0 +1,128 @@
+"""'What's overhead now' queries over the whole TLE catalogue.
+
+The shared VisibilityIndex first discards satellites that cannot be above the
+mask at this instant. The survivors are propagated together with SGP4's
+vectorized SatrecArray. Satellites above the mask are then propagated over a
+short look-ahead grid to estimate time to LOS. Results are cached per
+(location, mask) for `ttl` seconds, so any number of dashboards polling the
+same FU cost one propagation per interval. Queries may come from several
+worker threads at once: when an entry expires, one of them recomputes it and
+the others wait for that result.
+"""
+import threading
+import time
+
+import numpy as np
+from sgp4.api import Satrec, SatrecArray
+
+from visibility_index import VisibilityIndex, gmst_rad, julian_date, station_ecef
+
+LOS_HORIZON_S = 1800
+LOS_STEP_S = 15
+MAX_RADIUS_KM = 1e6   # stale TLEs can make SGP4 diverge without an error code
+
+
+def look_angles(r_teme, unix_times, lat, lon, alt_m):
+    """Az/el (deg) and range (km) for TEME positions shaped (sats, times, 3)."""
+    theta = gmst_rad(unix_times)[None, :]
+    x, y, z = r_teme[..., 0], r_teme[..., 1], r_teme[..., 2]
+    ecef = np.stack([x * np.cos(theta) + y * np.sin(theta),
+                     -x * np.sin(theta) + y * np.cos(theta),
+                     z], axis=-1)
+    d = ecef - station_ecef(lat, lon, alt_m)
+    la, lo = np.radians(lat), np.radians(lon)
+    east = -np.sin(lo) * d[..., 0] + np.cos(lo) * d[..., 1]
+    north = (-np.sin(la) * np.cos(lo) * d[..., 0] - np.sin(la) * np.sin(lo) * d[..., 1]
+             + np.cos(la) * d[..., 2])
+    up = (np.cos(la) * np.cos(lo) * d[..., 0] + np.cos(la) * np.sin(lo) * d[..., 1]
+          + np.sin(la) * d[..., 2])
+    rng = np.sqrt(east ** 2 + north ** 2 + up ** 2)
+    el = np.degrees(np.arcsin(np.clip(up / rng, -1.0, 1.0)))
+    az = np.degrees(np.arctan2(east, north)) % 360.0
+    return az, el, rng
+
+
+class OverheadService:
+    def __init__(self, catalogue, ttl=5.0):
+        self.ttl = ttl
+        self.index = VisibilityIndex(catalogue)
+        self.sats = [Satrec.twoline2rv(catalogue[n]["line1"], catalogue[n]["line2"])
+                     for n in self.index.names]
+        self.cache = {}
+        self._lock = threading.Lock()
+        self._inflight = {}   # key -> Event set once the computing thread is done
+
+    def propagate(self, idx, unix_times):
+        jd, fr = julian_date(unix_times)
+        err, r, _ = SatrecArray([self.sats[i] for i in idx]).sgp4(jd, fr)
+        radius = np.linalg.norm(r, axis=-1)
+        err = np.where(np.isfinite(radius) & (radius < MAX_RADIUS_KM), err, -1)
+        return err, r
+
+    def compute(self, lat, lon, alt_m, min_el, now):
+        idx = self.index.candidates(lat, lon, min_el)
+        idx = idx[self.index.coarse_mask(idx, lat, lon, [now], min_el)[:, 0]]
+        if not len(idx):
+            return []
+        err, r = self.propagate(idx, [now])
+        az, el, rng = look_angles(r, np.array([now]), lat, lon, alt_m)
+        up = (err[:, 0] == 0) & (el[:, 0] >= min_el)
+        idx, az, el, rng = idx[up], az[up, 0], el[up, 0], rng[up, 0]
+        if not len(idx):
+            return []
+
+        # Time to LOS: first look-ahead sample below the mask
+        grid = now + np.arange(LOS_STEP_S, LOS_HORIZON_S + LOS_STEP_S, LOS_STEP_S)
+        err_f, r_f = self.propagate(idx, grid)
+        _, el_f, _ = look_angles(r_f, grid, lat, lon, alt_m)
+        below = (el_f < min_el) | (err_f != 0)
+        los = np.where(below.any(axis=1), (below.argmax(axis=1) + 1) * LOS_STEP_S, None)
+
+        return [{
+            "name": self.index.names[i],
+            "az": round(float(a), 2),
+            "el": round(float(e), 2),
+            "range_km": round(float(d), 1),
+            "los_in_s": None if l is None else int(l),
+        } for i, a, e, d, l in zip(idx, az, el, rng, los)]
+
+    def query(self, lat, lon, alt_m=0.0, min_el=10.0, sort="elevation", limit=None, now=None):
+        now = time.time() if now is None else now
+        key = (round(lat, 3), round(lon, 3), round(alt_m), float(min_el))
+        hit = self._cached(key, lambda: self.compute(lat, lon, alt_m, min_el, now), now)
+        computed_at, result = hit
+        if sort == "los":
+            result = sorted(result, key=lambda s: (s["los_in_s"] is None, s["los_in_s"] or 0))
+        else:
+            result = sorted(result, key=lambda s: -s["el"])
+        return computed_at, result[:limit] if limit else result
+
+    def _cached(self, key, compute, now):
+        """Fresh cache entry for key; only one thread computes a missing one."""
+        while True:
+            with self._lock:
+                hit = self.cache.get(key)
+                if hit is not None and now - hit[0] < self.ttl:
+                    return hit
+                done = self._inflight.get(key)
+                owner = done is None
+                if owner:
+                    done = self._inflight[key] = threading.Event()
+            if not owner:
+                done.wait()
+                with self._lock:
+                    fresh = self.cache.get(key)
+                if fresh is not None and fresh is not hit:
+                    return fresh
+                continue   # the computing thread failed; try ourselves
+            try:
+                hit = (now, compute())
+                with self._lock:
+                    for k in [k for k, v in self.cache.items() if now - v[0] >= self.ttl]:
+                        del self.cache[k]
+                    self.cache[key] = hit
+                return hit
+            finally:
+                with self._lock:
+                    del self._inflight[key]
+                done.set()
@@ -1,105 +1,245 @@
 // static/js/main.js
-document.addEventListener("DOMContentLoaded", () => {
-    const socket = io({ autoConnect: false });
-    window.allSatellites = [];
-
-    fetch("/api/satellites")
-        .then(res => res.json())
-        .then(data => {
-            // Populate global satellite list
-            window.allSatellites = data.filter(name => typeof name === "string" && name.trim().length > 0).map(name => ({ name }));
-            console.log("✅ Satellites loaded:", window.allSatellites.length);
-            socket.connect();
-        })
-        .catch(err => console.error("❌ Failed to load satellites:", err));
+//
+// Rendering is kept cheap for kiosks with 100+ field units:
+// * one shared satellite list, fetched on first use and searched per keystroke;
+//   each card's TomSelect holds only the current match set, not 10k options
+// * socket events only record state; DOM writes happen once per animation
+//   frame, and only for values that actually changed
+// * the log is a bounded ring buffer drawn through a virtualized view, so
+//   only the visible rows exist in the DOM
+const SEARCH_LIMIT = 50;
+const LOG_LIMIT = 2000;
+const LOG_ROW_PX = 20;
 
-    socket.on("connect", () => {
-        console.log("✅ Connected to server");
+// --- Shared satellite source ---
+
+const satellites = {
+    names: null,
+    lower: null,
+    pending: null,
+
+    load() {
+        if (!this.pending) {
+            this.pending = fetch("/api/satellites")
+                .then(res => res.json())
+                .then(data => {
+                    this.names = data.filter(name => typeof name === "string" && name.trim().length > 0).sort();
+                    this.lower = this.names.map(name => name.toLowerCase());
+                    console.log("✅ Satellites loaded:", this.names.length);
+                })
+                .catch(err => {
+                    this.pending = null;   // retry on the next search
+                    console.error("❌ Failed to load satellites:", err);
+                    throw err;
+                });
+        }
+        return this.pending;
+    },
+
+    async search(query, limit = SEARCH_LIMIT) {
+        await this.load();
+        const q = query.trim().toLowerCase();
+        const prefix = [], contains = [];
+        for (let i = 0; i < this.lower.length && prefix.length < limit; i++) {
+            const at = this.lower[i].indexOf(q);
+            if (at === 0) prefix.push(this.names[i]);
+            else if (at > 0 && contains.length < limit) contains.push(this.names[i]);
+        }
+        return prefix.concat(contains).slice(0, limit).map(name => ({ name }));
+    }
+};
+
+// --- Frame scheduler: coalesce any number of updates into one paint ---
+
+function frameBatcher(render) {
+    let queued = false;
+    return () => {
+        if (queued) return;
+        queued = true;
+        requestAnimationFrame(() => {
+            queued = false;
+            render();
+        });
+    };
+}
+
+// --- Field unit cards ---
+
+const FIELDS = {
+    temp: fu => `${fu.sensor_data?.temperature ?? "--"} °C`,
+    hum: fu => `${fu.sensor_data?.humidity ?? "--"} %`,
+    lat: fu => `${fu.gps?.lat ?? "--"}`,
+    lon: fu => `${fu.gps?.lon ?? "--"}`,
+    az: fu => `${fu.az ?? "--"}°`,
+    el: fu => `${fu.el ?? "--"}°`,
+};
+
+function createCard(fu, socket) {
+    const root = document.createElement("div");
+    root.className = "card";
+    root.innerHTML = `
+        <h2></h2>
+        <p>🌡️ Temperature: <span data-field="temp"></span></p>
+        <p>💧 Humidity: <span data-field="hum"></span></p>
+        <p>📍 Lat: <span data-field="lat"></span>, Lon: <span data-field="lon"></span></p>
+        <p>🎯 AZ: <span data-field="az"></span>, EL: <span data-field="el"></span></p>
+        <select class="satellite-select"></select>
+    `;
+    root.querySelector("h2").textContent = `📡 Field Unit: ${fu.fu_id}`;
+
+    const card = { root, spans: {}, values: {}, satellite: fu.satellite || "" };
+    root.querySelectorAll("[data-field]").forEach(span => {
+        card.spans[span.dataset.field] = span;
     });
 
-    socket.on("log", (message) => {
-        const log = document.getElementById("log-box");
-        if (log) {
-            log.innerHTML += `<div>${message}</div>`;
-            log.scrollTop = log.scrollHeight;
+    const select = root.querySelector("select");
+    card.picker = new TomSelect(select, {
+        valueField: "name",
+        labelField: "name",
+        searchField: ["name"],
+        options: card.satellite ? [{ name: card.satellite }] : [],
+        items: card.satellite ? [card.satellite] : [],
+        placeholder: "Select satellite",
+        create: false,
+        maxOptions: SEARCH_LIMIT,
+        loadThrottle: 150,
+        shouldLoad: query => query.length > 0,
+        load: (query, callback) => {
+            card.picker.clearOptions();
+            satellites.search(query).then(callback, () => callback());
+        },
+        onChange: satName => {
+            if (!satName || satName === "undefined" || satName === card.satellite) return;
+            card.satellite = satName;
+            socket.emit("select_satellite", { fu_id: fu.fu_id, satellite_name: satName });
         }
     });
+    return card;
+}
 
-    socket.on("client_data_update", (data) => {
-        const clients = data.clients;
-        const container = document.getElementById("client-container");
-        if (!container) return;
-
-        const seenFUIds = new Set();
-
-        clients.forEach(fu => {
-            seenFUIds.add(fu.fu_id);
-            const existingCard = document.getElementById(`card-${fu.fu_id}`);
-
-            if (existingCard) {
-                // Update existing values
-                existingCard.querySelector(".temp").textContent = `${fu.sensor_data?.temperature ?? "--"} °C`;
-                existingCard.querySelector(".hum").textContent = `${fu.sensor_data?.humidity ?? "--"} %`;
-                existingCard.querySelector(".gps-lat").textContent = `${fu.gps?.lat ?? "--"}`;
-                existingCard.querySelector(".gps-lon").textContent = `${fu.gps?.lon ?? "--"}`;
-                existingCard.querySelector(".az").textContent = `${fu.az ?? "--"}°`;
-                existingCard.querySelector(".el").textContent = `${fu.el ?? "--"}°`;
-                return;
-            }
+function updateCard(card, fu) {
+    for (const [field, format] of Object.entries(FIELDS)) {
+        const text = format(fu);
+        if (card.values[field] !== text) {
+            card.values[field] = text;
+            card.spans[field].textContent = text;
+        }
+    }
+    const sat = fu.satellite || "";
+    if (sat && sat !== card.satellite) {
+        card.satellite = sat;
+        card.picker.addOption({ name: sat });
+        card.picker.setValue(sat, true);   // silent: don't echo back to the server
+    }
+}
+
+// --- Virtualized log view ---
+
+class LogView {
+    constructor(box, limit = LOG_LIMIT, rowPx = LOG_ROW_PX) {
+        this.box = box;
+        this.limit = limit;
+        this.rowPx = rowPx;
+        this.lines = new Array(limit);
+        this.start = 0;      // ring index of the oldest line
+        this.count = 0;
+        this.rows = [];
+        this.stick = true;   // follow new lines until the user scrolls up
+
+        this.spacer = document.createElement("div");
+        this.spacer.className = "log-spacer";
+        this.viewport = document.createElement("div");
+        this.viewport.className = "log-rows";
+        box.append(this.spacer, this.viewport);
+
+        this.schedule = frameBatcher(() => this.render());
+        box.addEventListener("scroll", () => {
+            this.stick = box.scrollTop + box.clientHeight >= box.scrollHeight - this.rowPx;
+            this.schedule();
+        }, { passive: true });
+        window.addEventListener("resize", this.schedule);
+    }
 
-            // Otherwise, create new card
-            const div = document.createElement("div");
-            div.className = "card";
-            div.id = `card-${fu.fu_id}`;
-
-            const selectedSat = fu.satellite || "";
-
-            div.innerHTML = `
-        <h2>📡 Field Unit: ${fu.fu_id}</h2>
-        <p>🌡️ Temperature: <span class="temp">${fu.sensor_data?.temperature ?? "--"} °C</span></p>
-        <p>💧 Humidity: <span class="hum">${fu.sensor_data?.humidity ?? "--"} %</span></p>
-        <p>📍 Lat: <span class="gps-lat">${fu.gps?.lat ?? "--"}</span>, Lon: <span class="gps-lon">${fu.gps?.lon ?? "--"}</span></p>
-        <p>🎯 AZ: <span class="az">${fu.az ?? "--"}°</span>, EL: <span class="el">${fu.el ?? "--"}°</span></p>
-        <select id="${fu.fu_id}-select" class="satellite-select" data-fu="${fu.fu_id}">
-          <option value="" disabled ${selectedSat ? "" : "selected"}>Select satellite</option>
-        </select>
-      `;
-
-            container.appendChild(div);
-
-            const select = document.getElementById(`${fu.fu_id}-select`);
-            if (!select) return;
-
-            window.allSatellites.forEach((sat) => {
-                const option = document.createElement("option");
-                option.value = sat.name;
-                option.textContent = sat.name;
-                if (sat.name === selectedSat) option.selected = true;
-                select.appendChild(option);
-            });
-
-            new TomSelect(select, {
-                create: false,
-                maxOptions: 10000,
-                sortField: { field: "text", direction: "asc" },
-                onChange: (satName) => {
-                    const fu_id = select.dataset.fu;
-                    if (!satName || satName === "undefined") return;
-                    console.log("🔽 Selection change:", satName);
-                    socket.emit("select_satellite", {
-                        fu_id,
-                        satellite_name: satName
-                    });
-                }
-            });
+    push(line) {
+        if (this.count < this.limit) {
+            this.lines[(this.start + this.count) % this.limit] = line;
+            this.count++;
+        } else {
+            this.lines[this.start] = line;
+            this.start = (this.start + 1) % this.limit;
+        }
+        this.schedule();
+    }
+
+    line(i) {
+        return this.lines[(this.start + i) % this.limit];
+    }
+
+    render() {
+        this.spacer.style.height = `${this.count * this.rowPx}px`;
+        if (this.stick) this.box.scrollTop = this.box.scrollHeight;
+
+        const visible = Math.ceil(this.box.clientHeight / this.rowPx) + 1;
+        const first = Math.max(0, Math.min(this.count - visible, Math.floor(this.box.scrollTop / this.rowPx)));
+        while (this.rows.length < Math.min(visible, this.count)) {
+            const row = document.createElement("div");
+            row.className = "log-row";
+            this.viewport.appendChild(row);
+            this.rows.push(row);
+        }
+        this.viewport.style.transform = `translateY(${first * this.rowPx}px)`;
+        this.rows.forEach((row, k) => {
+            const text = first + k < this.count ? this.line(first + k) : "";
+            if (row.textContent !== text) row.textContent = text;
         });
+    }
+}
 
-        // Optionally remove stale cards if needed
-        document.querySelectorAll(".card").forEach(card => {
-            const fu_id = card.id.replace("card-", "");
-            if (!seenFUIds.has(fu_id)) {
-                card.remove();
+// --- Wiring ---
+
+document.addEventListener("DOMContentLoaded", () => {
+    const socket = io();
+    const container = document.getElementById("client-container");
+    const logBox = document.getElementById("log-box");
+    const log = logBox ? new LogView(logBox) : null;
+    const cards = new Map();
+    let latest = null;
+
+    const renderClients = frameBatcher(() => {
+        if (!container || !latest) return;
+        const seen = new Set();
+        const fragment = document.createDocumentFragment();
+        for (const fu of latest) {
+            seen.add(fu.fu_id);
+            let card = cards.get(fu.fu_id);
+            if (!card) {
+                card = createCard(fu, socket);
+                cards.set(fu.fu_id, card);
+                fragment.appendChild(card.root);
             }
-        });
+            updateCard(card, fu);
+        }
+        container.appendChild(fragment);
+        for (const [fu_id, card] of cards) {
+            if (!seen.has(fu_id)) {
+                card.picker.destroy();
+                card.root.remove();
+                cards.delete(fu_id);
+            }
+        }
+        latest = null;
+    });
+
+    socket.on("connect", () => {
+        console.log("✅ Connected to server");
+    });
+
+    socket.on("log", message => {
+        if (log) log.push(String(message));
+    });
+
+    socket.on("client_data_update", data => {
+        latest = data.clients || [];   // only the newest snapshot matters
+        renderClients();
     });
-});
\ No newline at end of file
+});
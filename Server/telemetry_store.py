@@ -0,0 +1,388 @@
+"""Append-only time-series store for field unit telemetry.
+
+Every FU gets its own series of (timestamp, temperature, humidity, az, el)
+samples. Samples are appended to a fixed-size in-memory chunk; once the chunk
+is full it is sealed, zlib-compressed and written to disk as a segment. The
+most recent sealed chunks are also kept in a per-FU ring buffer so queries over
+the last few hours never touch the SD card.
+
+Sealing a segment also records its per-field min/max/sum/count in the FU's
+index file. A bucketed query answers every segment that falls entirely inside
+one bucket from that summary, so a month at a few hundred buckets reads the
+index, not the samples; only segments straddling a bucket edge are
+decompressed. Queries copy what they need under a lock and do the rest
+without it, so they can run in a worker thread while the server appends.
+`append`, `extend` and `flush` may seal a chunk (zlib and a file write), so
+async callers run them in a worker thread as well.
+
+Fields that were not part of a sample (e.g. az/el on a sensor update) are
+stored as NaN and ignored by the aggregations.
+"""
+import array
+import json
+import logging
+import math
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+
+import numpy as np
+
+FIELDS = ("temperature", "humidity", "az", "el")
+NAN = float("nan")
+SEGMENT_EXT = ".seg"
+INDEX_FILE = "index.jsonl"
+
+log = logging.getLogger("telemetry")
+
+
+def _safe_name(fu_id):
+    # FU ids are MAC addresses; keep them filesystem friendly. A leading dot
+    # is escaped too, so "." and ".." cannot name the root or its parent.
+    return re.sub(r"^\.|[^A-Za-z0-9_.-]", "_", fu_id) or "_"
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return NAN
+
+
+def track_points(track):
+    """Split a client-supplied pass track into (t, az, el) points and rejects.
+
+    A point is kept when it is a list or tuple of exactly three finite
+    numbers; anything else, including booleans, is returned in `bad`.
+    """
+    points, bad = [], []
+    for point in track if isinstance(track, (list, tuple)) else [track]:
+        if (isinstance(point, (list, tuple)) and len(point) == 3
+                and all(isinstance(v, (int, float)) and not isinstance(v, bool)
+                        and math.isfinite(v) for v in point)):
+            points.append(tuple(float(v) for v in point))
+        else:
+            bad.append(point)
+    return points, bad
+
+
+class Chunk:
+    """A column-oriented block of samples."""
+
+    __slots__ = ("ts", "cols")
+
+    def __init__(self):
+        self.ts = array.array("d")
+        self.cols = {f: array.array("d") for f in FIELDS}
+
+    def __len__(self):
+        return len(self.ts)
+
+    @property
+    def t0(self):
+        return min(self.ts) if self.ts else NAN
+
+    @property
+    def t1(self):
+        return max(self.ts) if self.ts else NAN
+
+    def append(self, t, values):
+        self.ts.append(t)
+        for f in FIELDS:
+            self.cols[f].append(values.get(f, NAN))
+
+    def to_bytes(self):
+        columns = [self.ts] + [self.cols[f] for f in FIELDS]
+        if sys.byteorder != "little":
+            columns = [array.array("d", c) for c in columns]
+            for c in columns:
+                c.byteswap()
+        return zlib.compress(b"".join(c.tobytes() for c in columns))
+
+    @classmethod
+    def from_bytes(cls, data):
+        raw = zlib.decompress(data)
+        n = len(raw) // 8 // (1 + len(FIELDS))
+        chunk = cls()
+        columns = [chunk.ts] + [chunk.cols[f] for f in FIELDS]
+        for i, col in enumerate(columns):
+            col.frombytes(raw[i * n * 8:(i + 1) * n * 8])
+            if sys.byteorder != "little":
+                col.byteswap()
+        return chunk
+
+    def arrays(self, start=-math.inf, end=math.inf):
+        """Copies of the timestamps and an (n, len(FIELDS)) value matrix in [start, end]."""
+        n = len(self.ts)
+        ts = np.frombuffer(self.ts, dtype=float, count=n).copy()
+        values = np.column_stack([np.frombuffer(self.cols[f], dtype=float, count=n)
+                                  for f in FIELDS]) if n else np.empty((0, len(FIELDS)))
+        inside = (ts >= start) & (ts <= end)
+        return ts[inside], values[inside]
+
+    def summary(self):
+        """{"n", "fields": {field: [min, max, sum, count] or None}} over the whole chunk."""
+        _, values = self.arrays()
+        fields = {}
+        for f, col in zip(FIELDS, values.T):
+            col = col[~np.isnan(col)]
+            fields[f] = ([float(col.min()), float(col.max()), float(col.sum()), len(col)]
+                         if len(col) else None)
+        return {"n": len(self), "fields": fields}
+
+
+class Series:
+    """Open chunk, in-memory ring of sealed chunks and on-disk segment index."""
+
+    def __init__(self, directory, ring_chunks):
+        self.directory = directory
+        self.open = Chunk()
+        self.recent = deque(maxlen=ring_chunks)  # (t0, t1, path, chunk)
+        self.segments = []                       # (t0, t1, path), sorted
+        self.summaries = {}                      # segment file name -> Chunk.summary()
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if not name.endswith(SEGMENT_EXT):
+                    continue
+                try:
+                    t0, t1 = (int(x) / 1000.0 for x in name[:-len(SEGMENT_EXT)].split("-"))
+                except ValueError:
+                    continue
+                self.segments.append((t0, t1, os.path.join(directory, name)))
+            self.segments.sort()
+            self._load_index()
+
+    @property
+    def index_path(self):
+        return os.path.join(self.directory, INDEX_FILE)
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self.summaries[entry["name"]] = entry
+                    except (ValueError, KeyError, TypeError):
+                        continue   # torn last line after a crash
+        except OSError:
+            pass
+
+    def seal(self):
+        chunk = self.open
+        if not len(chunk):
+            return
+        self.open = Chunk()
+        t0, t1 = chunk.t0, chunk.t1
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{int(t0 * 1000)}-{int(t1 * 1000)}{SEGMENT_EXT}"
+        path = os.path.join(self.directory, name)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(chunk.to_bytes())
+        os.replace(tmp, path)
+        summary = dict(chunk.summary(), name=name)
+        with open(self.index_path, "a") as f:
+            f.write(json.dumps(summary) + "\n")
+        self.summaries[name] = summary
+        self.segments.append((t0, t1, path))
+        self.recent.append((t0, t1, path, chunk))
+
+    def prune(self, cutoff):
+        keep = []
+        for t0, t1, path in self.segments:
+            if t1 < cutoff:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                self.summaries.pop(os.path.basename(path), None)
+            else:
+                keep.append((t0, t1, path))
+        if len(keep) != len(self.segments):
+            tmp = self.index_path + ".tmp"
+            with open(tmp, "w") as f:
+                f.writelines(json.dumps(s) + "\n" for s in self.summaries.values())
+            os.replace(tmp, self.index_path)
+        self.segments = keep
+
+    def plan(self, start, end):
+        """What a query over [start, end] needs, captured under the store lock.
+
+        Returns (segments, open_arrays): segments are (t0, t1, path, chunk or
+        None, summary or None) for every sealed segment overlapping the range;
+        open_arrays are copies of the open chunk's samples in the range.
+        """
+        cached = {path: chunk for _, _, path, chunk in self.recent}
+        segments = [(t0, t1, path, cached.get(path), self.summaries.get(os.path.basename(path)))
+                    for t0, t1, path in self.segments if t1 >= start and t0 <= end]
+        return segments, self.open.arrays(start, end)
+
+
+def _load(path, chunk):
+    if chunk is not None:
+        return chunk
+    try:
+        with open(path, "rb") as f:
+            return Chunk.from_bytes(f.read())
+    except (OSError, zlib.error) as e:
+        log.warning("Skipping unreadable segment %s: %s", path, e)
+        return None
+
+
+class TelemetryStore:
+    """Per-FU telemetry history with range queries and min/max/mean downsampling."""
+
+    def __init__(self, root, chunk_size=720, ring_chunks=24, retention_days=30):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.ring_chunks = ring_chunks
+        self.retention_s = retention_days * 86400
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def _series(self, fu_id):
+        series = self.series.get(fu_id)
+        if series is None:
+            series = Series(os.path.join(self.root, _safe_name(fu_id)), self.ring_chunks)
+            self.series[fu_id] = series
+        return series
+
+    def append(self, fu_id, t=None, **values):
+        """Append one sample. Unknown fields are ignored, missing ones are NaN."""
+        t = time.time() if t is None else float(t)
+        with self._lock:
+            series = self._series(fu_id)
+            series.open.append(t, {f: _to_float(values[f]) for f in FIELDS if f in values})
+            if len(series.open) >= self.chunk_size:
+                series.seal()
+                series.prune(t - self.retention_s)
+
+    def extend(self, fu_id, track):
+        """Append (t, az, el) points, e.g. a pass track, under one lock hold."""
+        with self._lock:
+            series = self._series(fu_id)
+            for t, az, el in track:
+                series.open.append(float(t), {"az": _to_float(az), "el": _to_float(el)})
+                if len(series.open) >= self.chunk_size:
+                    series.seal()
+                    series.prune(float(t) - self.retention_s)
+
+    def flush(self, fu_id=None):
+        """Seal open chunks to disk (all FUs when fu_id is None)."""
+        with self._lock:
+            targets = [self.series[fu_id]] if fu_id in self.series else []
+            if fu_id is None:
+                targets = list(self.series.values())
+            for series in targets:
+                series.seal()
+
+    def query(self, fu_id, start, end, buckets=None, fields=FIELDS):
+        """Return samples for fu_id in [start, end].
+
+        Without buckets the raw samples are returned column-wise. With buckets
+        the range is split into that many equal intervals and each non-empty
+        interval is reduced to min/max/mean per field.
+        """
+        fields = [f for f in fields if f in FIELDS]
+        idx = [FIELDS.index(f) for f in fields]
+        with self._lock:
+            series = self.series.get(fu_id)
+            if series is None and os.path.isdir(os.path.join(self.root, _safe_name(fu_id))):
+                series = self._series(fu_id)
+            if series is not None:
+                segments, open_arrays = series.plan(start, end)
+            else:
+                segments, open_arrays = [], Chunk().arrays()
+
+        if not buckets:
+            parts = [open_arrays]
+            for _, _, path, chunk, _ in segments:
+                chunk = _load(path, chunk)
+                if chunk is not None:
+                    parts.append(chunk.arrays(start, end))
+            ts = np.concatenate([p[0] for p in parts])
+            values = np.concatenate([p[1] for p in parts])
+            order = np.argsort(ts, kind="stable")
+            ts, values = ts[order], values[order]
+            out = {"t": ts.tolist()}
+            for f, i in zip(fields, idx):
+                out[f] = [None if math.isnan(v) else v for v in values[:, i].tolist()]
+            return out
+
+        acc = _Buckets(start, end, buckets, idx)
+        for t0, t1, path, chunk, summary in segments:
+            if summary is not None and acc.whole(t0, t1):
+                acc.add_summary(acc.index(t0), summary)
+                continue
+            chunk = _load(path, chunk)
+            if chunk is not None:
+                acc.add(*chunk.arrays(start, end))
+        acc.add(*open_arrays)
+        return acc.result(fields)
+
+
+class _Buckets:
+    """min/max/sum/count accumulators per bucket and field."""
+
+    def __init__(self, start, end, buckets, idx):
+        self.start = start
+        self.end = end
+        self.buckets = buckets
+        self.width = (end - start) / buckets or 1.0
+        self.idx = idx
+        self.count = np.zeros(buckets, dtype=np.int64)
+        shape = (buckets, len(idx))
+        self.lo = np.full(shape, math.inf)
+        self.hi = np.full(shape, -math.inf)
+        self.total = np.zeros(shape)
+        self.n = np.zeros(shape, dtype=np.int64)
+
+    def index(self, t):
+        return np.minimum(((np.asarray(t) - self.start) / self.width).astype(np.int64),
+                          self.buckets - 1)
+
+    def whole(self, t0, t1):
+        """True when [t0, t1] lies inside the range and inside a single bucket."""
+        return self.start <= t0 and t1 <= self.end and self.index(t0) == self.index(t1)
+
+    def add(self, ts, values):
+        if not len(ts):
+            return
+        b = self.index(ts)
+        self.count += np.bincount(b, minlength=self.buckets)
+        for j, i in enumerate(self.idx):
+            col = values[:, i]
+            ok = ~np.isnan(col)
+            bj, col = b[ok], col[ok]
+            np.minimum.at(self.lo[:, j], bj, col)
+            np.maximum.at(self.hi[:, j], bj, col)
+            self.total[:, j] += np.bincount(bj, weights=col, minlength=self.buckets)
+            self.n[:, j] += np.bincount(bj, minlength=self.buckets)
+
+    def add_summary(self, b, summary):
+        self.count[b] += summary["n"]
+        for j, i in enumerate(self.idx):
+            stats = summary["fields"].get(FIELDS[i])
+            if stats is None:
+                continue
+            lo, hi, total, n = stats
+            self.lo[b, j] = min(self.lo[b, j], lo)
+            self.hi[b, j] = max(self.hi[b, j], hi)
+            self.total[b, j] += total
+            self.n[b, j] += n
+
+    def result(self, fields):
+        result = []
+        for b in np.flatnonzero(self.count).tolist():
+            entry = {"t": self.start + b * self.width, "n": int(self.count[b])}
+            for j, f in enumerate(fields):
+                n = int(self.n[b, j])
+                entry[f] = {"min": float(self.lo[b, j]), "max": float(self.hi[b, j]),
+                            "mean": float(self.total[b, j]) / n} if n else None
+            result.append(entry)
+        return result
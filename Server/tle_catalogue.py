@@ -0,0 +1,75 @@
+"""Versioned TLE catalogue for per-FU subset sync.
+
+The server reads the catalogue file that the central unit's TLE stage
+rewrites (data/satellites.json), so every refresh reaches it. It stamps every
+satellite with the revision at which its elements last changed. A field
+unit holds only the satellites it needs. It asks for them by name together
+with the last revision it saw, and receives just the entries that changed
+since then plus the names the catalogue no longer has.
+
+Revisions are millisecond timestamps of the catalogue file, so they keep
+increasing across server restarts. After a restart every satellite is
+stamped with the file's own revision. An FU that already saw that revision
+gets nothing; any other FU refreshes its subset once and never misses an
+update.
+"""
+import json
+import logging
+import os
+
+MAX_SYNC_NAMES = 500
+
+log = logging.getLogger("tle")
+
+
+class TleCatalogue:
+    def __init__(self, path):
+        self.path = path
+        self.tles = {}
+        self.revs = {}
+        self.revision = 0
+        self._sig = None
+
+    def refresh(self):
+        """Reload the file if it changed on disk; returns True on reload."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            if self._sig is None:
+                log.error("%s not found. TLE-related APIs will fail.", self.path)
+                self._sig = ()
+            return False
+        sig = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if sig == self._sig:
+            return False
+        try:
+            with open(self.path, "r") as f:
+                tles = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            log.warning("Keeping current catalogue, %s unreadable: %s", self.path, e)
+            return False
+
+        revision = max(self.revision + 1, st.st_mtime_ns // 1_000_000)
+        changed = 0
+        for name, tle in tles.items():
+            if self.tles.get(name) != tle:
+                self.revs[name] = revision
+                changed += 1
+        for name in set(self.tles) - set(tles):
+            self.revs.pop(name, None)
+        self.tles, self.revision, self._sig = tles, revision, sig
+        log.info("Catalogue revision %d: %d satellites, %d changed", revision, len(tles), changed)
+        return True
+
+    def sync(self, names, since=0):
+        """Entries among `names` changed after revision `since`."""
+        self.refresh()
+        tles, missing = {}, []
+        for name in names[:MAX_SYNC_NAMES]:
+            tle = self.tles.get(name)
+            if tle is None:
+                missing.append(name)
+            elif self.revs.get(name, 0) > since:
+                tles[name] = {"line1": tle["line1"], "line2": tle["line2"],
+                              "rev": self.revs[name]}
+        return {"revision": self.revision, "tles": tles, "missing": missing}
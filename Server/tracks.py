@@ -0,0 +1,229 @@
+"""Ground tracks and sky-plot polylines for the dashboard, served from a tile cache.
+
+Time is cut into fixed TILE_S buckets. A tile holds one satellite's
+simplified polyline for one bucket: the ground track (t, lat, lon), or for a
+sky plot the above-mask arcs (t, az, el) seen from one station. Tiles are
+keyed by satellite, TLE epoch, bucket and the request parameters. Dashboards
+asking for "the next 90 minutes" a few seconds apart therefore hit the same
+tiles. A new element set gets new keys, and the stale tiles age out of the
+LRU.
+
+Missing tiles of a request are computed together: every satellite that needs
+a given bucket goes through one SatrecArray call. Polylines are thinned with
+Ramer-Douglas-Peucker to `resolution` degrees (sky plots are measured on the
+polar plot, so az wraparound and the zenith do not distort it). Ground tracks
+are split where they cross the antimeridian.
+"""
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from sgp4.api import Satrec, SatrecArray
+
+from overhead import MAX_RADIUS_KM, look_angles
+from visibility_index import WGS84_F, RE, gmst_rad, julian_date
+
+TILE_S = 3600
+MAX_TILES = 4096
+MAX_SATELLITES = 100
+
+
+def simplify(xy, tolerance):
+    """Indices of the points Ramer-Douglas-Peucker keeps for an (n, 2) array."""
+    n = len(xy)
+    if n < 3 or tolerance <= 0:
+        return np.arange(n)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        a, b = xy[i], xy[j]
+        seg = b - a
+        pts = xy[i + 1:j] - a
+        length = math.hypot(seg[0], seg[1])
+        if length == 0.0:
+            dist = np.hypot(pts[:, 0], pts[:, 1])
+        else:
+            dist = np.abs(seg[0] * pts[:, 1] - seg[1] * pts[:, 0]) / length
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance:
+            k += i + 1
+            keep[k] = True
+            stack.append((i, k))
+            stack.append((k, j))
+    return np.flatnonzero(keep)
+
+
+def subpoints(r_teme, unix_times):
+    """Geodetic lat/lon (deg) and altitude (km) for TEME positions shaped (sats, times, 3)."""
+    theta = gmst_rad(unix_times)[None, :]
+    x, y, z = r_teme[..., 0], r_teme[..., 1], r_teme[..., 2]
+    xe = x * np.cos(theta) + y * np.sin(theta)
+    ye = -x * np.sin(theta) + y * np.cos(theta)
+    lon = np.degrees(np.arctan2(ye, xe))
+    p = np.hypot(xe, ye)
+    e2 = WGS84_F * (2 - WGS84_F)
+    lat = np.arctan2(z, p * (1 - e2))
+    for _ in range(3):
+        n = RE / np.sqrt(1 - e2 * np.sin(lat) ** 2)
+        lat = np.arctan2(z + e2 * n * np.sin(lat), p)
+    n = RE / np.sqrt(1 - e2 * np.sin(lat) ** 2)
+    alt = p / np.cos(lat) - n
+    return np.degrees(lat), lon, alt
+
+
+def _runs(mask):
+    """(start, stop) index pairs of consecutive True values."""
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    return zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1))
+
+
+def _round(rows):
+    return [[round(float(t), 1), round(float(a), 3), round(float(b), 3)] for t, a, b in rows]
+
+
+class TrackService:
+    """Ground tracks and sky plots for satellites of a TleCatalogue."""
+
+    def __init__(self, catalogue, tile_s=TILE_S, max_tiles=MAX_TILES):
+        self.catalogue = catalogue
+        self.tile_s = tile_s
+        self.max_tiles = max_tiles
+        self.tiles = OrderedDict()
+        self.sats = {}      # name -> (epoch, Satrec)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    # --- Cache ---
+
+    def _satrec(self, name):
+        tle = self.catalogue.tles.get(name)
+        if not tle:
+            return None, None
+        epoch = tle["line1"][18:32]
+        cached = self.sats.get(name)
+        if cached is None or cached[0] != epoch:
+            cached = self.sats[name] = (epoch, Satrec.twoline2rv(tle["line1"], tle["line2"]))
+        return cached
+
+    def _step(self, step):
+        # A whole number of steps per tile, so adjacent tiles share their edge sample
+        return self.tile_s / max(1, round(self.tile_s / step))
+
+    def _tiles(self, kind, names, start, end, params, build):
+        """{name: [tile, ...]} covering [start, end], computing missing tiles per bucket."""
+        buckets = range(int(start // self.tile_s), int(end // self.tile_s) + 1)
+        found, missing = {}, {}
+        with self._lock:
+            for name in names:
+                epoch, sat = self._satrec(name)
+                if sat is None:
+                    continue
+                found[name] = []
+                for b in buckets:
+                    key = (kind, name, epoch, b) + params
+                    tile = self.tiles.get(key)
+                    if tile is None:
+                        self.misses += 1
+                        missing.setdefault(b, []).append((name, key, sat))
+                    else:
+                        self.hits += 1
+                        self.tiles.move_to_end(key)
+                    found[name].append((key, tile))
+
+        computed = {}
+        for b, wanted in missing.items():
+            t = b * self.tile_s + np.arange(0.0, self.tile_s + params[0] / 2, params[0])
+            jd, fr = julian_date(t)
+            err, r, _ = SatrecArray([sat for _, _, sat in wanted]).sgp4(jd, fr)
+            radius = np.linalg.norm(r, axis=-1)
+            ok = (err == 0) & np.isfinite(radius) & (radius < MAX_RADIUS_KM)
+            for (_, key, _), tile in zip(wanted, build(r, ok, t)):
+                computed[key] = tile
+        with self._lock:
+            for key, tile in computed.items():
+                self.tiles[key] = tile
+            while len(self.tiles) > self.max_tiles:
+                self.tiles.popitem(last=False)
+        return {name: [tile if tile is not None else computed[key] for key, tile in tiles]
+                for name, tiles in found.items()}
+
+    # --- Queries ---
+
+    def ground_tracks(self, names, start, duration, step=30.0, resolution=0.1):
+        """{name: [segment, ...]} with segments of [t, lat, lon], split at the antimeridian."""
+        end = start + duration
+
+        def build(r, ok, t):
+            lat, lon, _ = subpoints(r, t)
+            for i in range(len(r)):
+                segments = []
+                for a, b in _runs(ok[i]):
+                    # break where the longitude jumps across +/-180
+                    cuts = np.flatnonzero(np.abs(np.diff(lon[i, a:b])) > 180.0) + 1
+                    for s, e in zip(np.concatenate([[0], cuts]), np.concatenate([cuts, [b - a]])):
+                        ts, la, lo = t[a + s:a + e], lat[i, a + s:a + e], lon[i, a + s:a + e]
+                        keep = simplify(np.column_stack([lo, la]), resolution)
+                        segments.append(_round(zip(ts[keep], la[keep], lo[keep])))
+                yield segments
+
+        tiles = self._tiles("ground", names, start, end, (self._step(step), float(resolution)), build)
+        return {name: self._join(parts, start, end) for name, parts in tiles.items()}
+
+    def sky_plots(self, names, lat, lon, alt_m, start, duration, min_el=0.0,
+                  step=10.0, resolution=0.5):
+        """{name: [pass, ...]}: arcs above min_el as {aos, los, max_el, points: [t, az, el]}."""
+        end = start + duration
+        lat, lon, alt_m = round(lat, 3), round(lon, 3), round(alt_m)
+
+        def build(r, ok, t):
+            az, el, _ = look_angles(r, t, lat, lon, alt_m)
+            # polar-plot coordinates: radius is zenith distance
+            zen = 90.0 - el
+            x, y = zen * np.sin(np.radians(az)), zen * np.cos(np.radians(az))
+            for i in range(len(r)):
+                arcs = []
+                for a, b in _runs(ok[i] & (el[i] >= min_el)):
+                    keep = a + simplify(np.column_stack([x[i, a:b], y[i, a:b]]), resolution)
+                    arcs.append(_round(zip(t[keep], az[i, keep], el[i, keep])))
+                yield arcs
+
+        params = (self._step(step), float(resolution), lat, lon, alt_m, float(min_el))
+        tiles = self._tiles("sky", names, start, end, params, build)
+        out = {}
+        for name, parts in tiles.items():
+            out[name] = [{
+                "aos": arc[0][0],
+                "los": arc[-1][0],
+                "max_el": max(p[2] for p in arc),
+                "points": arc,
+            } for arc in self._join(parts, start, end)]
+        return out
+
+    @staticmethod
+    def _join(parts, start, end):
+        """Stitch per-tile polylines, merge pieces that continue across a
+        tile boundary and clip to [start, end]."""
+        lines = []
+        for tile in parts:
+            for line in tile:
+                if lines and lines[-1][-1][0] == line[0][0]:
+                    lines[-1] = lines[-1] + line[1:]
+                else:
+                    lines.append(list(line))
+        clipped = []
+        for line in lines:
+            ts = [p[0] for p in line]
+            i = max(np.searchsorted(ts, start, side="right") - 1, 0)
+            j = min(np.searchsorted(ts, end, side="left") + 1, len(line))
+            if i < j and line[i][0] <= end and line[j - 1][0] >= start:
+                clipped.append(line[i:j])
+        return clipped
+
+    def stats(self):
+        return {"tiles": len(self.tiles), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+r"""Single-process central unit.
+
+Runs TLE refresh, scheduling, assignment, the FU registry and the API as
+asyncio stages. The TLE, scheduler, assigner and Doppler stages share one
+in-memory TLE catalogue; the API stage serves the root Server.app, which
+answers from the schedule store and data/doppler.json rather than from the
+catalogue. Stages talk through in-process queues instead of polling each
+other's JSON files:
+
+    TLE refresh --(catalogue changed)--> Scheduler --(schedule)--> Assigner
+                                                   \-----------> Doppler
+    FU registry --(FU joined/expired)------------------------------^
+
+Schedule, assignments and registry are committed to the SQLite schedule
+store (schedule_store.py). Heartbeats update the in-memory registry on the
+event loop; their store writes are batched by a separate stage in a worker
+thread. The standalone scripts and the FU schedule API
+query that store, and JSON copies in data/ are still written for operators.
+Each stage runs under a supervisor that restarts it with a backoff if it
+crashes.
+"""
+import asyncio
+import json
+import logging
+import os
+
+import uvicorn
+from skyfield.api import load
+
+import Assigner
+import clock
+import doppler
+import Fetch
+import Fu_Registry
+import Scheduler
+import Server
+from Fetch_Sat_Name import SAT_NAME_FILE
+from log_utils import setup_logging
+from visibility_index import VisibilityIndex
+
+TLE_REFRESH_S = 6 * 3600
+RESCHEDULE_S = 3600
+REGISTRY_EXPIRY_S = 60
+API_HOST, API_PORT = "0.0.0.0", 8080
+
+log = logging.getLogger("central_unit")
+
+
+class Catalogue:
+    """The one copy of the TLE set every stage reads from."""
+
+    def __init__(self, path):
+        self.path = path
+        self.tles = {}
+        self.version = 0
+        self._index = None   # (version, VisibilityIndex)
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.tles = json.load(f)
+            self.version += 1
+        log.info("Catalogue loaded: %d satellites", len(self.tles))
+
+    def replace(self, tles):
+        changed = tles != self.tles
+        if changed:
+            self.tles = tles
+            self.version += 1
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(tles, f, indent=2)
+            os.replace(tmp, self.path)
+        return changed
+
+    @property
+    def index(self):
+        """Visibility index for the current catalogue, rebuilt on change.
+
+        Building it takes seconds on a full catalogue; read it from a worker
+        thread, not the event loop.
+        """
+        version, tles = self.version, self.tles
+        if self._index is None or self._index[0] != version:
+            self._index = (version, VisibilityIndex(tles))
+        return self._index[1]
+
+
+class CentralUnit:
+    def __init__(self):
+        self.catalogue = Catalogue(Scheduler.SATELLITES_FILE)
+        self.ts = None
+        self.schedule = []
+        self.schedule_q = asyncio.Queue()
+        self.assign_q = asyncio.Queue()
+        self.doppler_q = asyncio.Queue()
+        self.registry_q = asyncio.Queue()
+
+    def selected_satellites(self):
+        selected = list(Scheduler.SELECTED_SATELLITES)
+        try:
+            with SAT_NAME_FILE.open() as f:
+                name = json.load(f).get("satellite_name")
+            if name and name not in selected:
+                selected.append(name)
+        except (OSError, json.JSONDecodeError):
+            pass
+        return selected
+
+    # --- Stages ---
+
+    async def tle_stage(self):
+        while True:
+            try:
+                tles = await asyncio.to_thread(Fetch.download_tles)
+                if await asyncio.to_thread(self.catalogue.replace, tles):
+                    log.info("Catalogue refreshed (%d satellites)", len(tles))
+                    await self.schedule_q.put("tle")
+            except Exception as e:
+                log.warning("TLE refresh failed, keeping current catalogue: %s", e)
+            await clock.asleep(TLE_REFRESH_S)
+
+    async def schedule_ticker(self):
+        while True:
+            await self.schedule_q.put("tick")
+            await clock.asleep(RESCHEDULE_S)
+
+    async def scheduler_stage(self):
+        while True:
+            reason = await self.schedule_q.get()
+            while not self.schedule_q.empty():   # coalesce bursts of triggers
+                reason = self.schedule_q.get_nowait()
+            self.schedule = await asyncio.to_thread(self.generate_schedule)
+            log.info("Rescheduled (%s): %d passes", reason, len(self.schedule))
+            await self.assign_q.put("schedule")
+            await self.doppler_q.put("schedule")
+
+    def generate_schedule(self):
+        # Runs in a worker thread: reads the selection file and may build the index
+        catalogue = self.catalogue
+        tles, index = catalogue.tles, catalogue.index
+        return Scheduler.generate_schedule(self.selected_satellites(), tles, self.ts,
+                                           True, index)
+
+    async def assigner_stage(self):
+        while True:
+            reason = await self.assign_q.get()
+            while not self.assign_q.empty():
+                reason = self.assign_q.get_nowait()
+            assignments = await asyncio.to_thread(
+                Assigner.assign_passes, list(self.schedule), dict(Fu_Registry.fus))
+            log.info("Reassigned (%s) across %d FUs", reason, len(assignments))
+
+    async def doppler_stage(self):
+        while True:
+            await self.doppler_q.get()
+            while not self.doppler_q.empty():
+                self.doppler_q.get_nowait()
+            profiles = await asyncio.to_thread(
+                doppler.compute_profiles, list(self.schedule), self.catalogue.tles)
+            await asyncio.to_thread(doppler.save_profiles, profiles)
+
+    def registry_datagram(self, data, addr):
+        fid, info = Fu_Registry.parse_datagram(data, addr)
+        if fid is None:
+            return
+        is_new = Fu_Registry.register(fid, info)
+        self.registry_q.put_nowait((fid, info, is_new))
+        if is_new:
+            self.assign_q.put_nowait("registry")
+
+    async def registry_writer(self):
+        while True:
+            fid, info, snapshot = await self.registry_q.get()
+            batch = {fid: info}
+            while not self.registry_q.empty():   # one transaction per burst
+                fid, info, is_new = self.registry_q.get_nowait()
+                batch[fid] = info
+                snapshot = snapshot or is_new
+            await asyncio.to_thread(Fu_Registry.persist, batch, snapshot)
+
+    async def registry_expiry(self):
+        while True:
+            await clock.asleep(REGISTRY_EXPIRY_S)
+            removed = Fu_Registry.expire_inactive(persist=False)
+            if removed:
+                await asyncio.to_thread(Fu_Registry.remove, removed)
+                await self.assign_q.put("registry")
+
+    async def registry_stage(self):
+        unit = self
+
+        class RegistryProtocol(asyncio.DatagramProtocol):
+            def datagram_received(self, data, addr):
+                unit.registry_datagram(data, addr)
+
+        await asyncio.to_thread(Fu_Registry.load_registry)
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(
+            RegistryProtocol, local_addr=(Fu_Registry.UDP_IP, Fu_Registry.UDP_PORT))
+        log.info("FU Registry listening on UDP %s", Fu_Registry.UDP_PORT)
+        try:
+            await self.registry_expiry()
+        finally:
+            transport.close()
+
+    async def api_stage(self):
+        config = uvicorn.Config(Server.app, host=API_HOST, port=API_PORT)
+        await uvicorn.Server(config).serve()
+
+    # --- Supervisor ---
+
+    async def supervise(self, name, stage):
+        delay = 1
+        while True:
+            try:
+                await stage()
+                log.info("Stage %s exited", name)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.error("Stage %s crashed: %s. Restarting in %ss", name, e, delay, exc_info=True)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+
+    def stages(self):
+        return {
+            "api": self.api_stage,
+            "registry": self.registry_stage,
+            "registry_writer": self.registry_writer,
+            "tle": self.tle_stage,
+            "scheduler": self.scheduler_stage,
+            "schedule_ticker": self.schedule_ticker,
+            "assigner": self.assigner_stage,
+            "doppler": self.doppler_stage,
+        }
+
+    async def run(self):
+        self.catalogue.load()
+        self.ts = await asyncio.to_thread(load.timescale)
+        log.info("Central unit started")
+        await asyncio.gather(*(self.supervise(n, s) for n, s in self.stages().items()))
+
+
+if __name__ == "__main__":
+    setup_logging()
+    clock.install_from_env()
+    try:
+        asyncio.run(CentralUnit().run())
+    except KeyboardInterrupt:
+        print("\n🛑 Central unit stopped.")
@@ -0,0 +1,169 @@
+"""Injectable clock shared by the central unit, the server and the field units.
+
+Anything that needs "now" or has to wait calls this module instead of the
+time and datetime modules:
+
+    import clock
+    clock.time()        # UNIX seconds
+    clock.now()         # aware UTC datetime
+    clock.monotonic()   # for measuring intervals
+    clock.sleep(60)     # / clock.wait(event, 60) / await clock.asleep(60)
+
+By default these are the wall clock. Installing a SimClock makes every
+caller in the process run on simulated time. The simulation starts at
+`start` and runs `speed` times faster than real time, so a day of passes,
+assignments and registry expiries fits in minutes.
+
+Separate processes (central unit, server, field units) share one simulated
+timeline when they are started with the same environment:
+
+    SIM_SPEED=600 SIM_START=2025-01-01T00:00:00Z SIM_ANCHOR=$(date +%s) ...
+
+SIM_ANCHOR is the real UNIX time at which the simulation was at SIM_START.
+Without it, each process anchors at its own start-up.
+"""
+import asyncio
+import logging
+import math
+import os
+import time as _time
+from datetime import datetime, timezone
+
+log = logging.getLogger("clock")
+
+
+class WallClock:
+    """Real time; the default clock."""
+
+    speed = 1.0
+
+    def time(self):
+        return _time.time()
+
+    def monotonic(self):
+        return _time.monotonic()
+
+    def sleep(self, seconds):
+        _time.sleep(seconds)
+
+    def wait(self, event, timeout):
+        """Event.wait() with the timeout in clock seconds."""
+        return event.wait(timeout)
+
+    async def asleep(self, seconds):
+        await asyncio.sleep(seconds)
+
+
+class SimClock(WallClock):
+    """Simulated time running `speed` times faster than real time.
+
+    Reads `start` when the real clock reads `anchor`. Sleeps and waits are
+    given in simulated seconds and last 1/speed as long.
+    """
+
+    def __init__(self, start=None, speed=60.0, anchor=None):
+        if speed <= 0:
+            raise ValueError(f"speed must be positive, got {speed}")
+        self.anchor = _time.time() if anchor is None else float(anchor)
+        self.start = self.anchor if start is None else float(start)
+        self.speed = float(speed)
+
+    def time(self):
+        return self.start + (_time.time() - self.anchor) * self.speed
+
+    def monotonic(self):
+        return _time.monotonic() * self.speed
+
+    def sleep(self, seconds):
+        _time.sleep(max(seconds, 0) / self.speed)
+
+    def wait(self, event, timeout):
+        return event.wait(None if timeout is None else max(timeout, 0) / self.speed)
+
+    async def asleep(self, seconds):
+        await asyncio.sleep(max(seconds, 0) / self.speed)
+
+    def __repr__(self):
+        start = datetime.fromtimestamp(self.start, tz=timezone.utc).isoformat()
+        return f"SimClock(start={start}, speed={self.speed:g}x)"
+
+
+_clock = WallClock()
+
+
+def get_clock():
+    return _clock
+
+
+def set_clock(new_clock):
+    """Install `new_clock` for the whole process; returns the previous one."""
+    global _clock
+    previous, _clock = _clock, new_clock
+    return previous
+
+
+def time():
+    return _clock.time()
+
+
+def now():
+    return datetime.fromtimestamp(_clock.time(), tz=timezone.utc)
+
+
+def monotonic():
+    return _clock.monotonic()
+
+
+def sleep(seconds):
+    _clock.sleep(seconds)
+
+
+def wait(event, timeout):
+    return _clock.wait(event, timeout)
+
+
+async def asleep(seconds):
+    await _clock.asleep(seconds)
+
+
+def parse_time(value):
+    """UNIX seconds from a number or an ISO-8601 string (naive means UTC).
+
+    None passes through as None; anything else that is not a finite time
+    raises ValueError.
+    """
+    if value is None:
+        return None
+    try:
+        t = float(value)
+    except (TypeError, ValueError):
+        if not isinstance(value, str):
+            raise ValueError(f"Not a time: {value!r}")
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        t = dt.timestamp()
+    if not math.isfinite(t):
+        raise ValueError(f"Not a time: {value!r}")
+    return t
+
+
+def from_env(environ=os.environ):
+    """SimClock described by SIM_SPEED / SIM_START / SIM_ANCHOR, or None."""
+    speed = environ.get("SIM_SPEED")
+    if not speed:
+        return None
+    start = environ.get("SIM_START")
+    anchor = environ.get("SIM_ANCHOR")
+    return SimClock(start=parse_time(start) if start else None,
+                    speed=float(speed),
+                    anchor=float(anchor) if anchor else None)
+
+
+def install_from_env(environ=os.environ):
+    """Switch to simulated time if the environment asks for it."""
+    sim = from_env(environ)
+    if sim is not None:
+        set_clock(sim)
+        log.warning("Running on simulated time: %r", sim)
+    return _clock
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""Precomputed range, range-rate and Doppler profiles for scheduled passes.
+
+This pipeline stage runs after Scheduler. For each satellite it propagates
+every sample of every scheduled pass in one vectorized SGP4 call. It then
+derives range, range rate and the Doppler shift of the satellite's downlink
+as seen from the ground station.
+
+Profiles are written to data/doppler.json next to the schedule. They are
+keyed by "<satellite>|<start>" with the pass start in whole UNIX seconds, so
+a pass is one dict lookup whatever form its start time was written in, and a
+sample inside it is one index computation. Each curve is a base64 block of
+little-endian float32 values sampled every `step` seconds from `t0`.
+"""
+import base64
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+from sgp4.api import Satrec
+
+import clock
+import Scheduler
+from log_utils import setup_logging
+from schedule_store import open_store, pass_start
+from visibility_index import gmst_rad, julian_date, station_ecef
+
+DOPPLER_FILE = "data/doppler.json"
+STEP_S = 1.0
+C_KM_S = 299792.458
+EARTH_RATE = 7.2921158553e-5    # rad/s
+
+# Downlink frequencies (Hz); anything not listed uses DEFAULT_DOWNLINK_HZ
+DOWNLINK_HZ = {
+    "NOAA 15": 137.62e6,
+    "NOAA 18": 137.9125e6,
+    "NOAA 19": 137.1e6,
+}
+DEFAULT_DOWNLINK_HZ = 137.5e6
+
+log = logging.getLogger("doppler")
+
+
+def pass_key(satellite, start):
+    """Profile key for a pass of `satellite` starting at UNIX time `start`."""
+    return f"{satellite}|{int(round(start))}"
+
+
+def encode(values):
+    return base64.b64encode(np.asarray(values, dtype="<f4").tobytes()).decode("ascii")
+
+
+def decode(blob):
+    return np.frombuffer(base64.b64decode(blob), dtype="<f4")
+
+
+def station_state_teme(lat, lon, alt_m, unix_times):
+    """Station position (km) and velocity (km/s) in TEME at each time."""
+    x, y, z = station_ecef(lat, lon, alt_m)
+    theta = gmst_rad(unix_times)
+    c, s = np.cos(theta), np.sin(theta)
+    r = np.stack([x * c - y * s, x * s + y * c, np.full_like(theta, z)], axis=-1)
+    v = np.stack([-EARTH_RATE * r[:, 1], EARTH_RATE * r[:, 0], np.zeros_like(theta)], axis=-1)
+    return r, v
+
+
+def range_profile(line1, line2, unix_times, lat, lon, alt_m):
+    """Range (km) and range rate (km/s, positive = receding) at each time."""
+    jd, fr = julian_date(unix_times)
+    err, r, v = Satrec.twoline2rv(line1, line2).sgp4_array(jd, fr)
+    r_st, v_st = station_state_teme(lat, lon, alt_m, unix_times)
+    rho = r - r_st
+    rng = np.linalg.norm(rho, axis=-1)
+    rate = np.einsum("ij,ij->i", rho, v - v_st) / rng
+    bad = err != 0
+    rng[bad] = np.nan
+    rate[bad] = np.nan
+    return rng, rate
+
+
+def compute_profiles(schedule, tles, lat=Scheduler.LAT, lon=Scheduler.LON,
+                     alt_m=Scheduler.ALT * 1000, step=STEP_S, frequencies=None):
+    """Profiles for every pass in `schedule`, keyed by pass_key()."""
+    frequencies = {**DOWNLINK_HZ, **(frequencies or {})}
+    by_sat = {}
+    for entry in schedule:
+        by_sat.setdefault(entry.get("satellite"), []).append(entry)
+
+    profiles = {}
+    for sat, entries in by_sat.items():
+        tle = tles.get(sat)
+        if not tle:
+            log.warning("No TLE for %s; skipping %d Doppler profiles", sat, len(entries))
+            continue
+        # All passes of one satellite go through SGP4 together
+        grids = []
+        for entry in entries:
+            n = int(float(entry.get("duration", 600)) // step) + 1
+            grids.append(pass_start(entry) + step * np.arange(n))
+        rng, rate = range_profile(tle["line1"], tle["line2"], np.concatenate(grids), lat, lon, alt_m)
+
+        freq = frequencies.get(sat, DEFAULT_DOWNLINK_HZ)
+        offset = 0
+        for entry, grid in zip(entries, grids):
+            r = rng[offset:offset + len(grid)]
+            rr = rate[offset:offset + len(grid)]
+            offset += len(grid)
+            profiles[pass_key(sat, grid[0])] = {
+                "satellite": sat,
+                "start_time": entry.get("start_time"),
+                "t0": float(grid[0]),
+                "step": step,
+                "n": len(grid),
+                "frequency_hz": freq,
+                "tca_s": float(np.nanargmin(r) * step) if np.isfinite(r).any() else None,
+                "range_km": encode(r),
+                "range_rate_km_s": encode(rr),
+                "doppler_hz": encode(-freq * rr / C_KM_S),
+            }
+    return profiles
+
+
+def save_profiles(profiles, path=DOPPLER_FILE):
+    data = {"generated": clock.time(), "passes": profiles}
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp, path)
+    log.info("Saved %d Doppler profiles to %s", len(profiles), path)
+
+
+def generate_profiles(schedule=None, tles=None, save=True):
+    """Pipeline entry point; inputs default to the schedule store and TLE file."""
+    if schedule is None:
+        schedule = open_store().passes_between()
+    if tles is None:
+        with open(Scheduler.SATELLITES_FILE) as f:
+            tles = json.load(f)
+    profiles = compute_profiles(schedule, tles)
+    if save:
+        save_profiles(profiles)
+    return profiles
+
+
+class DopplerIndex:
+    """Read side: reloads doppler.json when it changes, decodes curves on demand."""
+
+    def __init__(self, path=DOPPLER_FILE):
+        self.path = path
+        self.passes = {}
+        self._sig = None
+        self._decoded = {}
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return
+        sig = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if sig == self._sig:
+            return
+        with self._lock:
+            try:
+                with open(self.path) as f:
+                    self.passes = json.load(f).get("passes", {})
+                self._decoded = {}
+                self._sig = sig
+            except (OSError, json.JSONDecodeError) as e:
+                log.warning("Failed to load %s: %s", self.path, e)
+
+    def get(self, satellite, start):
+        """Compact profile for the pass starting at UNIX time `start`, or None."""
+        self._refresh()
+        return self.passes.get(pass_key(satellite, start))
+
+    def curves(self, satellite, start):
+        """Decoded (range_km, range_rate_km_s, doppler_hz) arrays for one pass."""
+        self._refresh()   # drops curves decoded from an older file
+        key = pass_key(satellite, start)
+        decoded = self._decoded
+        hit = decoded.get(key)
+        if hit is None:
+            profile = self.passes.get(key)
+            if profile is None:
+                return None
+            hit = decoded[key] = (profile, decode(profile["range_km"]),
+                                  decode(profile["range_rate_km_s"]),
+                                  decode(profile["doppler_hz"]))
+        return hit
+
+    def at(self, satellite, start, t):
+        """(range_km, range_rate_km_s, doppler_hz) at UNIX time t during the pass."""
+        hit = self.curves(satellite, start)
+        if hit is None:
+            return None
+        profile, rng, rate, doppler = hit
+        i = int(round((t - profile["t0"]) / profile["step"]))
+        if not 0 <= i < profile["n"]:
+            return None
+        return float(rng[i]), float(rate[i]), float(doppler[i])
+
+
+if __name__ == "__main__":
+    setup_logging()
+    clock.install_from_env()
+    generate_profiles()
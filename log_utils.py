@@ -1,6 +1,256 @@
-from datetime import datetime
+"""Shared logging for the central unit, the API servers and the field units.
+
+`setup_logging()` puts a single QueueHandler on the root logger, so calling
+code only pays for building a record, rendering its message and a queue put.
+Rendering in the caller's thread means arguments mutated after the call are
+logged as they were. One writer thread drains the queue in batches and
+formats each record. It writes to the console and to a JSON-lines file that
+rotates by size and optionally by age.
+Output is flushed once per batch, or at most every `flush_interval` seconds,
+never per record.
+
+Levels are set per logger through `LOG_LEVELS`, e.g.
+`LOG_LEVELS="server=DEBUG,pass=WARNING"`. Loggers are named after the module
+that owns them; `LOG_LEVEL` sets the default.
+
+`log_event()` is kept for existing callers and logs at INFO on the "event"
+logger.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+LOG_FILE = os.environ.get("LOG_FILE", "data/log.txt")
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 5
+FLUSH_INTERVAL = 1.0
+BATCH = 512
+
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+_STOP = object()
+_EXC_FORMATTER = logging.Formatter()
+_writer = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; `extra=` fields become top-level keys."""
+
+    def format(self, record):
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        data.update((k, v) for k, v in vars(record).items() if k not in _RECORD_ATTRS)
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+class RotatingFile(logging.Handler):
+    """Block-buffered log file that rotates past `max_bytes` or `max_age_s`."""
+
+    def __init__(self, path, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS, max_age_s=None):
+        super().__init__()
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.max_age_s = max_age_s
+        self.stream = None
+        self._open()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.stream = open(self.path, "ab", buffering=64 * 1024)
+        self.size = self.stream.tell()
+        self.opened = time.time()
+
+    def rotate(self):
+        self.stream.close()
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def emit(self, record):
+        try:
+            data = (self.format(record) + "\n").encode("utf-8")
+            expired = self.max_age_s and time.time() - self.opened >= self.max_age_s
+            if self.size and (self.size + len(data) > self.max_bytes or expired):
+                self.rotate()
+            self.stream.write(data)
+            self.size += len(data)
+        except Exception:
+            self.handleError(record)
+
+    def sync(self):
+        self.stream.flush()
+
+    def close(self):
+        if self.stream:
+            self.stream.close()
+        super().close()
+
+
+class BufferedConsole(logging.StreamHandler):
+    """StreamHandler that leaves flushing to the writer thread."""
+
+    def flush(self):
+        pass
+
+    def sync(self):
+        super().flush()
+
+
+class DashboardFeed(logging.Handler):
+    """Rate-limited copy of records for a live dashboard.
+
+    Records queue up in a bounded buffer. `drain()` hands out at most `rate`
+    lines per second (token bucket, `burst` deep) and drops the rest, so a
+    noisy FU cannot flood the browser. Dropped lines are counted and every
+    drain that has some to report ends with an "N lines dropped" line.
+    """
+
+    def __init__(self, rate=5.0, burst=20, maxlen=200, level=logging.INFO):
+        super().__init__(level)
+        self.rate = rate
+        self.burst = burst
+        self.lines = deque(maxlen=maxlen)
+        self.tokens = float(burst)
+        self.stamp = time.monotonic()
+        self.dropped = 0
+        self.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", "%H:%M:%S"))
+
+    def emit(self, record):
+        if len(self.lines) == self.lines.maxlen:
+            self.dropped += 1
+        self.lines.append(self.format(record))
+
+    def drain(self, now=None):
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        out = []
+        while self.lines and self.tokens >= 1.0:
+            out.append(self.lines.popleft())
+            self.tokens -= 1.0
+        if self.lines and self.tokens < 1.0:
+            self.dropped += len(self.lines)
+            self.lines.clear()
+        if self.dropped:
+            out.append(f"... {self.dropped} lines dropped")
+            self.dropped = 0
+        return out
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Render the message in the caller's thread; the writer formats lines."""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _EXC_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _Writer(threading.Thread):
+    def __init__(self, q, handlers, flush_interval):
+        super().__init__(name="log-writer", daemon=True)
+        self.q = q
+        self.handlers = handlers
+        self.flush_interval = flush_interval
+
+    def run(self):
+        last_flush = time.monotonic()
+        stopping = False
+        while not stopping:
+            try:
+                batch = [self.q.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                batch = []
+            while batch and len(batch) < BATCH:
+                try:
+                    batch.append(self.q.get_nowait())
+                except queue.Empty:
+                    break
+            for record in batch:
+                if record is _STOP:
+                    stopping = True
+                    continue
+                for handler in self.handlers:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+            if stopping or not batch or time.monotonic() - last_flush >= self.flush_interval:
+                for handler in self.handlers:
+                    handler.sync()
+                last_flush = time.monotonic()
+
+    def stop(self):
+        self.q.put(_STOP)
+        self.join(timeout=5)
+        for handler in self.handlers:
+            handler.close()
+
+
+def parse_levels(spec):
+    """'server=DEBUG,pass=WARNING' -> {'server': 'DEBUG', 'pass': 'WARNING'}"""
+    levels = {}
+    for item in (spec or "").split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(log_file=LOG_FILE, level=None, levels=None, max_bytes=LOG_MAX_BYTES,
+                  backups=LOG_BACKUPS, max_age_s=None, flush_interval=FLUSH_INTERVAL):
+    """Install the queue-backed logging pipeline once per process."""
+    global _writer
+    if _writer is not None:
+        return _writer
+    console = BufferedConsole(sys.stdout)
+    console.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s [%(name)s] %(message)s",
+                                           "%H:%M:%S"))
+    handlers = [console]
+    if log_file:
+        file_handler = RotatingFile(log_file, max_bytes, backups, max_age_s)
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+
+    q = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers[:] = [_QueueHandler(q)]
+    root.setLevel(level or os.environ.get("LOG_LEVEL", "INFO").upper())
+    for name, lvl in {**parse_levels(os.environ.get("LOG_LEVELS")), **(levels or {})}.items():
+        logging.getLogger(name).setLevel(lvl)
+
+    _writer = _Writer(q, handlers, flush_interval)
+    _writer.start()
+    atexit.register(_writer.stop)
+    return _writer
+
 
 def log_event(message):
-	timestamp = datetime.utcnow().isoformat()
-	with open("data/log.txt", "a") as log_file:
-		log_file.write(f"[{timestamp}] {message}\n")
+    if _writer is None:
+        setup_logging()
+    logging.getLogger("event").info(message)
@@ -0,0 +1,184 @@
+"""On-demand sampling profiler and event-loop stall detection.
+
+Nothing here runs until it is asked for. Importing this module and
+installing the signal handler cost nothing while no profile is being taken.
+
+* `sample_stacks(seconds)` snapshots every thread's Python stack every
+  `interval` seconds through sys._current_frames(). It returns the counts
+  in the "folded" format (`thread;module:function:line;... count`), which
+  flamegraph.pl, speedscope and inferno read directly. The sampler runs in
+  its own thread and never touches the threads being profiled.
+* `StallMonitor` is a heartbeat coroutine plus a watchdog thread. When the
+  asyncio loop fails to run the heartbeat for longer than the threshold,
+  the watchdog records the loop thread's stack while it is still blocked.
+  That shows which callback stalled the loop. asyncio's own debug mode
+  only reports the callback's name after it returns, and slows down every
+  callback.
+* `install_signal_handler()` makes SIGUSR1 write a profile of all threads
+  (tracking, Socket.IO, sensors, ...) to a .folded file. It is for field
+  units, which have no admin API.
+"""
+import asyncio
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+DEFAULT_INTERVAL = 0.01
+MAX_DEPTH = 128
+
+log = logging.getLogger("profiling")
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{code.co_name}:{frame.f_lineno}"
+
+
+def stack_of(frame, limit=MAX_DEPTH):
+    """Frame labels from the outermost call down to `frame`."""
+    labels = []
+    while frame is not None and len(labels) < limit:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def sample_stacks(seconds, interval=DEFAULT_INTERVAL, threads=None):
+    """Sample all threads for `seconds`; returns a Counter of folded stacks.
+
+    `threads` optionally restricts sampling to threads whose name contains
+    one of the given substrings.
+    """
+    me = threading.get_ident()
+    counts = Counter()
+    deadline = time.monotonic() + seconds
+    while True:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            name = names.get(ident, str(ident))
+            if threads and not any(s in name for s in threads):
+                continue
+            counts[";".join([name.replace(";", ":")] + stack_of(frame))] += 1
+        if time.monotonic() >= deadline:
+            return counts
+        time.sleep(interval)
+
+
+def folded(counts):
+    """Counter of stacks -> folded text, heaviest stacks first."""
+    return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
+
+
+def write_profile(path, seconds, interval=DEFAULT_INTERVAL, threads=None):
+    counts = sample_stacks(seconds, interval, threads)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(folded(counts))
+    os.replace(tmp, path)
+    log.info("Wrote %d samples to %s", sum(counts.values()), path)
+    return path
+
+
+class StallMonitor:
+    """Detect event-loop stalls longer than `threshold` seconds.
+
+    Start it inside the loop with `await monitor.run()` (or as a background
+    task); `snapshot()` returns the counters and the most recent stalls.
+    """
+
+    def __init__(self, threshold=0.1, interval=None, keep=50):
+        self.threshold = threshold
+        self.interval = interval or threshold / 2
+        self.stalls = deque(maxlen=keep)
+        self.count = 0
+        self.worst = 0.0
+        self._beat = None
+        self._loop_thread = None
+        self._captured = None
+        self._stack = None
+        self._stop = threading.Event()
+
+    async def run(self):
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        threading.Thread(target=self._watch, name="stall-watchdog", daemon=True).start()
+        log.info("Watching the event loop for stalls over %.0f ms", self.threshold * 1000)
+        try:
+            while True:
+                before = time.monotonic()
+                await asyncio.sleep(self.interval)
+                now = time.monotonic()
+                self._beat = now
+                lag = now - before - self.interval
+                if lag > self.threshold:
+                    self._record(lag)
+        finally:
+            self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            beat = self._beat
+            if self._captured == beat or time.monotonic() - beat < self.interval + self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None:
+                self._captured = beat
+                self._stack = stack_of(frame)
+
+    def _record(self, lag):
+        stack = self._stack if self._captured is not None else None
+        self._captured = None
+        self._stack = None
+        self.count += 1
+        self.worst = max(self.worst, lag)
+        self.stalls.append({"t": time.time(), "lag_ms": round(lag * 1000, 1), "stack": stack})
+        if stack:
+            log.warning("Event loop stalled for %.0f ms in %s", lag * 1000, stack[-1])
+        else:
+            log.warning("Event loop stalled for %.0f ms", lag * 1000)
+
+    def snapshot(self):
+        return {
+            "threshold_ms": self.threshold * 1000,
+            "stalls": self.count,
+            "worst_ms": round(self.worst * 1000, 1),
+            "recent": list(self.stalls),
+        }
+
+
+def install_signal_handler(out_dir="logs", seconds=10.0, interval=DEFAULT_INTERVAL,
+                           threads=None, signum=getattr(signal, "SIGUSR1", None)):
+    """On `signum`, profile for `seconds` in the background and write a .folded file.
+
+    Returns False where the signal does not exist (e.g. Windows).
+    """
+    if signum is None:
+        return False
+    busy = threading.Lock()
+
+    def profile():
+        try:
+            os.makedirs(out_dir, exist_ok=True)
+            path = os.path.join(out_dir, f"profile-{os.getpid()}-{int(time.time())}.folded")
+            write_profile(path, seconds, interval, threads)
+        except Exception as e:
+            log.error("Profile failed: %s", e)
+        finally:
+            busy.release()
+
+    def handler(signum, frame):
+        if not busy.acquire(blocking=False):
+            return   # one profile at a time
+        threading.Thread(target=profile, name="profiler", daemon=True).start()
+
+    signal.signal(signum, handler)
+    return True
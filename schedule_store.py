@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""SQLite store for the schedule, pass assignments and the FU registry.
+
+Replaces re-reading and rewriting data/schedule.json, data/assignments.json
+and data/active_fus.json whole. The database runs in WAL mode, so any number
+of readers (API workers, other processes) see a consistent snapshot while one
+writer commits. Writes in this process are serialised through a single
+connection; each thread reads through its own connection.
+
+Passes and assignments are indexed on satellite, FU and start time. This
+keeps the common questions as index range scans, even with tens of
+thousands of passes:
+
+    passes_between(t0, t1)          passes overlapping [t0, t1]
+    next_pass(satellite=..., fu_id=...)
+    fu_passes(fu_id, since, until)  what GET /api/fu_schedule returns
+    free_fus(t)                     active FUs with nothing assigned at t
+
+Times are UNIX seconds. Entries come back as the original pass dicts.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+
+import clock
+from log_utils import setup_logging
+
+STORE_FILE = "data/orbitalink.db"
+LEGACY_FILES = {
+    "schedule": "data/schedule.json",
+    "assignments": "data/assignments.json",
+    "registry": "data/active_fus.json",
+}
+DEFAULT_DURATION = 600
+
+log = logging.getLogger("schedule_store")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS passes (
+    id INTEGER PRIMARY KEY,
+    satellite TEXT NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    entry TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS passes_start ON passes (start);
+CREATE INDEX IF NOT EXISTS passes_satellite ON passes (satellite, start);
+
+CREATE TABLE IF NOT EXISTS assignments (
+    fu_id TEXT NOT NULL,
+    satellite TEXT NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    entry TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS assignments_fu ON assignments (fu_id, start);
+CREATE INDEX IF NOT EXISTS assignments_start ON assignments (start);
+CREATE INDEX IF NOT EXISTS assignments_satellite ON assignments (satellite, start);
+
+CREATE TABLE IF NOT EXISTS fus (
+    fu_id TEXT PRIMARY KEY,
+    ip TEXT,
+    last_seen REAL NOT NULL,
+    info TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fus_last_seen ON fus (last_seen);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+
+def pass_start(entry):
+    """Start of a pass entry in UNIX seconds; ValueError if it has no valid one."""
+    start = clock.parse_time(entry.get("start_time") or entry.get("timestamp"))
+    if start is None:
+        raise ValueError(f"Pass has no start time: {entry!r}")
+    return start
+
+
+def _row(entry):
+    start = pass_start(entry)
+    end = start + float(entry.get("duration", DEFAULT_DURATION))
+    return entry.get("satellite"), start, end, json.dumps(entry)
+
+
+def _bound(value, default):
+    return default if value is None else float(value)
+
+
+class ScheduleStore:
+    def __init__(self, path=STORE_FILE):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._writer = self._connect()
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._writer.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=10000")
+        return conn
+
+    @property
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _read(self, sql, args=()):
+        return self._reader.execute(sql, args).fetchall()
+
+    def _write(self, fn):
+        with self._write_lock:
+            conn = self._writer
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(conn)
+                conn.execute("COMMIT")
+                return result
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _meta(self, key, default=0.0):
+        row = self._read("SELECT value FROM meta WHERE key = ?", (key,))
+        return row[0][0] if row else default
+
+    @staticmethod
+    def _set_meta(conn, key, value):
+        conn.execute("INSERT INTO meta (key, value) VALUES (?, ?) "
+                     "ON CONFLICT (key) DO UPDATE SET value = excluded.value", (key, value))
+
+    # --- Writers ---
+
+    def replace_schedule(self, schedule):
+        rows = [_row(e) for e in schedule]
+
+        def write(conn):
+            conn.execute("DELETE FROM passes")
+            conn.executemany("INSERT INTO passes (satellite, start, end, entry) "
+                             "VALUES (?, ?, ?, ?)", rows)
+            self._set_meta(conn, "pass_max_duration",
+                           max((end - start for _, start, end, _ in rows), default=0.0))
+        self._write(write)
+        log.info("Stored %d scheduled passes", len(rows))
+
+    def replace_assignments(self, assignments):
+        """Replace all assignments with {fu_id: [entries]}."""
+        rows = [(fu_id,) + _row(e) for fu_id, entries in assignments.items() for e in entries]
+
+        def write(conn):
+            conn.execute("DELETE FROM assignments")
+            conn.executemany("INSERT INTO assignments (fu_id, satellite, start, end, entry) "
+                             "VALUES (?, ?, ?, ?, ?)", rows)
+            self._set_meta(conn, "assignment_max_duration",
+                           max((r[3] - r[2] for r in rows), default=0.0))
+        self._write(write)
+        log.info("Stored %d assignments for %d FUs", len(rows), len(assignments))
+
+    def upsert_fu(self, fu_id, info):
+        """Insert or refresh one registry entry ({"ip", "last_seen", ...})."""
+        self.upsert_fus({fu_id: info})
+
+    def upsert_fus(self, fus):
+        """Insert or refresh {fu_id: info} registry entries in one transaction.
+
+        An entry without `last_seen` counts as seen now.
+        """
+        now = clock.time()
+        rows = [(fu_id, info.get("ip"), _bound(clock.parse_time(info.get("last_seen")), now),
+                 json.dumps(info)) for fu_id, info in fus.items()]
+        self._write(lambda conn: conn.executemany(
+            "INSERT INTO fus (fu_id, ip, last_seen, info) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (fu_id) DO UPDATE SET ip = excluded.ip, "
+            "last_seen = excluded.last_seen, info = excluded.info", rows))
+
+    def remove_fus(self, fu_ids):
+        if fu_ids:
+            self._write(lambda conn: conn.executemany(
+                "DELETE FROM fus WHERE fu_id = ?", [(f,) for f in fu_ids]))
+
+    # --- Queries ---
+
+    def passes_between(self, t0=None, t1=None, satellite=None):
+        """Scheduled passes overlapping [t0, t1], ordered by start."""
+        t0, t1 = _bound(t0, -math.inf), _bound(t1, math.inf)
+        lo = t0 - self._meta("pass_max_duration")
+        if satellite is None:
+            rows = self._read("SELECT entry FROM passes WHERE start BETWEEN ? AND ? "
+                              "AND end >= ? ORDER BY start", (lo, t1, t0))
+        else:
+            rows = self._read("SELECT entry FROM passes WHERE satellite = ? "
+                              "AND start BETWEEN ? AND ? AND end >= ? ORDER BY start",
+                              (satellite, lo, t1, t0))
+        return [json.loads(r[0]) for r in rows]
+
+    def next_pass(self, after, satellite=None, fu_id=None):
+        """First pass starting at or after `after` for a satellite and/or FU, or None."""
+        if fu_id is not None:
+            sql = "SELECT entry FROM assignments WHERE fu_id = ? AND start >= ?"
+            args = [fu_id, after]
+            if satellite is not None:
+                sql += " AND satellite = ?"
+                args.append(satellite)
+        elif satellite is not None:
+            sql = "SELECT entry FROM passes WHERE satellite = ? AND start >= ?"
+            args = [satellite, after]
+        else:
+            sql = "SELECT entry FROM passes WHERE start >= ?"
+            args = [after]
+        rows = self._read(sql + " ORDER BY start LIMIT 1", args)
+        return json.loads(rows[0][0]) if rows else None
+
+    def fu_passes(self, fu_id, since=None, until=None, limit=None):
+        """Return (entries, etag) for the passes assigned to fu_id starting in [since, until]."""
+        rows = self._read("SELECT entry FROM assignments WHERE fu_id = ? "
+                          "AND start BETWEEN ? AND ? ORDER BY start LIMIT ?",
+                          (fu_id, _bound(since, -math.inf), _bound(until, math.inf),
+                           -1 if limit is None else max(limit, 0)))
+        digest = hashlib.sha1()
+        for (entry,) in rows:
+            digest.update(entry.encode())
+        return [json.loads(r[0]) for r in rows], f'"{digest.hexdigest()[:16]}-{len(rows)}"'
+
+    def assignments(self):
+        """All assignments as {fu_id: [entries]}."""
+        out = {}
+        for fu_id, entry in self._read("SELECT fu_id, entry FROM assignments "
+                                       "ORDER BY fu_id, start"):
+            out.setdefault(fu_id, []).append(json.loads(entry))
+        return out
+
+    def busy_fus(self, t):
+        """FU ids with an assigned pass in progress at t."""
+        lo = t - self._meta("assignment_max_duration")
+        return {r[0] for r in self._read(
+            "SELECT DISTINCT fu_id FROM assignments WHERE start BETWEEN ? AND ? AND end > ?",
+            (lo, t, t))}
+
+    def free_fus(self, t, active_since=None):
+        """Registered FUs (seen since active_since) with no pass in progress at t."""
+        busy = self.busy_fus(t)
+        return [fu_id for fu_id in self.fus(active_since) if fu_id not in busy]
+
+    def fus(self, active_since=None):
+        """Registry entries as {fu_id: info}, optionally only those seen since a time."""
+        rows = self._read("SELECT fu_id, info FROM fus WHERE last_seen >= ? ORDER BY fu_id",
+                          (_bound(active_since, -math.inf),))
+        return {fu_id: json.loads(info) for fu_id, info in rows}
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def open_store(path=None):
+    """The shared ScheduleStore for `path` (default: STORE_FILE)."""
+    path = path or STORE_FILE
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = ScheduleStore(path)
+        return store
+
+
+def import_json(store, files=LEGACY_FILES):
+    """Load the JSON files written by older versions into the store."""
+    def load(name):
+        try:
+            with open(files[name]) as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            log.warning("Skipping %s: %s", files[name], e)
+            return None
+
+    schedule = load("schedule")
+    if isinstance(schedule, list):
+        store.replace_schedule(schedule)
+    assignments = load("assignments")
+    if isinstance(assignments, list):   # oldest format: flat list with assigned_fu
+        grouped = {}
+        for entry in assignments:
+            grouped.setdefault(entry.get("assigned_fu"), []).append(entry)
+        assignments = grouped
+    if isinstance(assignments, dict):
+        store.replace_assignments(assignments)
+    registry = load("registry")
+    if isinstance(registry, dict):
+        for fu_id, info in registry.items():
+            store.upsert_fu(fu_id, info)
+
+
+if __name__ == "__main__":
+    setup_logging()
+    import_json(open_store())
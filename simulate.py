@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""Accelerated simulation and telemetry replay for end-to-end throughput tests.
+
+Both modes run on a SimClock (see clock.py), so a day of traffic takes
+minutes instead of a day.
+
+run
+    The central-unit stages (scheduler, schedule ticker, assigner and
+    registry expiry) run unchanged. Simulated field units send registry
+    heartbeats and sensor readings, fetch their assignments and track them
+    with the real PassExecutor. Some units drop out for a while to exercise
+    expiry and reassignment. The schedule, assignments and registry are
+    written to a schedule store under --out, so data/ is left alone. The satellite catalogue is
+    frozen and Doppler profiles are not generated.
+
+replay
+    Recorded telemetry from a TelemetryStore directory is merged into one
+    time-ordered stream. It is re-sent at --speed as the Socket.IO events a
+    live FU emits (`field_unit_data`, `az_el_result`).
+
+Both modes deliver FU traffic the same way. With --url it goes to a running
+Server/Server.py over Socket.IO. Start that server with the same SIM_SPEED /
+SIM_START / SIM_ANCHOR environment so it stamps samples on the simulated
+timeline. Without --url the traffic is applied to a local TelemetryStore
+under --out, as the server's handlers would apply it.
+
+    python simulate.py run --hours 24 --speed 1440 --fus 8
+    python simulate.py replay --source Server/telemetry --speed 600 --url http://localhost:5000
+"""
+import argparse
+import asyncio
+import heapq
+import json
+import logging
+import math
+import os
+import sys
+import threading
+from collections import Counter
+
+from skyfield.api import EarthSatellite, load, wgs84
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# Client and server modules are plain scripts in their own directories
+sys.path.append(os.path.join(ROOT, "Client"))
+sys.path.append(os.path.join(ROOT, "Server"))
+
+import Assigner
+import clock
+import Fu_Registry
+import Scheduler
+import schedule_store
+from central_unit import CentralUnit
+from ingest import IngestStage, REJECTED
+from log_utils import setup_logging
+from pass_executor import PassExecutor, pointing_profile
+from telemetry_store import TelemetryStore, FIELDS as TELEMETRY_FIELDS, track_points
+
+SIM_DIR = "data/sim"
+HEARTBEAT_S = 30
+SENSOR_PERIOD_S = 60
+OFFLINE_S = 1800
+
+log = logging.getLogger("simulate")
+
+
+# --- Where FU traffic goes ---
+
+
+class StoreSink:
+    """Applies FU events to a local TelemetryStore like Server/Server.py does."""
+
+    def __init__(self, root):
+        self.telemetry = TelemetryStore(root)
+        self.ingest = IngestStage(rate=1.0, burst=3, flush_interval=1.0)
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def emit(self, event, data):
+        fu_id = data.get("fu_id")
+        with self._lock:
+            self.counts[event] += 1
+            if event == "field_unit_data":
+                sensor_data = data.get("sensor_data", {})
+                if self.ingest.submit(fu_id, sensor_data, clock.monotonic()) != REJECTED:
+                    self.telemetry.append(fu_id, clock.time(),
+                                          temperature=sensor_data.get("temperature"),
+                                          humidity=sensor_data.get("humidity"))
+            elif event == "az_el_result":
+                self.telemetry.append(fu_id, clock.time(), az=data.get("az"), el=data.get("el"))
+            elif event == "pass_result":
+                self.telemetry.extend(fu_id, track_points(data.get("track") or [])[0])
+        return True
+
+    def close(self):
+        self.telemetry.flush()
+
+    def stats(self):
+        return {"events": dict(self.counts), "ingest": dict(self.ingest.metrics)}
+
+
+class SocketSink:
+    """Sends FU events to a running server, exactly as a field unit would."""
+
+    def __init__(self, url):
+        import socketio
+        self.sio = socketio.Client(reconnection=True)
+        self.sio.connect(url)
+        self.counts = Counter()
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def emit(self, event, data):
+        with self._lock:
+            self.counts[event] += 1
+        try:
+            if event == "pass_result":
+                return self.sio.call(event, data, timeout=10) is True
+            self.sio.emit(event, data)
+            return True
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            log.warning("Failed to send %s: %s", event, e)
+            return False
+
+    def close(self):
+        self.sio.disconnect()
+
+    def stats(self):
+        return {"events": dict(self.counts), "failed": self.failed}
+
+
+# --- Simulated pipeline ---
+
+
+class SimFieldUnit(PassExecutor):
+    """A field unit without hardware, tracking its assigned passes on the sim clock."""
+
+    def __init__(self, fu_id, unit, sink, state_dir, step, offline=None):
+        os.makedirs(state_dir, exist_ok=True)
+        super().__init__(fu_id, None, self.compute_profile, self.point, self.upload,
+                         step=step, state_dir=state_dir,
+                         enabled=lambda: self.online(clock.time()))
+        self.unit = unit
+        self.sink = sink
+        self.offline = offline        # (start, end) of a simulated outage
+        self.observer = wgs84.latlon(Scheduler.LAT, Scheduler.LON, Scheduler.ALT * 1000)
+        self.satellites = {}
+        self.points = 0
+        self.results = []
+
+    def online(self, now):
+        return self.offline is None or not self.offline[0] <= now < self.offline[1]
+
+    def fetch_schedule(self):
+        # What GET /api/fu_schedule/{fu_id} returns for this unit; prepare()
+        # drops passes this unit already ran, so a reassignment cannot repeat one
+        entries, _ = self.unit.store.fu_passes(self.fu_id, clock.time())
+        self.prepare(entries)
+
+    def compute_profile(self, sat_name, start, duration, step):
+        sat = self.satellites.get(sat_name)
+        if sat is None:
+            tle = self.unit.catalogue.tles.get(sat_name)
+            if not tle:
+                return []
+            sat = self.satellites[sat_name] = EarthSatellite(
+                tle["line1"], tle["line2"], sat_name, self.unit.ts)
+        return pointing_profile(self.unit.ts, sat, self.observer, start, duration, step)
+
+    def point(self, az, el):
+        self.points += 1
+
+    def upload(self, result):
+        # Failed uploads are retried; count each pass once, when it is delivered
+        sent = self.sink.emit("pass_result", result)
+        if sent:
+            self.results.append({k: v for k, v in result.items() if k != "track"})
+        return sent
+
+    def heartbeat(self):
+        return json.dumps({"fu_id": self.fu_id, "occupied_slots": []}).encode()
+
+    def sensor_data(self, now):
+        # Daily temperature swing so consecutive readings are not duplicates
+        day = 2 * math.pi * (now % 86400) / 86400
+        offset = int(self.fu_id.rsplit("-", 1)[-1])
+        return {"temperature": round(25 + 6 * math.sin(day) + offset * 0.1, 2),
+                "humidity": round(55 - 15 * math.sin(day), 2)}
+
+
+class SimCentralUnit(CentralUnit):
+    """The central-unit stages plus a simulated fleet, with state kept under out_dir."""
+
+    def __init__(self, out_dir, n_fus, sink, duration, step=1.0, churn=1,
+                 satellites=None, sensor_period=SENSOR_PERIOD_S):
+        super().__init__()
+        self.sink = sink
+        self.duration = duration
+        self.sensor_period = sensor_period
+        self.satellites = satellites
+        self.store = schedule_store.open_store()
+        start = clock.time()
+        outage = (start + duration / 2, start + duration / 2 + OFFLINE_S)
+        self.fleet = [
+            SimFieldUnit(f"sim-fu-{i}", self, sink, os.path.join(out_dir, f"sim-fu-{i}"),
+                         step, outage if i < churn else None)
+            for i in range(n_fus)]
+
+    def selected_satellites(self):
+        return list(self.satellites) if self.satellites else super().selected_satellites()
+
+    async def fleet_stage(self):
+        for fu in self.fleet:
+            fu.start()
+        while True:
+            now = clock.time()
+            for fu in self.fleet:
+                if fu.online(now):
+                    self.registry_datagram(fu.heartbeat(), ("127.0.0.1", 0))
+            await clock.asleep(HEARTBEAT_S)
+
+    async def sensor_stage(self):
+        while True:
+            now = clock.time()
+            for fu in self.fleet:
+                if fu.online(now):
+                    await asyncio.to_thread(self.sink.emit, "field_unit_data",
+                                            {"fu_id": fu.fu_id, "sensor_data": fu.sensor_data(now)})
+            await clock.asleep(self.sensor_period)
+
+    def stages(self):
+        return {
+            "fleet": self.fleet_stage,
+            "sensors": self.sensor_stage,
+            "registry": self.registry_expiry,
+            "registry_writer": self.registry_writer,
+            "scheduler": self.scheduler_stage,
+            "schedule_ticker": self.schedule_ticker,
+            "assigner": self.assigner_stage,
+        }
+
+    async def run(self):
+        self.catalogue.load()
+        self.ts = await asyncio.to_thread(load.timescale)
+        Fu_Registry.fus = {}
+        tasks = [asyncio.create_task(self.supervise(n, s)) for n, s in self.stages().items()]
+        try:
+            await clock.asleep(self.duration)
+        finally:
+            for fu in self.fleet:
+                fu.close()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def report(self):
+        results = [r for fu in self.fleet for r in fu.results]
+        return {
+            "schedule_entries": len(self.schedule),
+            "active_fus": len(Fu_Registry.fus),
+            "passes": len(results),
+            "points": sum(fu.points for fu in self.fleet),
+            "skipped": sum(r["skipped"] for r in results),
+            "max_late_ms": max((r["max_late_ms"] for r in results), default=0.0),
+            "sink": self.sink.stats(),
+        }
+
+
+def redirect_state(out_dir):
+    """Point the pipeline's store and JSON files at out_dir so data/ is untouched."""
+    os.makedirs(out_dir, exist_ok=True)
+    schedule_store.STORE_FILE = os.path.join(out_dir, "orbitalink.db")
+    Scheduler.SCHEDULE_FILE = os.path.join(out_dir, "schedule.json")
+    Assigner.ASSIGN_FILE = os.path.join(out_dir, "assignments.json")
+    Fu_Registry.REGISTRY_FILE = os.path.join(out_dir, "active_fus.json")
+
+
+def make_sink(args):
+    if args.url:
+        return SocketSink(args.url)
+    return StoreSink(os.path.join(args.out, "telemetry"))
+
+
+def run_simulation(args):
+    sim = clock.from_env() or clock.SimClock(args.start, args.speed)
+    clock.set_clock(sim)
+    redirect_state(args.out)
+    sink = make_sink(args)
+    unit = SimCentralUnit(args.out, args.fus, sink, args.hours * 3600, args.step, args.churn,
+                          args.satellites.split(",") if args.satellites else None,
+                          args.sensor_period)
+    log.info("Simulating %s h with %s FUs on %r", args.hours, args.fus, sim)
+    real_start = clock.WallClock().monotonic()
+    try:
+        asyncio.run(unit.run())
+    finally:
+        sink.close()
+    return unit.report(), clock.WallClock().monotonic() - real_start
+
+
+# --- Replay ---
+
+
+def recorded_events(source, start=None, end=None):
+    """Time-ordered (t, event, payload) tuples for every FU under source.
+
+    FU ids are the series directory names, i.e. MAC addresses with ':' as '_'.
+    """
+    store = TelemetryStore(source)
+    start = -math.inf if start is None else start
+    end = math.inf if end is None else end
+    streams = []
+    for fu_id in sorted(os.listdir(source)):
+        if not os.path.isdir(os.path.join(source, fu_id)):
+            continue
+        rows = store.query(fu_id, start, end)
+        streams.append(_fu_events(fu_id, rows))
+    return heapq.merge(*streams, key=lambda ev: ev[0])
+
+
+def _fu_events(fu_id, rows):
+    columns = [rows[f] for f in TELEMETRY_FIELDS]
+    for t, (temperature, humidity, az, el) in zip(rows["t"], zip(*columns)):
+        if temperature is not None or humidity is not None:
+            yield t, "field_unit_data", {"fu_id": fu_id, "sensor_data": {
+                "temperature": temperature, "humidity": humidity}}
+        if az is not None and el is not None:
+            yield t, "az_el_result", {"fu_id": fu_id, "az": az, "el": el}
+
+
+def replay(args):
+    events = recorded_events(args.source, args.start, args.end)
+    first = next(events, None)
+    if first is None:
+        log.warning("No recorded telemetry in %s", args.source)
+        return {"events": 0}, 0.0
+    sim = clock.from_env() or clock.SimClock(first[0], args.speed)
+    clock.set_clock(sim)
+    sink = make_sink(args)
+    real = clock.WallClock()
+    real_start = real.monotonic()
+    sent, max_lag = 0, 0.0
+    try:
+        for t, event, payload in heapq.merge([first], events, key=lambda ev: ev[0]):
+            lag = sim.time() - t
+            if lag < 0:
+                sim.sleep(-lag)
+            else:
+                max_lag = max(max_lag, lag)
+            sink.emit(event, payload)
+            sent += 1
+    finally:
+        sink.close()
+    report = {"events": sent, "max_lag_s": round(max_lag, 3), "sink": sink.stats()}
+    return report, real.monotonic() - real_start
+
+
+def main():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--speed", type=float, default=600.0,
+                        help="simulated seconds per real second")
+    common.add_argument("--url", help="send FU traffic to this server instead of a local store")
+    common.add_argument("--out", default=SIM_DIR, help="directory for simulated state")
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    run = sub.add_parser("run", parents=[common],
+                         help="simulate scheduling, assignment and tracking")
+    run.add_argument("--hours", type=float, default=24.0)
+    run.add_argument("--start", type=clock.parse_time, help="simulated start (ISO or UNIX)")
+    run.add_argument("--fus", type=int, default=4)
+    run.add_argument("--churn", type=int, default=1,
+                     help=f"FUs that go silent for {OFFLINE_S // 60} min mid-run")
+    run.add_argument("--step", type=float, default=1.0, help="pointing step in seconds")
+    run.add_argument("--sensor-period", type=float, default=SENSOR_PERIOD_S)
+    run.add_argument("--satellites", help="comma-separated names (default: scheduler selection)")
+
+    rep = sub.add_parser("replay", parents=[common], help="re-send recorded telemetry")
+    rep.add_argument("--source", default="Server/telemetry")
+    rep.add_argument("--start", type=clock.parse_time)
+    rep.add_argument("--end", type=clock.parse_time)
+
+    args = parser.parse_args()
+    setup_logging(os.path.join(args.out, "simulate.log"))
+    report, elapsed = (run_simulation if args.mode == "run" else replay)(args)
+    report["real_s"] = round(elapsed, 2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
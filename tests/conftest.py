@@ -0,0 +1,12 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The central-unit modules live in the repo root and the server modules are
+# imported by their bare names, as Server/Server.py does. The root comes first
+# so `import Server` is the central unit's API, as in central_unit.py.
+for path in (os.path.join(ROOT, "Client"), os.path.join(ROOT, "Server"), ROOT):
+    if path in sys.path:
+        sys.path.remove(path)
+    sys.path.insert(0, path)
@@ -0,0 +1,169 @@
+import threading
+
+import pytest
+
+import clock
+from antenna_control import Axis, TwoAxisController, shortest_error
+
+MOTOR_SPEED = 100.0   # motor deg/s at full duty, what kv=1.0 is calibrated for
+
+
+class FakeMotor:
+    """DC motor and single-turn encoder on one shaft.
+
+    The shaft turns at `drive` percent of MOTOR_SPEED; `blocked` holds it still.
+    """
+
+    def __init__(self, angle=0.0):
+        self.angle = angle
+        self.duty = 0.0
+        self.blocked = False
+        self.drives = []
+        self.lock = threading.Lock()
+        self.stamp = None
+
+    def read(self):
+        return self.angle % 360.0
+
+    def drive(self, u):
+        self.duty = u
+        self.drives.append(u)
+
+    def step(self, dt):
+        if not self.blocked:
+            self.angle += self.duty / 100.0 * MOTOR_SPEED * dt
+
+    # On a SimClock the shaft moves by the simulated time since the last read
+    def read_now(self):
+        with self.lock:
+            now = clock.monotonic()
+            if self.stamp is not None:
+                self.step(now - self.stamp)
+            self.stamp = now
+            return self.read()
+
+
+def make_axis(motor, **kwargs):
+    kwargs.setdefault("gear_ratio", 2.5)
+    return Axis("az", motor.read, motor.drive, **kwargs)
+
+
+def run(axis, motor, seconds, t=0.0, dt=0.01):
+    for _ in range(int(round(seconds / dt))):
+        t += dt
+        axis.update(t, dt)
+        motor.step(dt)
+    return t
+
+
+@pytest.fixture
+def sim_clock():
+    previous = clock.set_clock(clock.SimClock(start=0.0, speed=10.0))
+    yield clock.get_clock()
+    clock.set_clock(previous)
+
+
+def test_tracks_a_moving_setpoint_across_north():
+    motor = FakeMotor()
+    axis = make_axis(motor)
+    axis.set_target(355.0, rate=2.0, t0=0.0)
+    t = run(axis, motor, 5.0)
+    # Feed-forward carries the rate; P only has to remove the initial offset
+    sp, _ = axis.setpoint(t)
+    assert sp == pytest.approx(5.0)
+    assert abs(shortest_error(sp, axis.position % 360.0)) < 0.1
+    assert axis.fault is None
+
+
+def test_bounded_axis_clamps_its_target():
+    motor = FakeMotor()
+    axis = Axis("el", motor.read, motor.drive, gear_ratio=2.5, continuous=False,
+                limits=(0.0, 90.0))
+    axis.set_target(120.0, t0=0.0)
+    run(axis, motor, 10.0)
+    assert axis.position == pytest.approx(90.0, abs=axis.deadband)
+
+
+def test_output_is_clamped_to_max_output():
+    motor = FakeMotor()
+    axis = make_axis(motor, kp=5.0, max_output=60.0)
+    axis.set_target(170.0, t0=0.0)
+    run(axis, motor, 0.5)
+    assert max(abs(u) for u in motor.drives) == 60.0
+    assert motor.drives[0] == 60.0
+
+
+def test_integral_does_not_wind_up_while_saturated():
+    motor = FakeMotor()
+    motor.blocked = True
+    axis = make_axis(motor, kp=2.0, ki=1.0, stall_timeout=60.0)
+    axis.set_target(90.0, t0=0.0)
+    t = run(axis, motor, 3.0)
+    assert set(motor.drives) == {100.0}
+    assert axis._integral == pytest.approx(0.0, abs=1e-9)
+
+    motor.blocked = False
+    peak = 0.0
+    for _ in range(1000):
+        t = run(axis, motor, 0.01, t)
+        peak = max(peak, axis.position)
+    # A wound-up integral would carry the antenna well past the target
+    assert peak < 91.0
+    assert axis.position == pytest.approx(90.0, abs=axis.deadband)
+
+
+def test_stalled_axis_faults_and_stops_driving():
+    motor = FakeMotor()
+    motor.blocked = True
+    axis = make_axis(motor, stall_timeout=2.0)
+    axis.set_target(45.0, t0=0.0)
+    run(axis, motor, 1.5)
+    assert axis.fault is None
+    run(axis, motor, 1.0, t=1.5)
+    assert axis.fault.startswith("stalled")
+    assert motor.drives[-1] == 0.0
+
+    drives = len(motor.drives)
+    run(axis, motor, 0.5, t=2.5)
+    assert len(motor.drives) == drives
+    # A new target clears the fault and the freed axis moves again
+    motor.blocked = False
+    axis.set_target(45.0, t0=3.0)
+    run(axis, motor, 6.0, t=3.0)
+    assert axis.fault is None
+    assert axis.position == pytest.approx(45.0, abs=axis.deadband)
+
+
+def test_missing_encoder_sample_stops_the_motor():
+    motor = FakeMotor()
+    readings = iter([0.0, None])
+    axis = Axis("az", lambda: next(readings), motor.drive)
+    axis.set_target(90.0, t0=0.0)
+    axis.update(0.01, 0.01)
+    assert motor.drives[-1] > 0
+    axis.update(0.02, 0.01)
+    assert motor.drives[-1] == 0.0
+    assert axis.missed_samples == 1
+
+
+def test_controller_tracks_on_a_sim_clock(sim_clock):
+    az, el = FakeMotor(), FakeMotor()
+    controller = TwoAxisController([
+        Axis("az", az.read_now, az.drive, gear_ratio=2.5),
+        Axis("el", el.read_now, el.drive, gear_ratio=2.5, continuous=False),
+    ], rate_hz=20.0)
+    controller.set_target(30.0, 20.0)
+    start = clock.monotonic()
+    controller.start()
+    try:
+        clock.sleep(10.0)   # one real second
+    finally:
+        controller.stop()
+
+    assert controller.position()["az"] == pytest.approx(30.0, abs=1.0)
+    assert controller.position()["el"] == pytest.approx(20.0, abs=1.0)
+    stats = controller.stats()
+    # ~20 iterations per simulated second, timed on the simulated clock
+    assert 100 <= stats["iterations"] <= (clock.monotonic() - start) * 20 + 2
+    assert stats["dt_ms"]["mean"] == pytest.approx(50.0, rel=0.2)
+    assert stats["faults"] == {}
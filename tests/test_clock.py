@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import clock
+
+START = 1735689600.0   # 2025-01-01T00:00:00Z
+
+
+@pytest.fixture
+def restore_clock():
+    previous = clock.get_clock()
+    yield
+    clock.set_clock(previous)
+
+
+def real_seconds(fn, *args):
+    t0 = time.monotonic()
+    result = fn(*args)
+    return time.monotonic() - t0, result
+
+
+def test_sim_time_runs_speed_times_faster_from_the_anchor():
+    sim = clock.SimClock(start=START, speed=60.0, anchor=time.time() - 10)
+    assert sim.time() == pytest.approx(START + 600, abs=1.0)
+    t0, m0 = sim.time(), sim.monotonic()
+    time.sleep(0.05)
+    assert sim.time() - t0 == pytest.approx(3.0, abs=1.5)
+    assert sim.monotonic() - m0 == pytest.approx(3.0, abs=1.5)
+
+
+def test_sim_clock_without_start_begins_at_the_real_time():
+    assert clock.SimClock(speed=10.0).time() == pytest.approx(time.time(), abs=1.0)
+
+
+@pytest.mark.parametrize("speed", [0, -1])
+def test_sim_clock_rejects_non_positive_speed(speed):
+    with pytest.raises(ValueError):
+        clock.SimClock(speed=speed)
+
+
+def test_sleep_and_wait_are_scaled():
+    sim = clock.SimClock(speed=100.0)
+    elapsed, _ = real_seconds(sim.sleep, 10.0)
+    assert 0.09 <= elapsed < 0.5
+    elapsed, _ = real_seconds(sim.sleep, -5.0)
+    assert elapsed < 0.05
+
+    event = threading.Event()
+    elapsed, fired = real_seconds(sim.wait, event, 10.0)
+    assert fired is False and 0.09 <= elapsed < 0.5
+    event.set()
+    elapsed, fired = real_seconds(sim.wait, event, 3600.0)
+    assert fired is True and elapsed < 0.05
+
+    elapsed, _ = real_seconds(asyncio.run, sim.asleep(10.0))
+    assert 0.09 <= elapsed < 0.5
+
+
+def test_module_functions_follow_the_installed_clock(restore_clock):
+    clock.set_clock(clock.SimClock(start=START, speed=1000.0))
+    assert clock.time() == pytest.approx(START, abs=5.0)
+    assert clock.now().year == 2025
+    elapsed, _ = real_seconds(clock.sleep, 50.0)
+    assert elapsed < 0.5
+
+
+def test_from_env_without_speed_is_none():
+    assert clock.from_env({}) is None
+    assert clock.from_env({"SIM_SPEED": "", "SIM_START": "2025-01-01T00:00:00Z"}) is None
+
+
+def test_from_env_shares_one_timeline():
+    anchor = time.time() - 2
+    env = {"SIM_SPEED": "600", "SIM_START": "2025-01-01T00:00:00Z", "SIM_ANCHOR": str(anchor)}
+    a, b = clock.from_env(env), clock.from_env(env)
+    assert a.speed == 600.0 and a.start == START and a.anchor == anchor
+    assert a.time() == pytest.approx(START + 1200, abs=60.0)
+    assert abs(a.time() - b.time()) < 60.0
+
+
+def test_from_env_anchors_at_start_up_without_sim_anchor():
+    sim = clock.from_env({"SIM_SPEED": "60", "SIM_START": "1735689600"})
+    assert sim.start == START
+    assert sim.time() == pytest.approx(START, abs=5.0)
+
+
+@pytest.mark.parametrize("env", [{"SIM_SPEED": "fast"}, {"SIM_SPEED": "0"},
+                                 {"SIM_SPEED": "60", "SIM_START": "soon"}])
+def test_from_env_rejects_bad_values(env):
+    with pytest.raises(ValueError):
+        clock.from_env(env)
+
+
+def test_install_from_env(restore_clock):
+    wall = clock.get_clock()
+    assert clock.install_from_env({}) is wall
+    sim = clock.install_from_env({"SIM_SPEED": "60", "SIM_START": "2025-01-01T00:00:00Z"})
+    assert isinstance(sim, clock.SimClock) and clock.get_clock() is sim
@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+import doppler
+
+NOAA = {"line1": "1 33591U 09005A   25209.50000000  .00000100  00000+0  70000-4 0  9990",
+        "line2": "2 33591  99.0000 200.0000 0014000 100.0000 260.0000 14.12000000800000"}
+START = "2025-07-28T12:00:00+00:00"
+START_UNIX = 1753704000.0
+
+
+def save(path, entries, mtime, frequencies=None):
+    profiles = doppler.compute_profiles(entries, {"NOAA 19": NOAA}, frequencies=frequencies)
+    doppler.save_profiles(profiles, str(path))
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_profiles_are_found_by_unix_or_iso_start(tmp_path):
+    path = tmp_path / "doppler.json"
+    save(path, [{"satellite": "NOAA 19", "start_time": START, "duration": 60}],
+         1_000_000_000_000_000_000)
+    index = doppler.DopplerIndex(str(path))
+
+    profile = index.get("NOAA 19", START_UNIX)
+    assert profile["start_time"] == START
+    assert profile["n"] == 61
+    assert index.get("NOAA 19", START_UNIX + 0.2) is profile
+    assert index.get("NOAA 19", START_UNIX + 1) is None
+
+    range_km, range_rate, doppler_hz = index.at("NOAA 19", START_UNIX, START_UNIX + 30)
+    assert 0 < range_km < 20000
+    assert doppler_hz == pytest.approx(-profile["frequency_hz"] * range_rate / doppler.C_KM_S,
+                                      rel=1e-5)
+    assert index.at("NOAA 19", START_UNIX, START_UNIX + 61) is None
+
+
+def test_decoded_curves_follow_a_rewritten_file(tmp_path):
+    path = tmp_path / "doppler.json"
+    entries = [{"satellite": "NOAA 19", "start_time": START, "duration": 60}]
+    save(path, entries, 1_000_000_000_000_000_000)
+    index = doppler.DopplerIndex(str(path))
+    before = index.at("NOAA 19", START_UNIX, START_UNIX + 30)
+
+    save(path, entries, 1_000_000_001_000_000_000, frequencies={"NOAA 19": 400e6})
+    after = index.at("NOAA 19", START_UNIX, START_UNIX + 30)
+    assert after[0] == before[0]
+    assert after[2] != before[2]
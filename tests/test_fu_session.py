@@ -0,0 +1,90 @@
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+import socketio
+import uvicorn
+
+from fu_session import FUSession
+
+
+@pytest.fixture
+def server():
+    """A real Socket.IO server on a free port, recording (event, data, arrival time)."""
+    sio = socketio.AsyncServer(async_mode="asgi", ping_interval=0.2, ping_timeout=1)
+    received = []
+
+    @sio.on("*")
+    async def record(event, sid, data):
+        received.append((event, data, time.monotonic()))
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    config = uvicorn.Config(socketio.ASGIApp(sio), host="127.0.0.1", port=port,
+                            log_level="error", timeout_graceful_shutdown=0)
+    srv = uvicorn.Server(config)
+    thread = threading.Thread(target=lambda: asyncio.run(srv.serve()), daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not srv.started and time.monotonic() < deadline:
+        time.sleep(0.01)
+    yield f"http://127.0.0.1:{port}", received
+    srv.should_exit = True
+    thread.join(5)
+
+
+def wait_for(received, event, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for name, data, at in received:
+            if name == event:
+                return data, at
+        time.sleep(0.01)
+    return None, None
+
+
+def connect_like_a_client(url, fu_id="fu1"):
+    """Wire a session the way the Raspberry Pi and Arduino clients do."""
+    sio = socketio.Client(reconnection=False)
+    session = FUSession(sio, fu_id)
+    sent = []
+
+    @sio.event
+    def connect():
+        sent.append(session.emit("field_unit_data", {"fu_id": fu_id, "sensor_data": {}}))
+        session.request_resume("NOAA 19")
+
+    started = time.monotonic()
+    sio.connect(url, transports=["polling"])
+    return sio, sent, started
+
+
+def test_resume_handshake_is_sent_from_the_connect_handler(server):
+    url, received = server
+    sio, sent, _ = connect_like_a_client(url)
+    try:
+        data, _ = wait_for(received, "resume_session")
+        assert data == {"fu_id": "fu1", "satellite_name": "NOAA 19"}
+        assert sent == [True]
+    finally:
+        sio.disconnect()
+
+
+def test_first_report_arrives_within_a_second_of_connect(server):
+    url, received = server
+    sio, _, started = connect_like_a_client(url)
+    try:
+        data, at = wait_for(received, "field_unit_data")
+        assert data["fu_id"] == "fu1"
+        assert at - started < 1.0
+    finally:
+        sio.disconnect()
+
+
+def test_emit_is_dropped_while_disconnected():
+    session = FUSession(socketio.Client(), "fu1")
+    assert session.emit("field_unit_data", {}) is False
+    assert session.call("pass_result", {}) is None
@@ -0,0 +1,71 @@
+from ingest import ACCEPTED, DUPLICATE, RATE_LIMITED, REJECTED, IngestStage
+
+
+def test_duplicates_are_not_broadcast_again():
+    stage = IngestStage(rate=1.0, burst=3)
+    assert stage.submit("fu", {"temperature": 21}, now=0.0) == ACCEPTED
+    assert stage.submit("fu", {"temperature": 21}, now=10.0) == DUPLICATE
+    assert stage.submit("fu", {}, now=20.0) == ACCEPTED
+    assert stage.submit("fu", {}, now=30.0) == DUPLICATE
+    assert stage.flush() == {"fu"}
+    assert stage.flush() == set()
+
+
+def test_rate_limited_payload_goes_out_with_the_next_flush():
+    stage = IngestStage(rate=1.0, burst=2)
+    verdicts = [stage.submit("fu", {"n": i}, now=0.0) for i in range(5)]
+    assert verdicts == [ACCEPTED, ACCEPTED, RATE_LIMITED, RATE_LIMITED, RATE_LIMITED]
+    assert stage.flush() == {"fu"}
+    assert stage.metrics["deferred"] == 1
+    # The burst is merged into its latest value, which is now the broadcast one
+    assert stage.submit("fu", {"n": 4}, now=5.0) == DUPLICATE
+    assert stage.flush() == set()
+
+
+def test_duplicate_of_the_broadcast_value_cancels_the_deferred_one():
+    stage = IngestStage(rate=1.0, burst=1)
+    assert stage.submit("fu", {"n": 1}, now=0.0) == ACCEPTED
+    assert stage.flush() == {"fu"}
+    assert stage.submit("fu", {"n": 2}, now=0.1) == RATE_LIMITED
+    assert stage.submit("fu", {"n": 1}, now=0.2) == DUPLICATE
+    assert stage.flush() == set()
+
+
+def test_tokens_refill_at_rate():
+    stage = IngestStage(rate=2.0, burst=1)
+    assert stage.submit("fu", {"n": 1}, now=0.0) == ACCEPTED
+    assert stage.submit("fu", {"n": 2}, now=0.25) == RATE_LIMITED
+    assert stage.submit("fu", {"n": 3}, now=0.5) == ACCEPTED
+    assert stage.snapshot()["units"]["fu"] == {ACCEPTED: 2, DUPLICATE: 0, RATE_LIMITED: 1,
+                                               REJECTED: 0}
+
+
+def test_forget_accepts_the_same_payload_after_reconnect():
+    stage = IngestStage()
+    stage.submit("fu", {"n": 1}, now=0.0)
+    stage.forget("fu")
+    assert stage.submit("fu", {"n": 1}, now=10.0) == ACCEPTED
+
+
+def test_payloads_over_the_write_limit_are_rejected():
+    stage = IngestStage(rate=1.0, burst=3, write_rate=1.0, write_burst=2)
+    verdicts = [stage.submit("fu", {"n": i}, now=0.0) for i in range(4)]
+    assert verdicts[:2] == [ACCEPTED, ACCEPTED]
+    assert verdicts[2:] == [REJECTED, REJECTED]
+    # A rejected payload is not held back for the next flush either
+    assert stage.flush() == {"fu"}
+    assert stage.metrics["deferred"] == 0
+    assert stage.submit("fu", {"n": 9}, now=1.0) == ACCEPTED
+
+
+def test_unit_table_is_bounded_and_idle_units_expire():
+    stage = IngestStage(max_units=2, idle_s=60.0)
+    assert stage.submit("a", {}, now=0.0) == ACCEPTED
+    assert stage.submit("b", {}, now=30.0) == ACCEPTED
+    assert stage.submit("c", {}, now=40.0) == REJECTED
+    assert "c" not in stage.units
+    # Once "a" has been idle for idle_s its slot is free again
+    assert stage.submit("c", {}, now=61.0) == ACCEPTED
+    assert sorted(stage.units) == ["b", "c"]
+    assert stage.expire(now=95.0) == ["b"]
+    assert stage.metrics["expired"] == 2
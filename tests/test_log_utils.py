@@ -0,0 +1,57 @@
+import json
+import logging
+import queue
+
+from log_utils import DashboardFeed, JsonFormatter, _QueueHandler
+
+
+def logged(q, *args, **kwargs):
+    logger = logging.getLogger("test_log_utils")
+    logger.propagate = False
+    handler = _QueueHandler(q)
+    logger.addHandler(handler)
+    try:
+        logger.warning(*args, **kwargs)
+    finally:
+        logger.removeHandler(handler)
+    return q.get_nowait()
+
+
+def test_message_is_rendered_in_the_calling_thread():
+    q = queue.SimpleQueue()
+    data = {"temperature": 21.5}
+    record = logged(q, "FU data: %s", data)
+    data["temperature"] = 99.0
+    assert record.getMessage() == "FU data: {'temperature': 21.5}"
+    assert record.args is None
+
+
+def test_exception_text_survives_the_queue():
+    q = queue.SimpleQueue()
+    try:
+        raise RuntimeError("boom")
+    except RuntimeError:
+        record = logged(q, "failed", exc_info=True)
+    assert record.exc_info is None
+    assert "RuntimeError: boom" in json.loads(JsonFormatter().format(record))["exc"]
+    assert "RuntimeError: boom" in logging.Formatter().format(record)
+
+
+def test_drain_reports_dropped_lines():
+    feed = DashboardFeed(rate=1.0, burst=2)
+    logger = logging.getLogger("test_dashboard_feed")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.addHandler(feed)
+    try:
+        for i in range(5):
+            logger.info("line %d", i)
+        out = feed.drain(now=feed.stamp)
+        assert len(out) == 3 and out[-1] == "... 3 lines dropped"
+        for i in range(2):
+            logger.info("more %d", i)
+        # No tokens left: nothing goes out, but the drop is still reported
+        assert feed.drain(now=feed.stamp) == ["... 2 lines dropped"]
+        assert feed.drain(now=feed.stamp) == []
+    finally:
+        logger.removeHandler(feed)
@@ -0,0 +1,79 @@
+import threading
+import time
+
+from overhead import OverheadService
+
+ISS = {"line1": "1 25544U 98067A   25209.13279725  .00012211  00000+0  22036-3 0  9996",
+       "line2": "2 25544  51.6347 104.1294 0001992 125.2997 234.8178 15.50161265521514"}
+NOW = 1753704000.0
+
+
+class CountingService(OverheadService):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = 0
+        self.calls_lock = threading.Lock()
+
+    def compute(self, lat, lon, alt_m, min_el, now):
+        with self.calls_lock:
+            self.calls += 1
+        time.sleep(0.2)   # long enough for every other caller to miss the cache
+        return [{"name": "ISS", "az": 0.0, "el": 45.0, "range_km": 500.0, "los_in_s": 60}]
+
+
+def query_concurrently(service, n, now):
+    results = [None] * n
+    barrier = threading.Barrier(n)
+
+    def worker(i):
+        barrier.wait()
+        results[i] = service.query(28.6, 77.2, now=now)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    return results
+
+
+def test_concurrent_queries_share_one_compute():
+    service = CountingService({"ISS": ISS}, ttl=5.0)
+    results = query_concurrently(service, 8, NOW)
+    assert service.calls == 1
+    assert all(r == results[0] for r in results)
+
+    # Within the TTL everyone hits the cache; after it, one caller recomputes
+    query_concurrently(service, 8, NOW + 4)
+    assert service.calls == 1
+    query_concurrently(service, 8, NOW + 6)
+    assert service.calls == 2
+
+
+def test_a_failed_compute_lets_a_waiter_retry():
+    service = CountingService({"ISS": ISS}, ttl=5.0)
+    compute = service.compute
+
+    def fail_once(*args):
+        if service.calls == 0:
+            service.calls += 1
+            time.sleep(0.2)
+            raise RuntimeError("boom")
+        return compute(*args)
+
+    service.compute = fail_once
+    results = []
+
+    def worker():
+        try:
+            results.append(service.query(28.6, 77.2, now=NOW)[1])
+        except RuntimeError:
+            results.append("failed")
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    assert results.count("failed") == 1
+    assert service.calls == 2
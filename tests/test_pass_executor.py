@@ -0,0 +1,88 @@
+from datetime import datetime, timezone
+
+import threading
+
+import pytest
+import requests
+
+import clock
+import pass_executor
+from pass_executor import PassExecutor
+
+
+def entry(satellite, start):
+    iso = datetime.fromtimestamp(start, tz=timezone.utc).isoformat()
+    return {"satellite": satellite, "start_time": iso, "duration": 300}
+
+
+def make_executor(tmp_path):
+    return PassExecutor("fu", "http://server.invalid",
+                        profile_fn=lambda sat, start, duration, step: [(0.0, 10.0)],
+                        point_fn=lambda az, el: None,
+                        upload_fn=lambda result: True,
+                        state_dir=str(tmp_path))
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    def fail(*args, **kwargs):
+        raise requests.ConnectionError("link down")
+    monkeypatch.setattr(pass_executor.requests, "get", fail)
+
+
+def test_failed_fetch_keeps_loaded_passes(tmp_path, offline):
+    executor = make_executor(tmp_path)
+    now = clock.time()
+    executor.prepare([entry("ISS", now + 600), entry("NOAA 19", now + 3600)])
+    (tmp_path / pass_executor.SCHEDULE_CACHE_FILE).write_text("[]")
+    executor.fetch_schedule()
+    assert [p["entry"]["satellite"] for p in executor.passes] == ["ISS", "NOAA 19"]
+
+
+def test_pushed_schedule_survives_a_reboot(tmp_path, offline):
+    now = clock.time()
+    make_executor(tmp_path).update_schedule([entry("ISS", now + 600), entry("OLD", now - 3600)])
+    rebooted = make_executor(tmp_path)
+    rebooted.fetch_schedule()
+    assert [p["entry"]["satellite"] for p in rebooted.passes] == ["ISS"]
+
+
+def test_pushed_schedule_is_prepared_on_the_executor_thread(tmp_path, offline):
+    release = threading.Event()
+    threads = []
+
+    def profile(sat, start, duration, step):
+        threads.append(threading.current_thread().name)
+        release.wait(5)
+        return [(0.0, 10.0)]
+
+    executor = make_executor(tmp_path)
+    executor.profile_fn = profile
+    executor.start()
+    try:
+        executor.update_schedule([entry("ISS", clock.time() + 600)])   # returns at once
+        assert executor.passes == []
+        release.set()
+        deadline = clock.monotonic() + 5
+        while not executor.passes and clock.monotonic() < deadline:
+            clock.sleep(0.01)
+        assert [p["entry"]["satellite"] for p in executor.passes] == ["ISS"]
+        assert threads == ["pass-executor"]
+    finally:
+        executor.close()
+
+
+def test_bad_entries_are_skipped(tmp_path):
+    def profile(sat, start, duration, step):
+        if sat == "BROKEN":
+            raise RuntimeError("no elements")
+        return [(0.0, 10.0)]
+
+    executor = make_executor(tmp_path)
+    executor.profile_fn = profile
+    now = clock.time()
+    executor.prepare([entry("BROKEN", now + 60), "not a pass",
+                      {"satellite": "ISS", "start_time": "soon"},
+                      dict(entry("NOAA 19", now + 600), duration="long"),
+                      entry("ISS", now + 1200)])
+    assert [p["entry"]["satellite"] for p in executor.passes] == ["ISS"]
@@ -0,0 +1,53 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+import Fu_Registry
+import schedule_store
+from central_unit import CentralUnit
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(schedule_store, "STORE_FILE", str(tmp_path / "store.db"))
+    monkeypatch.setattr(Fu_Registry, "REGISTRY_FILE", str(tmp_path / "active_fus.json"))
+    monkeypatch.setattr(Fu_Registry, "fus", {})
+    return tmp_path
+
+
+def heartbeat(fu_id):
+    return json.dumps({"fu_id": fu_id, "occupied_slots": []}).encode()
+
+
+def test_heartbeats_are_written_in_batches_off_the_event_loop(registry, monkeypatch):
+    writes = []
+    persist = Fu_Registry.persist
+
+    def recording_persist(entries, snapshot=False):
+        writes.append((sorted(entries), snapshot, threading.current_thread()))
+        persist(entries, snapshot)
+
+    monkeypatch.setattr(Fu_Registry, "persist", recording_persist)
+
+    async def scenario():
+        unit = CentralUnit()
+        for fu_id in ("fu1", "fu2", "fu1", "fu3"):
+            unit.registry_datagram(heartbeat(fu_id), ("10.0.0.1", 0))
+        unit.registry_datagram(b"not json", ("10.0.0.9", 0))
+        assert sorted(Fu_Registry.fus) == ["fu1", "fu2", "fu3"]
+        assert schedule_store.open_store().fus() == {}    # nothing written on the loop
+        writer = asyncio.create_task(unit.registry_writer())
+        while unit.registry_q.qsize() or not writes:
+            await asyncio.sleep(0.01)
+        writer.cancel()
+        return unit.assign_q.qsize()
+
+    assert asyncio.run(scenario()) == 3
+    assert len(writes) == 1
+    names, snapshot, thread = writes[0]
+    assert names == ["fu1", "fu2", "fu3"] and snapshot
+    assert thread is not threading.main_thread()
+    assert sorted(schedule_store.open_store().fus()) == ["fu1", "fu2", "fu3"]
+    assert (registry / "active_fus.json").exists()
@@ -0,0 +1,111 @@
+import importlib.util
+import os
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+import clock
+import schedule_store
+from conftest import ROOT
+from schedule_store import ScheduleStore, pass_start
+
+T0 = 1_750_000_000.0
+
+
+def entry(satellite, start, duration=600):
+    iso = datetime.fromtimestamp(start, tz=timezone.utc).isoformat()
+    return {"satellite": satellite, "start_time": iso, "duration": duration}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ScheduleStore(str(tmp_path / "store.db"))
+
+
+def test_parse_time_accepts_unix_and_iso():
+    assert clock.parse_time(None) is None
+    assert clock.parse_time("1750000000") == T0
+    assert clock.parse_time("2025-06-15T15:06:40Z") == T0
+    assert clock.parse_time("2025-06-15T15:06:40") == T0
+    assert clock.parse_time("2025-06-15T17:06:40+02:00") == T0
+
+
+@pytest.mark.parametrize("value", ["", "yesterday", "2025-13-01", "nan", "inf", [1]])
+def test_parse_time_rejects_garbage(value):
+    with pytest.raises(ValueError):
+        clock.parse_time(value)
+
+
+def test_pass_start_rejects_entries_without_a_start():
+    assert pass_start({"timestamp": T0}) == T0
+    with pytest.raises(ValueError):
+        pass_start({"satellite": "NOAA 19"})
+    with pytest.raises(ValueError):
+        pass_start({"start_time": "soon"})
+
+
+def test_passes_between_returns_overlapping_passes(store):
+    store.replace_schedule([entry("A", T0 - 900, 600),    # ends before t0
+                            entry("B", T0 - 300, 600),    # in progress at t0
+                            entry("C", T0 + 1000),
+                            entry("D", T0 + 2000),        # starts exactly at t1
+                            entry("E", T0 + 2001)])
+    names = [e["satellite"] for e in store.passes_between(T0, T0 + 2000)]
+    assert names == ["B", "C", "D"]
+    assert [e["satellite"] for e in store.passes_between(T0, T0 + 2000, "C")] == ["C"]
+    assert len(store.passes_between()) == 5
+
+
+def test_fu_passes_bounds_on_start_and_limit(store):
+    store.replace_assignments({"fu1": [entry("A", T0 - 300), entry("B", T0),
+                                       entry("C", T0 + 600), entry("D", T0 + 1200)],
+                               "fu2": [entry("E", T0)]})
+    entries, etag = store.fu_passes("fu1", T0, T0 + 600)
+    assert [e["satellite"] for e in entries] == ["B", "C"]
+    entries, _ = store.fu_passes("fu1", T0, None, 1)
+    assert [e["satellite"] for e in entries] == ["B"]
+    entries, _ = store.fu_passes("fu1")
+    assert len(entries) == 4
+    assert store.fu_passes("fu1", T0, T0 + 600)[1] == etag
+    assert store.fu_passes("fu3")[0] == []
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    monkeypatch.setattr(schedule_store, "STORE_FILE", str(tmp_path / "api.db"))
+    spec = importlib.util.spec_from_file_location("central_api", os.path.join(ROOT, "Server.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return TestClient(module.app)
+
+
+def test_api_answers_400_for_unparseable_times(api):
+    for url in ["/api/passes?start=yesterday", "/api/passes?end=nan",
+                "/api/passes/next?after=soon", "/api/fus/free?t=later",
+                "/api/fu_schedule/fu1?since=2025-13-01", "/api/fu_schedule/fu1?until=x"]:
+        assert api.get(url).status_code == 400, url
+    assert api.get("/api/passes?start=1750000000").status_code == 200
+    assert api.get("/api/fu_schedule/fu1?since=2025-06-15T15:06:40Z").status_code == 200
+
+
+def test_upsert_fu_without_last_seen_counts_as_seen_now(store, monkeypatch):
+    monkeypatch.setattr(clock, "time", lambda: T0)
+    store.upsert_fu("fu1", {"ip": "10.0.0.1"})
+    assert store.fus() == {"fu1": {"ip": "10.0.0.1"}}
+    assert store.fus(active_since=T0) == {"fu1": {"ip": "10.0.0.1"}}
+    assert store.fus(active_since=T0 + 1) == {}
+
+
+def test_assigning_with_no_fus_clears_stale_assignments(tmp_path, monkeypatch):
+    import Assigner
+
+    monkeypatch.setattr(schedule_store, "STORE_FILE", str(tmp_path / "assign.db"))
+    monkeypatch.setattr(Assigner, "ASSIGN_FILE", str(tmp_path / "assignments.json"))
+    passes = [entry("A", T0), entry("B", T0 + 600)]
+    assert Assigner.assign_passes(passes, {"fu1": {}}) == {"fu1": passes}
+    assert len(schedule_store.open_store().fu_passes("fu1")[0]) == 2
+
+    assert Assigner.assign_passes(passes, {}) == {}
+    assert schedule_store.open_store().fu_passes("fu1")[0] == []
+    assert (tmp_path / "assignments.json").read_text() == "{}"
@@ -0,0 +1,128 @@
+import threading
+
+import pytest
+
+import clock
+from sensor_sampler import AngleMedianFilter, MedianFilter, SensorSampler
+
+
+@pytest.fixture
+def sim_clock():
+    previous = clock.set_clock(clock.SimClock(start=0.0, speed=100.0))
+    yield clock.get_clock()
+    clock.set_clock(previous)
+
+
+class FakeSensor:
+    """Returns `values` in turn (cycling) and records when it was read.
+
+    A value that is an exception is raised; `read_s` makes each read take
+    that many clock seconds.
+    """
+
+    def __init__(self, values, read_s=0.0):
+        self.values = values
+        self.read_s = read_s
+        self.reads = []
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            self.reads.append(clock.monotonic())
+            value = self.values[(len(self.reads) - 1) % len(self.values)]
+        if self.read_s:
+            clock.sleep(self.read_s)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+
+def sample_for(sampler, seconds):
+    sampler.start()
+    try:
+        clock.sleep(seconds)
+    finally:
+        sampler.stop()
+
+
+def intervals(reads):
+    return [b - a for a, b in zip(reads, reads[1:])]
+
+
+def test_channels_sample_at_their_own_period(sim_clock):
+    fast, slow = FakeSensor([1.0]), FakeSensor([2.0])
+    sampler = SensorSampler()
+    sampler.add("fast", fast, 0.5)
+    sampler.add("slow", slow, 2.0)
+    sample_for(sampler, 20.0)
+
+    assert 36 <= len(fast.reads) <= 42
+    assert 9 <= len(slow.reads) <= 11
+    assert sum(intervals(fast.reads)) / (len(fast.reads) - 1) == pytest.approx(0.5, rel=0.1)
+    assert sum(intervals(slow.reads)) / (len(slow.reads) - 1) == pytest.approx(2.0, rel=0.1)
+    stats = sampler.stats()
+    assert stats["fast"]["samples"] == len(fast.reads)
+    assert stats["slow"]["failures"] == 0
+
+
+def test_slow_device_does_not_burst_to_catch_up(sim_clock):
+    sensor = FakeSensor([1.0], read_s=1.5)
+    sampler = SensorSampler()
+    sampler.add("dht", sensor, 1.0)
+    sample_for(sampler, 15.0)
+    # Each read overruns the period; the next one follows it, never a burst
+    assert min(intervals(sensor.reads)) >= 1.4
+    assert sampler.stats()["dht"]["read_ms"] > 500.0   # moving average towards 1500
+
+
+def test_readings_are_filtered_and_failures_counted(sim_clock):
+    values = [(20.0, 50.0), (21.0, 51.0), (80.0, 99.0), None, RuntimeError("checksum")]
+    sensor = FakeSensor(values)
+    sampler = SensorSampler()
+    channel = sampler.add("dht", sensor, 1.0, MedianFilter(3), max_age=5.0)
+    sampler.start()
+    try:
+        while channel.samples < 3:
+            clock.sleep(0.5)
+        # The spike is the newest sample but the median of three hides it
+        assert sampler.value("dht") == (21.0, 51.0)
+        while len(sensor.reads) < 5:
+            clock.sleep(0.5)
+    finally:
+        sampler.stop()
+    clock.sleep(1.0)
+    stats = sampler.stats()["dht"]
+    returned = [values[i % len(values)] for i in range(len(sensor.reads))]
+    assert stats["failures"] == sum(v is None or isinstance(v, Exception) for v in returned)
+    assert stats["last_error"] == "checksum"
+    assert stats["samples"] + stats["failures"] == len(sensor.reads)
+
+
+def test_stale_values_fall_back_to_the_default(sim_clock):
+    sampler = SensorSampler()
+    sampler.add("enc", FakeSensor([42.0]), 0.5, max_age=2.0)
+    sample_for(sampler, 3.0)
+    assert sampler.value("enc") == 42.0
+    clock.sleep(3.0)
+    assert sampler.value("enc") is None
+    assert sampler.value("enc", max_age=10.0) == 42.0
+    assert sampler.value("missing", default=-1) == -1
+
+
+def test_channel_added_while_running_starts_sampling(sim_clock):
+    sampler = SensorSampler()
+    sampler.start()
+    try:
+        sensor = FakeSensor([1.0])
+        sampler.add("late", sensor, 1.0)
+        clock.sleep(5.0)
+    finally:
+        sampler.stop()
+    assert len(sensor.reads) >= 4
+
+
+def test_median_filters():
+    f = MedianFilter(3)
+    assert [f(v) for v in (1, 9, 2, 3)] == [1, 5, 2, 3]
+    angles = AngleMedianFilter(3)
+    assert [round(angles(a), 6) for a in (358.0, 2.0, 1.0)] == [358.0, 0.0, 1.0]
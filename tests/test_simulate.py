@@ -0,0 +1,101 @@
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+import clock
+import simulate
+
+START = 1735689600.0   # 2025-01-01T00:00:00Z
+
+
+@pytest.fixture
+def sim_clock():
+    previous = clock.set_clock(clock.SimClock(start=START, speed=100.0))
+    yield clock.get_clock()
+    clock.set_clock(previous)
+
+
+def entry(satellite, start, duration):
+    iso = datetime.fromtimestamp(start, tz=timezone.utc).isoformat()
+    return {"satellite": satellite, "start_time": iso, "duration": duration}
+
+
+class RecordingSink:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.events = []
+        self.lock = threading.Lock()
+
+    def emit(self, event, data):
+        with self.lock:
+            self.events.append((event, data))
+            if self.failures:
+                self.failures -= 1
+                return False
+        return True
+
+
+def make_fu(tmp_path, sink, passes):
+    # `passes(now)` is what the schedule store has assigned to the FU at `now`
+    store = SimpleNamespace(fu_passes=lambda fu_id, now: (passes(now), None))
+    fu = simulate.SimFieldUnit("sim-fu-0", SimpleNamespace(store=store), sink,
+                               str(tmp_path / "sim-fu-0"), step=1.0)
+    fu.profile_fn = lambda sat, start, duration, step: [(0.0, 10.0)] * int(duration // step + 1)
+    fu.refresh_s = 2.0
+    return fu
+
+
+def run_for(fu, seconds):
+    fu.start()
+    try:
+        clock.sleep(seconds)
+    finally:
+        fu.close()
+
+
+def test_rescheduled_copy_of_a_finished_pass_is_not_run_again(tmp_path, sim_clock):
+    def passes(now):
+        if now < START + 9:
+            return [entry("NOAA 15", START + 3, 5)]
+        # A later schedule starts its samples elsewhere and lists the same
+        # pass again, now starting inside the one already tracked
+        return [entry("NOAA 15", START + 6, 5), entry("NOAA 15", START + 14, 3)]
+
+    sink = RecordingSink()
+    fu = make_fu(tmp_path, sink, passes)
+    run_for(fu, 25.0)
+    assert [r["start_time"] for r in fu.results] == [
+        entry("", START + 3, 0)["start_time"], entry("", START + 14, 0)["start_time"]]
+    assert Counter(e for e, _ in sink.events)["pass_result"] == 2
+
+
+def test_retried_upload_counts_the_pass_once(tmp_path, sim_clock):
+    sink = RecordingSink(failures=1)
+    fu = make_fu(tmp_path, sink, lambda now: [entry("NOAA 19", START + 3, 2)])
+    run_for(fu, 12.0)
+    assert len(sink.events) == 2     # the failed attempt and the retry
+    assert len(fu.results) == 1
+    assert fu.pending == []
+
+
+def test_store_sink_records_what_replay_sends(tmp_path, sim_clock):
+    root = str(tmp_path / "telemetry")
+    sink = simulate.StoreSink(root)
+    sink.emit("field_unit_data", {"fu_id": "a", "sensor_data": {"temperature": 20.5,
+                                                                 "humidity": 40}})
+    track = [[START + 600, 10.0, 5.0], [START + 601, "x", 1], [START + 602, 11.0, 6.0]]
+    sink.emit("pass_result", {"fu_id": "b", "track": track})
+    sink.emit("az_el_result", {"fu_id": "a", "az": 90.0, "el": 45.0})
+    sink.close()
+    assert sink.stats()["events"] == {"field_unit_data": 1, "pass_result": 1, "az_el_result": 1}
+
+    events = list(simulate.recorded_events(root))
+    assert [t for t, _, _ in events] == sorted(t for t, _, _ in events)
+    assert [(ev, p["fu_id"]) for _, ev, p in events] == [
+        ("field_unit_data", "a"), ("az_el_result", "a"), ("az_el_result", "b"),
+        ("az_el_result", "b")]
+    assert events[0][2]["sensor_data"] == {"temperature": 20.5, "humidity": 40.0}
+    assert [p["az"] for _, ev, p in events if p["fu_id"] == "b"] == [10.0, 11.0]
@@ -0,0 +1,104 @@
+import math
+import os
+
+import pytest
+
+from telemetry_store import INDEX_FILE, TelemetryStore, track_points
+
+
+def fill(store, fu_id="aa:bb", n=100, t0=1000.0):
+    for i in range(n):
+        store.append(fu_id, t0 + i, temperature=20 + i % 7, humidity=50, az=i)
+
+
+def brute_force(rows, start, end, buckets, field):
+    width = (end - start) / buckets
+    out = {}
+    for t, v in zip(rows["t"], rows[field]):
+        if v is None or not start <= t <= end:
+            continue
+        b = min(int((t - start) / width), buckets - 1)
+        out.setdefault(b, []).append(v)
+    return {b: (min(v), max(v), sum(v) / len(v)) for b, v in out.items()}
+
+
+@pytest.mark.parametrize("buckets", [1, 3, 7, 40])
+def test_buckets_match_raw_samples(tmp_path, buckets):
+    store = TelemetryStore(str(tmp_path), chunk_size=16)
+    fill(store)
+    start, end = 1003.5, 1090.0
+    raw = store.query("aa:bb", -math.inf, math.inf)
+    expected = brute_force(raw, start, end, buckets, "temperature")
+
+    result = store.query("aa:bb", start, end, buckets)
+    width = (end - start) / buckets
+    got = {round((e["t"] - start) / width): e["temperature"] for e in result}
+    assert got.keys() == expected.keys()
+    for b, (lo, hi, mean) in expected.items():
+        assert got[b]["min"] == lo
+        assert got[b]["max"] == hi
+        assert got[b]["mean"] == pytest.approx(mean)
+    assert sum(e["n"] for e in result) == sum(1 for t in raw["t"] if start <= t <= end)
+
+
+def test_whole_segments_come_from_the_index(tmp_path):
+    store = TelemetryStore(str(tmp_path), chunk_size=10)
+    fill(store, n=100)
+    store.flush()
+    reopened = TelemetryStore(str(tmp_path), chunk_size=10)
+    # Corrupt every segment: a single bucket over all of them must not read them
+    directory = tmp_path / "aa_bb"
+    for name in os.listdir(directory):
+        if name.endswith(".seg"):
+            (directory / name).write_bytes(b"not zlib")
+    [entry] = reopened.query("aa:bb", 0, 5000, buckets=1)
+    assert entry["n"] == 100
+    assert entry["az"] == {"min": 0.0, "max": 99.0, "mean": 49.5}
+    assert entry["humidity"]["mean"] == 50.0
+
+
+def test_missing_fields_are_none(tmp_path):
+    store = TelemetryStore(str(tmp_path))
+    store.append("fu", 10.0, az=1.0, el=2.0)
+    store.append("fu", 11.0, temperature="n/a")
+    raw = store.query("fu", 0, 100)
+    assert raw["t"] == [10.0, 11.0]
+    assert raw["temperature"] == [None, None]
+    assert raw["el"] == [2.0, None]
+    [entry] = store.query("fu", 0, 100, buckets=1)
+    assert entry["temperature"] is None and entry["n"] == 2
+
+
+def test_flush_persists_open_chunks(tmp_path):
+    store = TelemetryStore(str(tmp_path), chunk_size=720)
+    fill(store, n=5)
+    store.flush()
+    assert (tmp_path / "aa_bb" / INDEX_FILE).exists()
+    assert TelemetryStore(str(tmp_path)).query("aa:bb", 0, 5000)["t"] == [
+        1000.0, 1001.0, 1002.0, 1003.0, 1004.0]
+
+
+@pytest.mark.parametrize("fu_id", ["..", ".", "", "../x"])
+def test_fu_ids_stay_inside_the_root(tmp_path, fu_id):
+    root = tmp_path / "telemetry"
+    store = TelemetryStore(str(root))
+    store.append(fu_id, 1.0, temperature=1)
+    store.flush()
+    assert os.listdir(tmp_path) == ["telemetry"]
+    assert store.query(fu_id, 0, 2)["temperature"] == [1.0]
+
+
+def test_malformed_track_points_are_skipped(tmp_path):
+    track = [[10, 1.5, 2.5], [11, 1], "junk", [12, "az", 3], [13, math.nan, 1],
+             [14, True, 1], (15, 3.0, 4.0), [16, 1, 2, 3]]
+    points, bad = track_points(track)
+    assert points == [(10.0, 1.5, 2.5), (15.0, 3.0, 4.0)]
+    assert len(bad) == 6
+    assert track_points({"t": 1}) == ([], [{"t": 1}])
+
+    store = TelemetryStore(str(tmp_path), chunk_size=1)
+    store.extend("fu", points)
+    assert len(os.listdir(tmp_path / "fu")) == 3   # two sealed segments and the index
+    raw = store.query("fu", 0, 100)
+    assert raw["t"] == [10.0, 15.0]
+    assert raw["az"] == [1.5, 3.0] and raw["temperature"] == [None, None]
@@ -0,0 +1,36 @@
+import json
+import os
+
+from tle_catalogue import TleCatalogue
+
+ISS = {"line1": "1 25544U 98067A   25209.13279725  .00012211  00000+0  22036-3 0  9996",
+       "line2": "2 25544  51.6347 104.1294 0001992 125.2997 234.8178 15.50161265521514"}
+ISS_NEW = {"line1": "1 25544U 98067A   25210.13279725  .00012211  00000+0  22036-3 0  9991",
+           "line2": ISS["line2"]}
+NOAA = {"line1": "1 33591U 09005A   25209.50000000  .00000100  00000+0  70000-4 0  9990",
+        "line2": "2 33591  99.0000 200.0000 0014000 100.0000 260.0000 14.12000000800000"}
+
+
+def write(path, tles, mtime):
+    tmp = str(path) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(tles, f)
+    os.replace(tmp, path)
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_sync_returns_only_entries_changed_by_a_rewrite(tmp_path):
+    path = tmp_path / "satellites.json"
+    write(path, {"ISS": ISS, "NOAA 19": NOAA}, 1_000_000_000_000_000)
+    catalogue = TleCatalogue(str(path))
+    first = catalogue.sync(["ISS", "NOAA 19", "GONE"])
+    assert set(first["tles"]) == {"ISS", "NOAA 19"}
+    assert first["missing"] == ["GONE"]
+
+    assert catalogue.sync(["ISS", "NOAA 19"], first["revision"])["tles"] == {}
+
+    write(path, {"ISS": ISS_NEW}, 1_000_000_060_000_000)
+    delta = catalogue.sync(["ISS", "NOAA 19"], first["revision"])
+    assert delta["revision"] > first["revision"]
+    assert delta["tles"]["ISS"]["line1"] == ISS_NEW["line1"]
+    assert delta["missing"] == ["NOAA 19"]
@@ -0,0 +1,56 @@
+from tle_sync import TleSubset
+
+ISS = {"line1": "1 25544U 98067A   25209.13279725  .00012211  00000+0  22036-3 0  9996",
+       "line2": "2 25544  51.6347 104.1294 0001992 125.2997 234.8178 15.50161265521514"}
+
+
+class FakeServer:
+    def __init__(self):
+        self.revision = 100
+        self.catalogue = {"ISS": ISS}
+        self.requests = []
+
+    def sync(self, names, since):
+        self.requests.append(list(names))
+        return {"revision": self.revision,
+                "tles": {n: dict(self.catalogue[n], rev=self.revision)
+                         for n in names if n in self.catalogue},
+                "missing": [n for n in names if n not in self.catalogue]}
+
+
+def make_subset(tmp_path, server, **kwargs):
+    subset = TleSubset("http://server.invalid", path=str(tmp_path / "subset.json"), **kwargs)
+    subset._sync = server.sync
+    return subset
+
+
+def test_missing_satellite_is_not_requested_on_every_lookup(tmp_path):
+    server = FakeServer()
+    subset = make_subset(tmp_path, server)
+    for _ in range(10):
+        assert subset.get("DECAYED") == (None, None)
+    assert server.requests == [["DECAYED"]]
+    assert subset.get("ISS") == (ISS["line1"], ISS["line2"])
+    assert server.requests == [["DECAYED"], ["ISS"]]
+
+
+def test_missing_satellite_is_retried_after_a_revision_change(tmp_path):
+    server = FakeServer()
+    subset = make_subset(tmp_path, server)
+    subset.get("ISS")
+    subset.get("NEW SAT")
+    server.revision = 200
+    server.catalogue["NEW SAT"] = ISS
+    subset.get("NEW SAT")
+    assert len(server.requests) == 2        # still the old revision locally
+    subset.refresh()
+    assert subset.get("NEW SAT") == (ISS["line1"], ISS["line2"])
+    assert "NEW SAT" not in subset.misses
+
+
+def test_missing_satellite_is_retried_after_the_interval(tmp_path):
+    server = FakeServer()
+    subset = make_subset(tmp_path, server, miss_retry_s=0)
+    subset.get("DECAYED")
+    subset.get("DECAYED")
+    assert server.requests == [["DECAYED"], ["DECAYED"]]
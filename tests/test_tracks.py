@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+
+from tracks import TrackService
+
+ISS = {"line1": "1 25544U 98067A   25209.13279725  .00012211  00000+0  22036-3 0  9996",
+       "line2": "2 25544  51.6347 104.1294 0001992 125.2997 234.8178 15.50161265521514"}
+
+
+def test_join_merges_a_line_continuing_across_a_tile_boundary():
+    first = [[[0.0, 1.0, 1.0], [50.0, 2.0, 2.0], [100.0, 3.0, 3.0]]]
+    second = [[[100.0, 3.0, 3.0], [150.0, 4.0, 4.0]], [[180.0, 5.0, 5.0], [200.0, 6.0, 6.0]]]
+    joined = TrackService._join([first, second], 0.0, 200.0)
+    assert joined == [[[0.0, 1.0, 1.0], [50.0, 2.0, 2.0], [100.0, 3.0, 3.0], [150.0, 4.0, 4.0]],
+                      [[180.0, 5.0, 5.0], [200.0, 6.0, 6.0]]]
+
+
+def test_join_keeps_lines_that_end_before_the_boundary_apart():
+    first = [[[0.0, 1.0, 1.0], [90.0, 2.0, 2.0]]]
+    second = [[[100.0, 3.0, 3.0], [150.0, 4.0, 4.0]]]
+    assert len(TrackService._join([first, second], 0.0, 200.0)) == 2
+
+
+def test_join_clips_to_the_window_keeping_the_bracketing_points():
+    first = [[[0.0, 1.0, 1.0], [50.0, 2.0, 2.0], [100.0, 3.0, 3.0]]]
+    second = [[[100.0, 3.0, 3.0], [150.0, 4.0, 4.0], [200.0, 5.0, 5.0]]]
+    joined = TrackService._join([first, second], 60.0, 120.0)
+    assert [p[0] for p in joined[0]] == [50.0, 100.0, 150.0]
+    assert TrackService._join([first], 120.0, 180.0) == []
+
+
+def test_ground_track_is_continuous_across_tiles():
+    service = TrackService(SimpleNamespace(tles={"ISS": ISS}), tile_s=600)
+    start = 1753704000.0 + 300
+    tracks = service.ground_tracks(["ISS"], start, 1200, step=30.0, resolution=0.0)
+    times = [p[0] for segment in tracks["ISS"] for p in segment]
+    assert times == sorted(set(times))
+    assert times[0] <= start and times[-1] >= start + 1200
+    # Only antimeridian crossings may split the track
+    for a, b in zip(tracks["ISS"], tracks["ISS"][1:]):
+        assert abs(a[-1][2] - b[0][2]) > 180.0
+    assert service.stats()["misses"] == 3
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from sgp4.api import Satrec, SatrecArray
+
+from overhead import look_angles
+from visibility_index import VisibilityIndex, julian_date, tle_epoch
+
+CATALOGUE = {
+    "THURAYA-2": {
+        "line1": "1 27825U 03026A   25208.69316566  .00000116  00000+0  00000+0 0  9990",
+        "line2": "2 27825   8.3253  33.2006 0004160   9.8586 196.0905  1.00272849 81099"},
+    "ISS (ZARYA)": {
+        "line1": "1 25544U 98067A   25209.13279725  .00012211  00000+0  22036-3 0  9996",
+        "line2": "2 25544  51.6347 104.1294 0001992 125.2997 234.8178 15.50161265521514"},
+    "MMS 3": {
+        "line1": "1 40484U 15011C   25209.25002315 -.00001803  00000+0  00000+0 0  9995",
+        "line2": "2 40484  66.0107 354.2532 8674407 160.4957 336.2073  0.28136852 16516"},
+}
+STEP = 60.0
+
+
+def visible(names, lat, lon, times, min_el):
+    sats = [Satrec.twoline2rv(CATALOGUE[n]["line1"], CATALOGUE[n]["line2"]) for n in names]
+    err, r, _ = SatrecArray(sats).sgp4(*julian_date(times))
+    _, el, _ = look_angles(r, times, lat, lon, 0.0)
+    return (err == 0) & (el >= min_el), el
+
+
+@pytest.mark.parametrize("lat, lon", [(78.0, 44.0), (-78.0, 100.0), (28.6, 77.2), (51.5, 0.0)])
+def test_windows_keep_every_visible_sample(lat, lon):
+    index = VisibilityIndex(CATALOGUE)
+    t0 = tle_epoch(CATALOGUE["ISS (ZARYA)"]["line1"])
+    times = np.arange(t0, t0 + 86400, STEP)
+    seen, _ = visible(index.names, lat, lon, times, 10.0)
+    windows = index.windows(index.names, lat, lon, t0, t0 + 86400, 10.0, STEP)
+    for row, name in enumerate(index.names):
+        spans = windows.get(name, [])
+        covered = np.zeros(len(times), dtype=bool)
+        for start, end in spans:
+            covered |= (times >= start) & (times <= end)
+        assert not (seen[row] & ~covered).any(), name
+
+
+def test_geo_just_above_the_mask_at_high_latitude_is_a_candidate():
+    index = VisibilityIndex(CATALOGUE)
+    t0 = tle_epoch(CATALOGUE["THURAYA-2"]["line1"])
+    times = np.arange(t0, t0 + 86400, STEP)
+    _, el = visible(["THURAYA-2"], 78.0, 16.0, times, 10.0)
+    assert 10.0 < el.max() < 10.5
+    assert index.position["THURAYA-2"] in index.candidates(78.0, 16.0, 10.0)
+    assert "THURAYA-2" in index.windows(["THURAYA-2"], 78.0, 16.0, t0, t0 + 86400, 10.0)
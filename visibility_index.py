@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""Geometric pre-filter for satellite visibility.
+
+Before any SGP4 call, the index rules out work in two steps:
+
+1. Whole satellites. A satellite whose ground track never gets within its own
+   footprint radius of the station (inclination + footprint at apogee < station
+   latitude) or that has decayed can never rise above the elevation mask.
+   Both tests hold for all time, so a satellite ruled out here stays out.
+2. Coarse time windows. The remaining satellites are propagated with a cheap
+   two-body model that includes J2 secular drift. Only times when the
+   sub-satellite point is within footprint radius + a safety margin of the
+   station are kept. Geostationary objects on the far side of the Earth drop
+   out here, one time step at a time, because inclined and drifting ones do
+   move.
+
+Both steps are conservative: they may keep a satellite or window that turns
+out to be below the mask, but they must not drop a real pass. Angles are
+measured from the station's geocentric latitude, matching the spherical
+sub-point model, and the margin grows with TLE age.
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+MU = 398600.4418          # km^3/s^2
+RE = 6378.137             # km
+WGS84_F = 1 / 298.257223563
+J2 = 1.08262668e-3
+MIN_PERIGEE_KM = 90.0
+DEEP_SPACE_PERIOD_S = 225 * 60
+HEO_MIN_ECC = 0.1
+BASE_MARGIN_DEG = 2.0
+MARGIN_PER_DAY_DEG = 1.0
+BATCH = 512
+
+log = logging.getLogger("visibility_index")
+
+
+def tle_epoch(line1):
+    """Epoch of a TLE line 1 as a UNIX timestamp."""
+    year = int(line1[18:20])
+    year += 2000 if year < 57 else 1900
+    day = float(line1[20:32])
+    start = datetime(year, 1, 1, tzinfo=timezone.utc)
+    return (start + timedelta(days=day - 1)).timestamp()
+
+
+def gmst_rad(t):
+    """Greenwich mean sidereal time (radians) for UNIX time(s) t."""
+    jd = np.asarray(t, dtype=float) / 86400.0 + 2440587.5
+    return np.radians((280.46061837 + 360.98564736629 * (jd - 2451545.0)) % 360.0)
+
+
+def julian_date(t):
+    """Split Julian date (whole, fraction) for UNIX time(s) t, as SGP4 wants it."""
+    jd = np.asarray(t, dtype=float) / 86400.0 + 2440587.5
+    whole = np.floor(jd - 0.5) + 0.5
+    return whole, jd - whole
+
+
+def station_ecef(lat, lon, alt_m):
+    """WGS84 station position (km) in Earth-fixed coordinates."""
+    lat, lon = np.radians(lat), np.radians(lon)
+    e2 = WGS84_F * (2 - WGS84_F)
+    n = RE / np.sqrt(1 - e2 * np.sin(lat) ** 2)
+    h = alt_m / 1000.0
+    return np.array([
+        (n + h) * np.cos(lat) * np.cos(lon),
+        (n + h) * np.cos(lat) * np.sin(lon),
+        (n * (1 - e2) + h) * np.sin(lat),
+    ])
+
+
+def geocentric_lat(lat):
+    """Geocentric latitude (deg) of a point at geodetic latitude lat on the ellipsoid."""
+    e2 = WGS84_F * (2 - WGS84_F)
+    return np.degrees(np.arctan((1 - e2) * np.tan(np.radians(lat))))
+
+
+def footprint_deg(alt_km, min_el_deg):
+    """Earth central angle from the sub-point to the edge of visibility."""
+    eps = np.radians(min_el_deg)
+    ratio = np.clip(RE / (RE + np.maximum(alt_km, 0.0)) * np.cos(eps), -1.0, 1.0)
+    return np.degrees(np.arccos(ratio) - eps)
+
+
+def central_angle_deg(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    c = (np.sin(lat1) * np.sin(lat2)
+         + np.cos(lat1) * np.cos(lat2) * np.cos(lon1 - lon2))
+    return np.degrees(np.arccos(np.clip(c, -1.0, 1.0)))
+
+
+class VisibilityIndex:
+    """Orbital elements for a TLE catalogue, stored as parallel numpy arrays."""
+
+    def __init__(self, catalogue):
+        names, rows = [], []
+        for name, tle in catalogue.items():
+            try:
+                l1, l2 = tle["line1"], tle["line2"]
+                rows.append((
+                    float(l2[8:16]), float(l2[17:25]), float("0." + l2[26:33].strip()),
+                    float(l2[34:42]), float(l2[43:51]), float(l2[52:63]), tle_epoch(l1),
+                    float(l1[33:43])))
+                names.append(name)
+            except (KeyError, ValueError, TypeError):
+                log.warning("Skipping malformed TLE for %s", name)
+        self.names = names
+        self.position = {name: i for i, name in enumerate(names)}
+        el = np.array(rows, dtype=float).reshape(-1, 8)
+        self.incl = np.radians(el[:, 0])
+        self.raan = np.radians(el[:, 1])
+        self.ecc = el[:, 2]
+        self.argp = np.radians(el[:, 3])
+        self.mean_anomaly = np.radians(el[:, 4])
+        self.n = el[:, 5] * 2 * np.pi / 86400.0           # rad/s
+        self.epoch = el[:, 6]
+        # TLE stores ndot/2 in rev/day^2; this is the drag-driven M drift
+        self.mean_anomaly_drift = el[:, 7] * 2 * np.pi / 86400.0 ** 2
+        self.a = np.cbrt(MU / np.maximum(self.n, 1e-12) ** 2)
+        self.perigee_km = self.a * (1 - self.ecc) - RE
+        self.apogee_km = self.a * (1 + self.ecc) - RE
+        p = self.a * (1 - self.ecc ** 2)
+        k = 1.5 * J2 * (RE / p) ** 2 * self.n
+        self.raan_rate = -k * np.cos(self.incl)
+        self.argp_rate = k * (2 - 2.5 * np.sin(self.incl) ** 2)
+        # Eccentric deep-space orbits (HEO, GTO, Molniya, MMS, ...): the lunar
+        # and solar terms SGP4 adds move their sub-point by degrees within
+        # hours, so step 2 never rules out any of their times
+        self.unmodelled = ((2 * np.pi / np.maximum(self.n, 1e-12) >= DEEP_SPACE_PERIOD_S)
+                           & (self.ecc > HEO_MIN_ECC))
+
+    def __len__(self):
+        return len(self.names)
+
+    def indices(self, names):
+        return np.array([self.position[n] for n in names if n in self.position], dtype=int)
+
+    # --- Step 1: whole-satellite rule-out ---
+
+    def candidates(self, lat, lon, min_el=10.0, idx=None):
+        """Indices of satellites that can ever rise above min_el at (lat, lon)."""
+        idx = np.arange(len(self)) if idx is None else np.asarray(idx, dtype=int)
+        incl = np.degrees(self.incl[idx])
+        max_lat = np.where(incl > 90.0, 180.0 - incl, incl)
+        reach = footprint_deg(self.apogee_km[idx], min_el)
+        keep = (np.abs(geocentric_lat(lat)) <= max_lat + reach + BASE_MARGIN_DEG)
+        keep &= self.perigee_km[idx] > MIN_PERIGEE_KM
+        return idx[keep]
+
+    # --- Step 2: coarse time windows ---
+
+    def _subpoint(self, idx, times):
+        """Two-body + J2 sub-satellite lat/lon (deg) and altitude (km), shape (len(idx), len(times))."""
+        dt = times[None, :] - self.epoch[idx, None]
+        e = self.ecc[idx, None]
+        i = self.incl[idx, None]
+        M = (self.mean_anomaly[idx, None] + self.n[idx, None] * dt
+             + self.mean_anomaly_drift[idx, None] * dt ** 2)
+        # Newton on Kepler's equation; starting from M + e sin M converges for
+        # high eccentricities (HEO, MMS-type orbits) where E = M does not
+        E = M + e * np.sin(M)
+        for _ in range(8):
+            E = E - (E - e * np.sin(E) - M) / (1 - e * np.cos(E))
+        nu = 2 * np.arctan2(np.sqrt(1 + e) * np.sin(E / 2), np.sqrt(1 - e) * np.cos(E / 2))
+        r = self.a[idx, None] * (1 - e * np.cos(E))
+        u = self.argp[idx, None] + self.argp_rate[idx, None] * dt + nu
+        raan = self.raan[idx, None] + self.raan_rate[idx, None] * dt
+        x = np.cos(raan) * np.cos(u) - np.sin(raan) * np.sin(u) * np.cos(i)
+        y = np.sin(raan) * np.cos(u) + np.cos(raan) * np.sin(u) * np.cos(i)
+        z = np.sin(u) * np.sin(i)
+        lat = np.degrees(np.arcsin(np.clip(z, -1.0, 1.0)))
+        lon = np.degrees(np.arctan2(y, x) - gmst_rad(times)[None, :])
+        lon = (lon + 180.0) % 360.0 - 180.0
+        return lat, lon, r - RE
+
+    def coarse_mask(self, idx, lat, lon, times, min_el=10.0, step=0.0):
+        """Boolean (len(idx), len(times)) array: True where a pass is possible."""
+        idx = np.asarray(idx, dtype=int)
+        times = np.asarray(times, dtype=float)
+        out = np.zeros((len(idx), len(times)), dtype=bool)
+        for b in range(0, len(idx), BATCH):
+            bi = idx[b:b + BATCH]
+            sub_lat, sub_lon, alt = self._subpoint(bi, times)
+            age_days = np.abs(times[None, :] - self.epoch[bi, None]) / 86400.0
+            # Cover half a step of travel at the local angular rate h / r^2,
+            # which near perigee of an eccentric orbit is many times the mean
+            p = self.a[bi, None] * (1 - self.ecc[bi, None] ** 2)
+            rate = np.degrees(np.sqrt(MU * p)) / (alt + RE) ** 2
+            travel = rate * step / 2.0
+            margin = BASE_MARGIN_DEG + MARGIN_PER_DAY_DEG * age_days + travel
+            reach = footprint_deg(alt, min_el) + margin
+            out[b:b + BATCH] = central_angle_deg(geocentric_lat(lat), lon, sub_lat, sub_lon) <= reach
+            out[b:b + BATCH][self.unmodelled[bi]] = True
+        return out
+
+    def windows(self, names, lat, lon, t0, t1, min_el=10.0, step=60.0):
+        """Map each satellite name to merged [(start, end), ...] candidate windows."""
+        idx = self.candidates(lat, lon, min_el, self.indices(names))
+        times = np.arange(t0, t1 + step, step)
+        mask = self.coarse_mask(idx, lat, lon, times, min_el, step)
+        result = {}
+        for row, i in enumerate(idx):
+            spans, start = [], None
+            for k, hit in enumerate(mask[row]):
+                if hit and start is None:
+                    start = times[k]
+                elif not hit and start is not None:
+                    spans.append((start - step, times[k]))
+                    start = None
+            if start is not None:
+                spans.append((start - step, times[-1]))
+            if spans:
+                result[self.names[i]] = spans
+        return result
+
+    def visible_candidates(self, lat, lon, t, min_el=10.0):
+        """Names of satellites that may be above min_el at time t."""
+        idx = self.candidates(lat, lon, min_el)
+        hit = self.coarse_mask(idx, lat, lon, [t], min_el)[:, 0]
+        return [self.names[i] for i in idx[hit]]
+
+
+def in_windows(t, spans):
+    return any(start <= t <= end for start, end in spans)